@@ -1,13 +1,16 @@
-from fastapi import APIRouter, HTTPException, status, Depends, Query
+from fastapi import APIRouter, HTTPException, status, Depends, Query, Request
 from fastapi.responses import HTMLResponse
 from pydantic import BaseModel, EmailStr, Field, field_validator
 from typing import Dict, Any, Optional, List
 from datetime import date, datetime, timedelta
 from supabase import Client
-from app.database.connection import get_supabase_client
-from app.auth.dependencies import get_current_user, get_current_user_token
+from app.database.connection import UserScopedClient, get_supabase_client
+from app.database.executor import run_auth, run_query
+from app.auth.dependencies import get_authenticated_supabase_client, get_current_user, get_current_user_token
 from app.database.schemas import User, UserCreate
-from app.services.email_service import generate_confirmation_token, render_confirmed_page, render_error_page
+from app.services.account_deletion import delete_user_account as purge_user_account
+from app.services.email_service import email_service, generate_confirmation_token, render_confirmed_page, render_error_page, send_email
+from app.services.rate_limit import enforce_rate_limit
 import logging
 import secrets
 import jwt
@@ -168,10 +171,11 @@ class CompleteOnboardingRequest(BaseModel):
 @router.post("/register", status_code=status.HTTP_201_CREATED)
 async def register_user(
     user_data: UserRegistrationSimple,
-    confirm_email: bool = True,  # Activer la confirmation d'email maintenant que SMTP est configuré
-    supabase: Client = Depends(get_supabase_client)
+    http_request: Request,
+    confirm_email: bool = True  # Activer la confirmation d'email maintenant que SMTP est configuré
 ) -> Dict[str, Any]:
     """Register a new user with Supabase Auth."""
+    await enforce_rate_limit(http_request, "register", user_data.email)
     try:
         # Préparer les options pour Supabase (inscription simplifiée)
         auth_options = {
@@ -187,11 +191,11 @@ async def register_user(
             auth_options["email_redirect_to"] = "https://ketosansstress.app/confirm"
 
         # Register user with Supabase Auth
-        auth_response = supabase.auth.sign_up({
+        auth_response = await run_auth("auth.sign_up", lambda auth: auth.sign_up({
             "email": user_data.email,
             "password": user_data.password,
             "options": auth_options
-        })
+        }))
 
         if auth_response.user:
             # Vérifier si l'email est confirmé ou pas
@@ -231,14 +235,15 @@ async def register_user(
 @router.post("/login")
 async def login_user(
     credentials: UserLogin,
-    supabase: Client = Depends(get_supabase_client)
+    http_request: Request
 ) -> Dict[str, Any]:
     """Authenticate user and return session tokens."""
+    await enforce_rate_limit(http_request, "login", credentials.email)
     try:
-        auth_response = supabase.auth.sign_in_with_password({
+        auth_response = await run_auth("auth.sign_in", lambda auth: auth.sign_in_with_password({
             "email": credentials.email,
             "password": credentials.password
-        })
+        }))
         
         if auth_response.session and auth_response.user:
             # Vérifier que l'email est confirmé
@@ -273,14 +278,16 @@ async def login_user(
 
 @router.post("/logout")
 async def logout_user(
-    token: str = Depends(get_current_user_token),
-    supabase: Client = Depends(get_supabase_client)
+    token: str = Depends(get_current_user_token)
 ) -> Dict[str, str]:
     """Logout user and invalidate session."""
     try:
-        # Set session before logout
-        supabase.auth.set_session(token, "")
-        supabase.auth.sign_out()
+        # Set session before logout (on this call's own auth client)
+        def sign_out(auth) -> None:
+            auth.set_session(token, "")
+            auth.sign_out()
+        
+        await run_auth("auth.sign_out", sign_out)
         
         return {"message": "Logged out successfully"}
         
@@ -290,16 +297,15 @@ async def logout_user(
 
 @router.post("/confirm-email")
 async def confirm_email(
-    request: EmailConfirmationRequest,
-    supabase: Client = Depends(get_supabase_client)
+    request: EmailConfirmationRequest
 ):
     """Confirm user email with token."""
     try:
         # Vérifier le token avec Supabase
-        result = supabase.auth.verify_otp({
+        result = await run_auth("auth.verify_otp", lambda auth: auth.verify_otp({
             'token_hash': request.token,
             'type': 'email'
-        })
+        }))
         
         if result.user:
             return {"message": "Email confirmed successfully", "user_id": result.user.id}
@@ -318,18 +324,19 @@ async def confirm_email(
 @router.post("/resend-confirmation")
 async def resend_confirmation_email(
     request: ResendConfirmationRequest,
-    supabase: Client = Depends(get_supabase_client)
+    http_request: Request
 ):
     """Resend email confirmation."""
+    await enforce_rate_limit(http_request, "resend_confirmation", request.email)
     try:
         # Utiliser Supabase pour renvoyer l'email de confirmation
-        result = supabase.auth.resend({
+        result = await run_auth("auth.resend", lambda auth: auth.resend({
             'type': 'signup',
             'email': request.email,
             'options': {
                 'redirect_to': 'https://ketosansstress.app/confirm'
             }
-        })
+        }))
         
         return {"message": "Confirmation email sent if account exists"}
     except Exception as e:
@@ -340,11 +347,12 @@ async def resend_confirmation_email(
 @router.post("/password-reset")
 async def request_password_reset(
     reset_data: PasswordReset,
-    supabase: Client = Depends(get_supabase_client)
+    http_request: Request
 ) -> Dict[str, str]:
     """Send password reset email."""
+    await enforce_rate_limit(http_request, "password_reset", reset_data.email)
     try:
-        supabase.auth.reset_password_email(reset_data.email)
+        await run_auth("auth.reset_password_email", lambda auth: auth.reset_password_email(reset_data.email))
         return {"message": "Password reset email sent"}
         
     except Exception as e:
@@ -363,7 +371,7 @@ async def get_current_user_info(
 async def update_user_profile(
     profile_data: ProfileUpdateRequest,
     current_user: User = Depends(get_current_user),
-    supabase: Client = Depends(get_supabase_client)
+    supabase: UserScopedClient = Depends(get_authenticated_supabase_client)
 ) -> Dict[str, Any]:
     """Update user profile information."""
     try:
@@ -388,7 +396,7 @@ async def update_user_profile(
         if profile_data.goal is not None:
             update_data["goal"] = profile_data.goal
         
-        result = supabase.table("users").update(update_data).eq("id", current_user.id).execute()
+        result = await run_query("users.update", supabase.table("users").update(update_data).eq("id", current_user.id))
         
         if result.data:
             return {
@@ -411,48 +419,47 @@ async def update_user_profile(
 @router.patch("/change-password")
 async def change_user_password(
     password_data: PasswordChangeRequest,
-    current_user: User = Depends(get_current_user),
-    supabase: Client = Depends(get_supabase_client)
+    current_user: User = Depends(get_current_user)
 ) -> Dict[str, str]:
     """Change user password."""
     try:
-        # First verify current password by attempting to sign in
-        try:
-            auth_response = supabase.auth.sign_in_with_password({
-                "email": current_user.email,
-                "password": password_data.current_password
-            })
+        # Verify the current password by signing in, then update it. Both calls use
+        # this request's own auth client, so no other request can change its session.
+        def verify_and_update(auth):
+            try:
+                auth_response = auth.sign_in_with_password({
+                    "email": current_user.email,
+                    "password": password_data.current_password
+                })
+            except Exception:
+                return "invalid_password", None
             
             if not auth_response.user:
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail="Current password is incorrect"
-                )
-        except Exception:
+                return "invalid_password", None
+            
+            try:
+                return "updated", auth.update_user({
+                    "password": password_data.new_password
+                })
+            except Exception as e:
+                logger.error(f"Password update error: {e}")
+                return "update_failed", None
+        
+        outcome, update_response = await run_auth("auth.change_password", verify_and_update)
+        
+        if outcome == "invalid_password":
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Current password is incorrect"
             )
         
-        # Update password using Supabase Auth
-        try:
-            update_response = supabase.auth.update_user({
-                "password": password_data.new_password
-            })
-            
-            if update_response.user:
-                return {"message": "Password changed successfully"}
-            else:
-                raise HTTPException(
-                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                    detail="Failed to update password"
-                )
-        except Exception as e:
-            logger.error(f"Password update error: {e}")
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Failed to update password"
-            )
+        if outcome == "updated" and update_response.user:
+            return {"message": "Password changed successfully"}
+        
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to update password"
+        )
             
     except HTTPException:
         raise
@@ -492,7 +499,7 @@ async def request_account_deletion(
         
         # Store in a temporary table (create if doesn't exist)
         try:
-            supabase.table("account_deletion_requests").upsert(deletion_request).execute()
+            await run_query("account_deletion_requests.upsert", supabase.table("account_deletion_requests").upsert(deletion_request))
         except Exception as table_error:
             # If table doesn't exist, create it first
             logger.info("Creating account_deletion_requests table")
@@ -502,80 +509,16 @@ async def request_account_deletion(
         confirmation_url = f"https://keto-onboard.preview.emergentagent.com/confirm-deletion?token={deletion_token}"
         
         email_subject = "🔴 KetoSansStress - Confirmation de suppression de compte"
-        email_html = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <meta charset="utf-8">
-            <title>Confirmation de suppression de compte</title>
-        </head>
-        <body style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto; padding: 20px;">
-            <div style="text-align: center; margin-bottom: 30px;">
-                <h1 style="color: #4CAF50;">KetoSansStress</h1>
-            </div>
-            
-            <div style="background-color: #fff3cd; border: 1px solid #ffeaa7; border-radius: 8px; padding: 20px; margin-bottom: 20px;">
-                <h2 style="color: #856404; margin-top: 0;">⚠️ Demande de suppression de compte</h2>
-                <p style="color: #856404; margin-bottom: 0;">
-                    Bonjour {current_user.full_name or 'Utilisateur'},
-                </p>
-            </div>
-            
-            <p>Vous avez demandé la suppression de votre compte KetoSansStress associé à l'adresse email <strong>{current_user.email}</strong>.</p>
-            
-            <div style="background-color: #f8d7da; border: 1px solid #f5c6cb; border-radius: 8px; padding: 15px; margin: 20px 0;">
-                <p style="color: #721c24; margin: 0;"><strong>⚠️ ATTENTION : Cette action est irréversible !</strong></p>
-                <p style="color: #721c24; margin: 10px 0 0 0;">
-                    La suppression de votre compte entraînera la perte définitive de :
-                </p>
-                <ul style="color: #721c24; margin: 10px 0 0 20px;">
-                    <li>Toutes vos données de profil</li>
-                    <li>Votre historique de repas et nutrition</li>
-                    <li>Vos préférences et paramètres</li>
-                    <li>Toute autre donnée associée à votre compte</li>
-                </ul>
-            </div>
-            
-            <p>Si vous êtes certain(e) de vouloir supprimer définitivement votre compte, cliquez sur le bouton ci-dessous :</p>
-            
-            <div style="text-align: center; margin: 30px 0;">
-                <a href="{confirmation_url}" 
-                   style="background-color: #dc3545; color: white; padding: 15px 30px; text-decoration: none; 
-                          border-radius: 8px; font-weight: bold; display: inline-block;">
-                    🗑️ CONFIRMER LA SUPPRESSION DE MON COMPTE
-                </a>
-            </div>
-            
-            <div style="background-color: #d1ecf1; border: 1px solid #bee5eb; border-radius: 8px; padding: 15px; margin: 20px 0;">
-                <p style="color: #0c5460; margin: 0;"><strong>💡 Vous changez d'avis ?</strong></p>
-                <p style="color: #0c5460; margin: 5px 0 0 0;">
-                    Si vous ne souhaitez plus supprimer votre compte, ignorez simplement cet email. 
-                    Votre compte restera actif et intact.
-                </p>
-            </div>
-            
-            <p style="font-size: 12px; color: #666;">
-                <strong>Sécurité :</strong> Ce lien de confirmation expirera dans 24 heures pour votre sécurité.
-                Si vous n'avez pas demandé la suppression de votre compte, ignorez cet email et 
-                contactez-nous immédiatement à contact@ketosansstress.com
-            </p>
-            
-            <hr style="border: none; border-top: 1px solid #eee; margin: 30px 0;">
-            
-            <div style="text-align: center; color: #666; font-size: 12px;">
-                <p>KetoSansStress - Votre compagnon pour une alimentation cétogène équilibrée</p>
-                <p>Cet email a été envoyé automatiquement, merci de ne pas y répondre.</p>
-            </div>
-        </body>
-        </html>
-        """
         
-        # Send email via Supabase
+        # Send email in background (the request is already stored)
         try:
-            # For now, we'll simulate the email sending
-            # In production, integrate with Supabase email service or SendGrid
-            logger.info(f"Account deletion confirmation email would be sent to: {current_user.email}")
-            logger.info(f"Confirmation URL: {confirmation_url}")
+            email_html = email_service.render_account_deletion_request_email(
+                full_name=current_user.full_name or 'Utilisateur',
+                email=current_user.email,
+                confirmation_url=confirmation_url
+            )
+            send_email(current_user.email, email_subject, email_html)
+            logger.info(f"Account deletion confirmation email queued for: {current_user.email}")
             
         except Exception as email_error:
             logger.error(f"Failed to send deletion confirmation email: {email_error}")
@@ -606,7 +549,10 @@ async def confirm_account_deletion(
         from datetime import datetime
         
         # Verify deletion token
-        deletion_request = supabase.table("account_deletion_requests").select("*").eq("deletion_token", deletion_data.token).execute()
+        deletion_request = await run_query(
+            "account_deletion_requests.select",
+            supabase.table("account_deletion_requests").select("*").eq("deletion_token", deletion_data.token)
+        )
         
         if not deletion_request.data:
             raise HTTPException(
@@ -620,7 +566,10 @@ async def confirm_account_deletion(
         expires_at = datetime.fromisoformat(request_data["expires_at"].replace('Z', '+00:00'))
         if datetime.utcnow() > expires_at.replace(tzinfo=None):
             # Clean up expired token
-            supabase.table("account_deletion_requests").delete().eq("deletion_token", deletion_data.token).execute()
+            await run_query(
+                "account_deletion_requests.delete",
+                supabase.table("account_deletion_requests").delete().eq("deletion_token", deletion_data.token)
+            )
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Le token de suppression a expiré. Veuillez faire une nouvelle demande."
@@ -631,22 +580,10 @@ async def confirm_account_deletion(
         
         # Execute account deletion
         try:
-            # 1. Delete user's meals first
-            supabase.table("meals").delete().eq("user_id", user_id).execute()
-            
-            # 2. Delete user preferences
-            try:
-                supabase.table("user_preferences").delete().eq("user_id", user_id).execute()
-            except:
-                pass  # Table might not exist
-            
-            # 3. Delete user profile data
-            supabase.table("users").delete().eq("id", user_id).execute()
-            
-            # 4. Delete the deletion request
-            supabase.table("account_deletion_requests").delete().eq("deletion_token", deletion_data.token).execute()
+            # 1. Delete all user data (set-based, batched) and the deletion request
+            await purge_user_account(user_id)
             
-            # 5. Try to delete from Supabase Auth
+            # 2. Try to delete from Supabase Auth
             try:
                 # Note: In production, this should use Supabase Admin API
                 # For now, we'll leave the auth record (it will be orphaned but harmless)
@@ -697,77 +634,15 @@ async def delete_account_directly(
         
         # Execute account deletion immediately
         try:
-            # 1. Delete user's meals first
-            meals_result = supabase.table("meals").delete().eq("user_id", user_id).execute()
-            logger.info(f"Deleted meals for user {user_id}: {len(meals_result.data) if meals_result.data else 0} records")
+            # 1. Delete all user data (set-based, batched)
+            await purge_user_account(user_id)
             
-            # 2. Delete user preferences
+            # 2. Send confirmation email (background delivery)
             try:
-                prefs_result = supabase.table("user_preferences").delete().eq("user_id", user_id).execute()
-                logger.info(f"Deleted preferences for user {user_id}")
-            except Exception as pref_error:
-                logger.warning(f"No preferences to delete for user {user_id}: {pref_error}")
-            
-            # 3. Delete user profile data
-            profile_result = supabase.table("users").delete().eq("id", user_id).execute()
-            logger.info(f"Deleted profile for user {user_id}")
-            
-            # 4. Send confirmation email (simulate for now)
-            try:
-                confirmation_email_html = f"""
-                <!DOCTYPE html>
-                <html>
-                <head>
-                    <meta charset="utf-8">
-                    <title>Compte supprimé - KetoSansStress</title>
-                </head>
-                <body style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto; padding: 20px;">
-                    <div style="text-align: center; margin-bottom: 30px;">
-                        <h1 style="color: #4CAF50;">KetoSansStress</h1>
-                    </div>
-                    
-                    <div style="background-color: #d4edda; border: 1px solid #c3e6cb; border-radius: 8px; padding: 20px; margin-bottom: 20px;">
-                        <h2 style="color: #155724; margin-top: 0;">✅ Compte supprimé avec succès</h2>
-                        <p style="color: #155724; margin-bottom: 0;">
-                            Bonjour {user_name},
-                        </p>
-                    </div>
-                    
-                    <p>Votre compte KetoSansStress associé à l'adresse email <strong>{user_email}</strong> a été définitivement supprimé le {datetime.now().strftime('%d/%m/%Y à %H:%M')}.</p>
-                    
-                    <div style="background-color: #f8f9fa; border: 1px solid #dee2e6; border-radius: 8px; padding: 15px; margin: 20px 0;">
-                        <p style="color: #495057; margin: 0;"><strong>📋 Données supprimées :</strong></p>
-                        <ul style="color: #495057; margin: 10px 0 0 20px;">
-                            <li>Profil et informations personnelles</li>
-                            <li>Historique des repas et données nutritionnelles</li>
-                            <li>Photos et préférences alimentaires</li>
-                            <li>Paramètres et configuration du compte</li>
-                        </ul>
-                    </div>
-                    
-                    <p>Nous sommes désolés de vous voir partir ! Si vous souhaitez revenir, vous pourrez créer un nouveau compte à tout moment.</p>
-                    
-                    <div style="background-color: #cff4fc; border: 1px solid #b6effb; border-radius: 8px; padding: 15px; margin: 20px 0;">
-                        <p style="color: #055160; margin: 0;"><strong>💡 Besoin d'aide ?</strong></p>
-                        <p style="color: #055160; margin: 5px 0 0 0;">
-                            Si vous avez des questions ou si cette suppression n'était pas intentionnelle, 
-                            contactez-nous à contact@ketosansstress.com dans les plus brefs délais.
-                        </p>
-                    </div>
-                    
-                    <hr style="border: none; border-top: 1px solid #eee; margin: 30px 0;">
-                    
-                    <div style="text-align: center; color: #666; font-size: 12px;">
-                        <p>Merci d'avoir utilisé KetoSansStress pour votre parcours cétogène</p>
-                        <p>Cet email a été envoyé automatiquement suite à la suppression de votre compte.</p>
-                    </div>
-                </body>
-                </html>
-                """
+                confirmation_email_html = email_service.render_account_deleted_email(user_name, user_email)
                 
-                # For now, we'll log the email content
-                logger.info(f"Deletion confirmation email would be sent to: {user_email}")
-                logger.info(f"Email content prepared for user: {user_name}")
+                send_email(user_email, "KetoSansStress - Votre compte a été supprimé", confirmation_email_html)
+                logger.info(f"Deletion confirmation email queued for: {user_email}")
                 
             except Exception as email_error:
                 logger.error(f"Failed to send deletion confirmation email: {email_error}")
@@ -817,36 +692,9 @@ async def delete_user_account(
             detail="Failed to delete account"
         )
 
-def verify_confirmation_token(token: str, supabase: Client) -> Optional[Dict[str, Any]]:
-    """Vérifier et décoder le token de confirmation"""
-    try:
-        # Dans un vrai environnement, nous utiliserions Supabase pour vérifier le token
-        # Pour l'instant, nous allons utiliser une approche simplifiée
-        
-        # Rechercher dans les métadonnées utilisateur un token correspondant
-        # Ceci est une implémentation temporaire - en production, nous utiliserions
-        # les tokens de confirmation Supabase natifs
-        
-        # Pour l'instant, simulons la vérification en cherchant un utilisateur
-        # avec un token correspondant dans les métadonnées
-        result = supabase.table("auth.users").select("*").execute()
-        
-        if result.data:
-            for user in result.data:
-                # Vérifier si le token correspond
-                if user.get("email_confirm_token") == token:
-                    return user
-        
-        return None
-        
-    except Exception as e:
-        logger.error(f"Token verification error: {e}")
-        return None
-
 @router.get("/confirm-email", response_class=HTMLResponse)
 async def confirm_email(
-    token: str = Query(...), 
-    supabase: Client = Depends(get_supabase_client)
+    token: str = Query(...)
 ) -> HTMLResponse:
     """Confirmer l'adresse email via un lien cliqué dans l'email"""
     try:
@@ -855,10 +703,10 @@ async def confirm_email(
         # Utiliser l'API Supabase pour vérifier le token de confirmation
         try:
             # Essayer de vérifier le token avec Supabase Auth
-            response = supabase.auth.verify_otp({
+            response = await run_auth("auth.verify_otp", lambda auth: auth.verify_otp({
                 "token": token,
                 "type": "signup"
-            })
+            }))
             
             if response.user:
                 logger.info(f"Email confirmed successfully for user: {response.user.email}")
@@ -959,7 +807,7 @@ def calculate_nutrition_targets(onboarding_data: OnboardingData) -> NutritionTar
 async def complete_onboarding(
     request: CompleteOnboardingRequest,
     current_user: User = Depends(get_current_user),
-    supabase: Client = Depends(get_supabase_client)
+    supabase: UserScopedClient = Depends(get_authenticated_supabase_client)
 ) -> Dict[str, Any]:
     """Finaliser le processus d'onboarding avec toutes les données collectées"""
     try:
@@ -1001,7 +849,7 @@ async def complete_onboarding(
         user_update_data["age"] = age
         
         # Mettre à jour le profil utilisateur dans Supabase
-        result = supabase.table("users").update(user_update_data).eq("id", current_user.id).execute()
+        result = await run_query("users.update", supabase.table("users").update(user_update_data).eq("id", current_user.id))
         
         if result.data:
             logger.info(f"Onboarding completed successfully for user: {current_user.id}")
@@ -1037,7 +885,7 @@ async def complete_onboarding(
 async def save_onboarding_progress(
     progress: OnboardingProgressData,
     current_user: User = Depends(get_current_user),
-    supabase: Client = Depends(get_supabase_client)
+    supabase: UserScopedClient = Depends(get_authenticated_supabase_client)
 ) -> Dict[str, Any]:
     """Sauvegarder la progression de l'onboarding"""
     try:
@@ -1054,7 +902,7 @@ async def save_onboarding_progress(
                 if key in ["first_name", "sex", "current_weight", "target_weight", "height", "activity_level", "goal", "birth_date"]:
                     update_data[key] = value
         
-        result = supabase.table("users").update(update_data).eq("id", current_user.id).execute()
+        result = await run_query("users.update", supabase.table("users").update(update_data).eq("id", current_user.id))
         
         if result.data:
             return {
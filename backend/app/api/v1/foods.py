@@ -1,9 +1,15 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
 from typing import List, Optional
 from app.auth.dependencies import get_current_user
-from app.database.connection import get_supabase_client
+from app.services.autocomplete import autocomplete_service
+from app.services.favorites import favorites_service
+from app.services.food_search import federated_food_search
+from app.services.food_matcher import fold_food_name
+from app.services.reference_foods import reference_foods
+from app.services.search_history import record_search, recent_search_cache
 from integrations.openfoodfacts import food_search_service  # ✅ Utiliser le service existant
 from pydantic import BaseModel
+import asyncio
 import requests
 import logging
 from datetime import datetime
@@ -29,6 +35,10 @@ class FoodSearchResult(BaseModel):
     barcode: Optional[str] = None
     source: str = "openfoodfacts"
 
+class FavoritePinResult(BaseModel):
+    food_key: str
+    pinned: bool
+
 class SearchHistoryItem(BaseModel):
     query: str
     searched_at: datetime
@@ -39,106 +49,40 @@ class BarcodeScanResult(BaseModel):
     food_data: Optional[FoodSearchResult] = None
     found: bool
 
-# Base de données alimentaire locale (pour démarrage rapide)
-LOCAL_FOOD_DATABASE = [
-    {
-        "id": "avocado",
-        "name": "Avocat",
-        "category": "fruits",
-        "calories_per_100g": 160,
-        "proteins_per_100g": 2,
-        "carbs_per_100g": 9,
-        "fats_per_100g": 15,
-        "fiber_per_100g": 7,
-        "image_url": "https://images.unsplash.com/photo-1523049673857-eb18f1d7b578?w=100",
-        "source": "local"
-    },
-    {
-        "id": "salmon",
-        "name": "Saumon",
-        "category": "poisson",
-        "calories_per_100g": 208,
-        "proteins_per_100g": 25,
-        "carbs_per_100g": 0,
-        "fats_per_100g": 12,
-        "fiber_per_100g": 0,
-        "image_url": "https://images.unsplash.com/photo-1519708227418-c8e56d59a7a0?w=100",
-        "source": "local"
-    },
-    {
-        "id": "eggs",
-        "name": "Œufs",
-        "category": "protéines",
-        "calories_per_100g": 155,
-        "proteins_per_100g": 13,
-        "carbs_per_100g": 1,
-        "fats_per_100g": 11,
-        "fiber_per_100g": 0,
-        "image_url": "https://images.unsplash.com/photo-1582722872445-44dc5f7e3c8f?w=100",
-        "source": "local"
-    },
-    {
-        "id": "spinach",
-        "name": "Épinards",
-        "category": "légumes",
-        "calories_per_100g": 23,
-        "proteins_per_100g": 3,
-        "carbs_per_100g": 4,
-        "fats_per_100g": 0,
-        "fiber_per_100g": 2,
-        "image_url": "https://images.unsplash.com/photo-1576045057995-568f588f82fb?w=100",
-        "source": "local"
-    },
-    {
-        "id": "chicken",
-        "name": "Poulet",
-        "category": "viande",
-        "calories_per_100g": 165,
-        "proteins_per_100g": 31,
-        "carbs_per_100g": 0,
-        "fats_per_100g": 4,
-        "fiber_per_100g": 0,
-        "image_url": "https://images.unsplash.com/photo-1604503468506-a8da13d82791?w=100",
-        "source": "local"
-    },
-    {
-        "id": "broccoli",
-        "name": "Brocoli",
-        "category": "légumes",
-        "calories_per_100g": 34,
-        "proteins_per_100g": 3,
-        "carbs_per_100g": 7,
-        "fats_per_100g": 0,
-        "fiber_per_100g": 3,
-        "image_url": "https://images.unsplash.com/photo-1459411621453-7b03977f4bfc?w=100",
-        "source": "local"
-    },
-    {
-        "id": "cheese",
-        "name": "Fromage",
-        "brand": "Emmental",
-        "category": "produits laitiers",
-        "calories_per_100g": 380,
-        "proteins_per_100g": 25,
-        "carbs_per_100g": 1,
-        "fats_per_100g": 30,
-        "fiber_per_100g": 0,
-        "image_url": "https://images.unsplash.com/photo-1486297678162-eb2a19b0a32d?w=100",
-        "source": "local"
-    },
-    {
-        "id": "almonds",
-        "name": "Amandes",
-        "category": "noix",
-        "calories_per_100g": 579,
-        "proteins_per_100g": 21,
-        "carbs_per_100g": 22,
-        "fats_per_100g": 50,
-        "fiber_per_100g": 12,
-        "image_url": "https://images.unsplash.com/photo-1508747703725-719777637510?w=100",
-        "source": "local"
+def product_to_search_result(product: dict) -> dict:
+    """Convertir un produit (format food_database) vers FoodSearchResult"""
+    if product.get("data_source") == "local":
+        reference = reference_foods.by_name(product.get("product_name") or "")
+        if reference:
+            return reference.to_search_result()
+    barcode = product.get("barcode")
+    return {
+        "id": product.get("openfoodfacts_id") or (f"off_{barcode}" if barcode else fold_food_name(product.get("product_name") or "").replace(" ", "_")),
+        "name": product.get("product_name") or "Produit inconnu",
+        "brand": product.get("brand"),
+        "category": product.get("categories", ["autre"])[0] if product.get("categories") else "autre",
+        "calories_per_100g": product.get("calories_per_100g") or 0,
+        "proteins_per_100g": product.get("protein_per_100g") or 0,
+        "carbs_per_100g": product.get("carbohydrates_per_100g") or 0,
+        "fats_per_100g": product.get("fat_per_100g") or 0,
+        "fiber_per_100g": product.get("fiber_per_100g") or 0,
+        "image_url": product.get("image_url"),
+        "barcode": barcode,
+        "source": product.get("data_source") or "openfoodfacts"
     }
-]
+
+# Aliments locaux proposés par l'autocomplétion
+autocomplete_service.seed((food.name, food.keto_score) for food in reference_foods)
+
+@router.get("/autocomplete")
+async def autocomplete_foods(
+    q: str = Query(..., min_length=1, description="Début du nom recherché"),
+    limit: int = Query(8, ge=1, le=20, description="Nombre maximum de suggestions")
+):
+    """
+    Suggestions de noms d'aliments pendant la saisie (index en mémoire, sans appel externe)
+    """
+    return autocomplete_service.suggest(q, limit)
 
 @router.get("/search", response_model=List[FoodSearchResult])
 async def search_foods(
@@ -151,55 +95,12 @@ async def search_foods(
     Rechercher des aliments par nom, marque ou catégorie
     """
     try:
-        # Recherche locale d'abord
-        results = []
-        query_lower = q.lower()
-        
-        for food in LOCAL_FOOD_DATABASE:
-            # Recherche dans le nom
-            if query_lower in food["name"].lower():
-                results.append(food)
-            # Recherche dans la catégorie
-            elif category and food.get("category") and category.lower() in food["category"].lower():
-                results.append(food)
-            # Recherche dans la marque
-            elif food.get("brand") and query_lower in food["brand"].lower():
-                results.append(food)
+        # Aliments de référence, food_database et OpenFoodFacts, fusionnés et classés
+        products = await federated_food_search.search(q, limit=limit, category=category)
+        results = [product_to_search_result(product) for product in products]
         
-        # Filtrer par catégorie si spécifiée
-        if category:
-            results = [food for food in results if food.get("category", "").lower() == category.lower()]
-        
-        # Limiter les résultats
-        results = results[:limit]
-        
-        # ✅ Utiliser le service OpenFoodFacts amélioré si pas assez de résultats locaux
-        if len(results) < limit:
-            try:
-                openfoodfacts_results = food_search_service.search_foods(q, limit - len(results))
-                
-                # Convertir le format du service vers FoodSearchResult
-                for off_result in openfoodfacts_results:
-                    converted = {
-                        "id": off_result.get("openfoodfacts_id", f"off_{off_result.get('barcode', 'unknown')}"),
-                        "name": off_result.get("product_name", "Produit inconnu"),
-                        "brand": off_result.get("brand"),
-                        "category": off_result.get("categories", ["autre"])[0] if off_result.get("categories") else "autre",
-                        "calories_per_100g": off_result.get("calories_per_100g", 0),
-                        "proteins_per_100g": off_result.get("protein_per_100g", 0),
-                        "carbs_per_100g": off_result.get("carbohydrates_per_100g", 0),
-                        "fats_per_100g": off_result.get("fat_per_100g", 0),
-                        "fiber_per_100g": off_result.get("fiber_per_100g", 0),
-                        "image_url": off_result.get("image_url"),
-                        "barcode": off_result.get("barcode"),
-                        "source": "openfoodfacts"
-                    }
-                    results.append(converted)
-            except Exception as e:
-                logger.warning(f"OpenFoodFacts search failed: {e}")
-        
-        # Sauvegarder dans l'historique
-        await save_search_history(current_user.id, q)
+        # Sauvegarder dans l'historique (écriture différée, hors du temps de réponse)
+        record_search(current_user.id, q, result_count=len(results))
         
         return [FoodSearchResult(**food) for food in results]
         
@@ -216,30 +117,23 @@ async def get_recent_searches(
     Récupérer l'historique des recherches récentes de l'utilisateur
     """
     try:
-        supabase = get_supabase_client()
-        
-        # Récupérer l'historique depuis Supabase
-        result = supabase.table("search_history") \
-            .select("query, searched_at") \
-            .eq("user_id", current_user.id) \
-            .order("searched_at", desc=True) \
-            .limit(limit) \
-            .execute()
-        
-        return result.data if result.data else []
+        # Servi depuis la mémoire ; search_history n'est lu qu'au premier accès
+        return await recent_search_cache.recent(current_user.id, limit)
         
     except Exception as e:
         logger.error(f"Recent searches error: {e}")
-        # Retourner un historique par défaut si erreur
-        return [
-            {"query": "avocat", "searched_at": datetime.now().isoformat()},
-            {"query": "saumon", "searched_at": datetime.now().isoformat()},
-            {"query": "œufs", "searched_at": datetime.now().isoformat()}
-        ]
+        # Pas d'historique disponible : ne pas en inventer un
+        return []
 
 class BarcodeScanRequest(BaseModel):
     barcode: str
 
+# Nombre maximum de codes-barres par requête groupée
+MAX_BATCH_BARCODES = 100
+
+class BarcodeBatchScanRequest(BaseModel):
+    barcodes: List[str]
+
 @router.post("/scan-barcode", response_model=BarcodeScanResult)
 async def scan_barcode(
     request: BarcodeScanRequest,  # ✅ Accepter le barcode dans le body
@@ -250,7 +144,7 @@ async def scan_barcode(
     """
     try:
         # ✅ Utiliser le service OpenFoodFacts amélioré
-        off_result = food_search_service.get_food_by_barcode(request.barcode)
+        off_result = await asyncio.to_thread(food_search_service.get_food_by_barcode, request.barcode)
         
         # Convertir le format si trouvé
         food_data = None
@@ -280,25 +174,110 @@ async def scan_barcode(
         logger.error(f"Barcode scan error: {e}")
         raise HTTPException(status_code=500, detail="Erreur lors du scan du code-barres")
 
+@router.post("/scan-barcodes", response_model=List[BarcodeScanResult])
+async def scan_barcodes(
+    request: BarcodeBatchScanRequest,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Scanner plusieurs codes-barres (inventaire, import de ticket de caisse)
+    Les résultats sont renvoyés dans l'ordre des codes-barres demandés
+    """
+    barcodes = [barcode.strip() for barcode in request.barcodes]
+    if not barcodes:
+        raise HTTPException(status_code=400, detail="Aucun code-barres fourni")
+    if len(barcodes) > MAX_BATCH_BARCODES:
+        raise HTTPException(status_code=400, detail=f"Maximum {MAX_BATCH_BARCODES} codes-barres par requête")
+    
+    try:
+        products = await federated_food_search.lookup_barcodes([barcode for barcode in barcodes if barcode])
+        
+        results = []
+        for barcode in barcodes:
+            product = products.get(barcode)
+            food_data = FoodSearchResult(**product_to_search_result(product)) if product else None
+            results.append(BarcodeScanResult(barcode=barcode, food_data=food_data, found=food_data is not None))
+        return results
+        
+    except Exception as e:
+        logger.error(f"Batch barcode scan error: {e}")
+        raise HTTPException(status_code=500, detail="Erreur lors du scan des codes-barres")
+
+@router.get("/products/{barcode}")
+async def get_food_details(
+    barcode: str,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Fiche complète d'un produit (ingrédients, labels, allergènes)
+    Les résultats de recherche n'en contiennent qu'un résumé : la fiche est chargée à l'ouverture
+    """
+    product = await asyncio.to_thread(food_search_service.get_food_by_barcode, barcode)
+    if not product:
+        raise HTTPException(status_code=404, detail="Produit introuvable")
+    return product
+
 @router.get("/categories")
 async def get_food_categories():
     """
     Récupérer toutes les catégories d'aliments disponibles
     """
-    categories = list(set([food.get("category", "autre") for food in LOCAL_FOOD_DATABASE if food.get("category")]))
-    return sorted(categories)
+    return list(reference_foods.categories)
 
 @router.get("/favorites")
 async def get_favorite_foods(
+    limit: int = Query(10, ge=1, le=50, description="Nombre maximum de favoris"),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Récupérer les aliments favoris de l'utilisateur (épinglés, puis les plus consommés récemment)
+    """
+    try:
+        favorites = await favorites_service.favorites(current_user.id, limit)
+    except Exception as e:
+        logger.warning(f"Failed to load favorites: {e}")
+        favorites = []
+
+    if not favorites:
+        # Nouvel utilisateur : proposer les aliments les plus populaires
+        return [FoodSearchResult(**food.to_search_result()) for food in reference_foods.foods[:4]]
+
+    # Les aliments de référence gardent leurs valeurs pour 100g
+    results = []
+    for food in favorites:
+        reference = reference_foods.by_name(food["name"])
+        results.append(FoodSearchResult(**(reference.to_search_result() if reference else food)))
+    return results
+
+@router.post("/favorites/pins", response_model=FavoritePinResult)
+async def pin_favorite_food(
+    food: FoodSearchResult,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Épingler un aliment en tête des favoris
+    """
+    try:
+        food_key = await favorites_service.pin(current_user.id, food.dict())
+        return FavoritePinResult(food_key=food_key, pinned=True)
+    except Exception as e:
+        logger.error(f"Pin favorite error: {e}")
+        raise HTTPException(status_code=500, detail="Erreur lors de l'ajout aux favoris")
+
+@router.delete("/favorites/pins/{food_key}", response_model=FavoritePinResult)
+async def unpin_favorite_food(
+    food_key: str,
     current_user: dict = Depends(get_current_user)
 ):
     """
-    Récupérer les aliments favoris de l'utilisateur
+    Retirer un aliment épinglé des favoris
     """
-    # TODO: Implémenter la logique des favoris avec Supabase
-    # Pour l'instant, retourner les aliments les plus populaires
-    favorites = LOCAL_FOOD_DATABASE[:4]  # Top 4 aliments
-    return [FoodSearchResult(**food) for food in favorites]
+    try:
+        await favorites_service.unpin(current_user.id, food_key)
+        return FavoritePinResult(food_key=food_key, pinned=False)
+    except Exception as e:
+        logger.error(f"Unpin favorite error: {e}")
+        raise HTTPException(status_code=500, detail="Erreur lors du retrait des favoris")
 
 # Fonctions utilitaires
 
@@ -380,21 +359,3 @@ async def get_product_by_barcode(barcode: str) -> Optional[FoodSearchResult]:
     except Exception as e:
         logger.error(f"Barcode lookup error: {e}")
         return None
-
-async def save_search_history(user_id: str, query: str):
-    """
-    Sauvegarder une recherche dans l'historique
-    """
-    try:
-        supabase = get_supabase_client()
-        
-        supabase.table("search_history").insert({
-            "user_id": user_id,
-            "query": query,
-            "searched_at": datetime.now().isoformat()
-        }).execute()
-        
-    except Exception as e:
-        logger.warning(f"Failed to save search history: {e}")
-        # Ne pas bloquer la recherche si l'historique échoue
-        pass
\ No newline at end of file
@@ -1,9 +1,11 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query
-from supabase import Client
 from typing import List, Optional, Dict, Any
 from datetime import date, datetime, timedelta
 from app.database.schemas import Meal, MealCreate, MealUpdate, User, DailySummary
 from app.auth.dependencies import get_current_user, get_authenticated_supabase_client
+from app.database.connection import UserScopedClient
+from app.database.executor import run_query
+from app.services.favorites import favorites_service
 import logging
 
 logger = logging.getLogger(__name__)
@@ -52,7 +54,7 @@ def calculate_daily_summary(meals: List[Dict[str, Any]], user: User) -> DailySum
 async def create_meal(
     meal_data: MealCreate,
     current_user: User = Depends(get_current_user),
-    supabase: Client = Depends(get_authenticated_supabase_client)
+    supabase: UserScopedClient = Depends(get_authenticated_supabase_client)
 ) -> Meal:
     """Create a new meal entry."""
     try:
@@ -70,7 +72,7 @@ async def create_meal(
                 meal_dict[field] = float(meal_dict[field])
         
         # Insert meal
-        result = supabase.table("meals").insert(meal_dict).execute()
+        result = await run_query("meals.insert", supabase.table("meals").insert(meal_dict))
         
         if not result.data:
             raise HTTPException(
@@ -78,6 +80,9 @@ async def create_meal(
                 detail="Failed to create meal"
             )
         
+        # Mettre à jour les aliments favoris de l'utilisateur
+        favorites_service.record_meal(current_user.id, result.data[0])
+        
         return Meal(**result.data[0])
         
     except Exception as e:
@@ -95,7 +100,7 @@ async def get_meals(
     limit: int = Query(100, ge=1, le=1000, description="Maximum number of meals to return"),
     offset: int = Query(0, ge=0, description="Number of meals to skip"),
     current_user: User = Depends(get_current_user),
-    supabase: Client = Depends(get_authenticated_supabase_client)
+    supabase: UserScopedClient = Depends(get_authenticated_supabase_client)
 ) -> List[Meal]:
     """Get user's meals with optional filtering."""
     try:
@@ -112,7 +117,7 @@ async def get_meals(
             query = query.eq("meal_type", meal_type)
         
         # Apply pagination and ordering
-        result = query.order("consumed_at", desc=True).range(offset, offset + limit - 1).execute()
+        result = await run_query("meals.select", query.order("consumed_at", desc=True).range(offset, offset + limit - 1))
         
         return [Meal(**meal) for meal in result.data]
         
@@ -178,18 +183,18 @@ async def get_daily_summary(
 @router.get("/today", response_model=List[Meal])
 async def get_todays_meals(
     current_user: User = Depends(get_current_user),
-    supabase: Client = Depends(get_authenticated_supabase_client)
+    supabase: UserScopedClient = Depends(get_authenticated_supabase_client)
 ) -> List[Meal]:
     """Get today's meals organized by meal type."""
     try:
         today = date.today()
         tomorrow = today + timedelta(days=1)
         
-        result = supabase.table("meals").select("*").eq(
+        result = await run_query("meals.select_today", supabase.table("meals").select("*").eq(
             "user_id", current_user.id
         ).gte("consumed_at", today.isoformat()).lt(
             "consumed_at", tomorrow.isoformat()
-        ).order("consumed_at").execute()
+        ).order("consumed_at"))
         
         return [Meal(**meal) for meal in result.data]
         
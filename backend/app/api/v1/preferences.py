@@ -1,12 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from app.database.connection import get_supabase_client  
-from app.auth.dependencies import get_current_user
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from app.database.connection import UserScopedClient
+from app.database.executor import run_query
+from app.auth.dependencies import get_authenticated_supabase_client, get_current_user
+from app.services.preferences_cache import compute_etag, etag_matches, preferences_cache
 from pydantic import BaseModel
-from typing import Optional, Dict, Any, Literal
+from types import MappingProxyType
+from typing import Optional, Dict, Any, Literal, Mapping, Tuple
 from datetime import datetime
 import json
+import logging
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
 # Types pour les préférences
 class UserPreferences(BaseModel):
@@ -54,17 +59,17 @@ class PreferencesUpdate(BaseModel):
     liquid_unit: Optional[Literal['ml', 'fl_oz']] = None
     temperature_unit: Optional[Literal['celsius', 'fahrenheit']] = None
 
-def get_default_preferences_by_region(region: str) -> Dict[str, Any]:
-    """Retourne les préférences par défaut selon la région"""
+REGION_TIMEZONES = {
+    'FR': 'Europe/Paris',
+    'BE': 'Europe/Brussels', 
+    'CH': 'Europe/Zurich',
+    'CA': 'America/Montreal',
+}
+
+def build_region_defaults(region: str) -> Dict[str, Any]:
+    """Construire les préférences par défaut d'une région"""
     is_imperial = region == 'CA'
     
-    timezone_map = {
-        'FR': 'Europe/Paris',
-        'BE': 'Europe/Brussels', 
-        'CH': 'Europe/Zurich',
-        'CA': 'America/Montreal',
-    }
-    
     return {
         'count_net_carbs': True,
         'region': region,
@@ -78,7 +83,7 @@ def get_default_preferences_by_region(region: str) -> Dict[str, Any]:
         'data_saver_mode': False,
         'biometric_lock': False,
         'language': 'fr',
-        'timezone': timezone_map.get(region, 'Europe/Paris'),
+        'timezone': REGION_TIMEZONES.get(region, 'Europe/Paris'),
         'date_format': 'DD/MM/YYYY',
         'time_format': '24h',
         'weight_unit': 'lb' if is_imperial else 'kg',
@@ -87,47 +92,72 @@ def get_default_preferences_by_region(region: str) -> Dict[str, Any]:
         'temperature_unit': 'fahrenheit' if is_imperial else 'celsius',
     }
 
-@router.get("/user-preferences/{user_id}", response_model=UserPreferences)
-async def get_user_preferences(
-    user_id: str,
-    current_user: dict = Depends(get_current_user)
-):
-    """Récupérer les préférences d'un utilisateur"""
-    if current_user.id != user_id:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Accès non autorisé aux préférences de cet utilisateur"
-        )
+# Modèles par région, calculés une fois et non modifiables
+REGION_DEFAULTS: Mapping[str, Mapping[str, Any]] = MappingProxyType({
+    region: MappingProxyType(build_region_defaults(region))
+    for region in ('FR', 'BE', 'CH', 'CA', 'OTHER')
+})
+
+def get_default_preferences_by_region(region: str) -> Dict[str, Any]:
+    """Retourne les préférences par défaut selon la région"""
+    template = REGION_DEFAULTS.get(region)
+    if template is None:
+        return build_region_defaults(region)
+    # Copie modifiable (le dict des permissions n'est pas partagé)
+    return {**template, 'health_sync_permissions': {}}
+
+def parse_preferences_row(prefs: Dict[str, Any]) -> Dict[str, Any]:
+    """Ligne user_preferences -> préférences validées, JSONB décodé"""
+    # Convertir les JSONB en dict Python
+    if isinstance(prefs.get('health_sync_permissions'), str):
+        prefs['health_sync_permissions'] = json.loads(prefs['health_sync_permissions'])
+    return UserPreferences(**prefs).dict()
+
+def set_preferences_headers(response: Response, etag: str) -> None:
+    # Toujours revalider : le cache client sert avec un 304 sans corps
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "private, no-cache"
+
+async def load_user_preferences(supabase: UserScopedClient, user_id: str) -> Dict[str, Any]:
+    """Lire les préférences en base, en créant les préférences par défaut si besoin"""
+    defaults = get_default_preferences_by_region('FR')
     
-    supabase = get_supabase_client()
+    try:
+        # Lecture ou création en un seul aller-retour (INSERT ... ON CONFLICT DO NOTHING)
+        rpc_response = await run_query("user_preferences.get_or_create", supabase.rpc(
+            "get_or_create_user_preferences",
+            {"p_user_id": user_id, "p_defaults": defaults}
+        ))
+        row = rpc_response.data[0] if isinstance(rpc_response.data, list) else rpc_response.data
+        if row:
+            return parse_preferences_row(row)
+    except Exception as e:
+        logger.warning(f"get_or_create_user_preferences RPC failed, falling back to select/upsert: {e}")
     
     try:
         # Récupérer les préférences depuis la base de données
-        response = supabase.table("user_preferences").select("*").eq("user_id", user_id).execute()
+        response = await run_query("user_preferences.select", supabase.table("user_preferences").select("*").eq("user_id", user_id))
         
         if response.data and len(response.data) > 0:
-            prefs = response.data[0]
-            
-            # Convertir les JSONB en dict Python
-            if isinstance(prefs.get('health_sync_permissions'), str):
-                prefs['health_sync_permissions'] = json.loads(prefs['health_sync_permissions'])
-            
-            return UserPreferences(**prefs)
-        else:
-            # Créer des préférences par défaut si elles n'existent pas
-            default_prefs = get_default_preferences_by_region('FR')
-            default_prefs['user_id'] = user_id
-            
-            # Insérer les préférences par défaut
-            insert_response = supabase.table("user_preferences").insert(default_prefs).execute()
-            
-            if insert_response.data:
-                return UserPreferences(**insert_response.data[0])
-            else:
-                raise HTTPException(
-                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                    detail="Impossible de créer les préférences par défaut"
-                )
+            return parse_preferences_row(response.data[0])
+        
+        # Créer des préférences par défaut ; un chargement concurrent a pu les créer entre-temps
+        insert_response = await run_query("user_preferences.upsert", supabase.table("user_preferences").upsert(
+            {**defaults, 'user_id': user_id},
+            on_conflict="user_id",
+            ignore_duplicates=True
+        ))
+        if insert_response.data:
+            return parse_preferences_row(insert_response.data[0])
+        
+        response = await run_query("user_preferences.select", supabase.table("user_preferences").select("*").eq("user_id", user_id))
+        if response.data:
+            return parse_preferences_row(response.data[0])
+        
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Impossible de créer les préférences par défaut"
+        )
                 
     except Exception as e:
         raise HTTPException(
@@ -135,10 +165,40 @@ async def get_user_preferences(
             detail=f"Erreur lors de la récupération des préférences: {str(e)}"
         )
 
+@router.get("/user-preferences/{user_id}", response_model=UserPreferences)
+async def get_user_preferences(
+    user_id: str,
+    request: Request,
+    response: Response,
+    current_user: dict = Depends(get_current_user),
+    supabase: UserScopedClient = Depends(get_authenticated_supabase_client)
+):
+    """Récupérer les préférences d'un utilisateur (304 si l'ETag du client est à jour)"""
+    if current_user.id != user_id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Accès non autorisé aux préférences de cet utilisateur"
+        )
+    
+    cached = preferences_cache.get(user_id)
+    if cached is not None:
+        prefs, etag = cached
+    else:
+        prefs = await load_user_preferences(supabase, user_id)
+        etag = preferences_cache.put(user_id, prefs)
+    
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag, "Cache-Control": "private, no-cache"})
+    
+    set_preferences_headers(response, etag)
+    return UserPreferences(**prefs)
+
 @router.post("/user-preferences", response_model=UserPreferences)
 async def create_user_preferences(
     preferences: UserPreferences,
-    current_user: dict = Depends(get_current_user)
+    response: Response,
+    current_user: dict = Depends(get_current_user),
+    supabase: UserScopedClient = Depends(get_authenticated_supabase_client)
 ):
     """Créer les préférences pour un utilisateur"""
     if preferences.user_id != current_user.id:
@@ -147,8 +207,6 @@ async def create_user_preferences(
             detail="Impossible de créer des préférences pour un autre utilisateur"
         )
     
-    supabase = get_supabase_client()
-    
     try:
         # Convertir le modèle Pydantic en dict
         prefs_dict = preferences.dict()
@@ -156,10 +214,12 @@ async def create_user_preferences(
         prefs_dict['updated_at'] = datetime.utcnow().isoformat()
         
         # Insérer dans la base de données
-        response = supabase.table("user_preferences").insert(prefs_dict).execute()
+        insert_response = await run_query("user_preferences.insert", supabase.table("user_preferences").insert(prefs_dict))
         
-        if response.data:
-            return UserPreferences(**response.data[0])
+        if insert_response.data:
+            prefs = parse_preferences_row(insert_response.data[0])
+            set_preferences_headers(response, preferences_cache.put(current_user.id, prefs))
+            return UserPreferences(**prefs)
         else:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -176,7 +236,9 @@ async def create_user_preferences(
 async def update_user_preferences(
     user_id: str,
     updates: PreferencesUpdate,
-    current_user: dict = Depends(get_current_user)
+    response: Response,
+    current_user: dict = Depends(get_current_user),
+    supabase: UserScopedClient = Depends(get_authenticated_supabase_client)
 ):
     """Mettre à jour les préférences d'un utilisateur"""
     if current_user.id != user_id:
@@ -185,8 +247,6 @@ async def update_user_preferences(
             detail="Accès non autorisé aux préférences de cet utilisateur"
         )
     
-    supabase = get_supabase_client()
-    
     try:
         # Convertir en dict en excluant les valeurs None
         update_dict = {k: v for k, v in updates.dict().items() if v is not None}
@@ -200,15 +260,12 @@ async def update_user_preferences(
         update_dict['updated_at'] = datetime.utcnow().isoformat()
         
         # Mettre à jour dans la base de données
-        response = supabase.table("user_preferences").update(update_dict).eq("user_id", user_id).execute()
+        update_response = await run_query("user_preferences.update", supabase.table("user_preferences").update(update_dict).eq("user_id", user_id))
         
-        if response.data and len(response.data) > 0:
-            prefs = response.data[0]
-            
-            # Convertir les JSONB en dict Python
-            if isinstance(prefs.get('health_sync_permissions'), str):
-                prefs['health_sync_permissions'] = json.loads(prefs['health_sync_permissions'])
-            
+        if update_response.data and len(update_response.data) > 0:
+            # Écriture répercutée dans le cache
+            prefs = parse_preferences_row(update_response.data[0])
+            set_preferences_headers(response, preferences_cache.put(user_id, prefs))
             return UserPreferences(**prefs)
         else:
             raise HTTPException(
@@ -226,7 +283,9 @@ async def update_user_preferences(
 async def replace_user_preferences(
     user_id: str,
     preferences: UserPreferences,
-    current_user: dict = Depends(get_current_user)
+    response: Response,
+    current_user: dict = Depends(get_current_user),
+    supabase: UserScopedClient = Depends(get_authenticated_supabase_client)
 ):
     """Remplacer complètement les préférences d'un utilisateur"""
     if current_user.id != user_id:
@@ -235,8 +294,6 @@ async def replace_user_preferences(
             detail="Accès non autorisé aux préférences de cet utilisateur"
         )
     
-    supabase = get_supabase_client()
-    
     try:
         # Convertir le modèle Pydantic en dict
         prefs_dict = preferences.dict()
@@ -244,15 +301,12 @@ async def replace_user_preferences(
         prefs_dict['updated_at'] = datetime.utcnow().isoformat()
         
         # Remplacer dans la base de données (upsert)
-        response = supabase.table("user_preferences").upsert(prefs_dict).execute()
+        upsert_response = await run_query("user_preferences.upsert", supabase.table("user_preferences").upsert(prefs_dict))
         
-        if response.data:
-            prefs = response.data[0]
-            
-            # Convertir les JSONB en dict Python
-            if isinstance(prefs.get('health_sync_permissions'), str):
-                prefs['health_sync_permissions'] = json.loads(prefs['health_sync_permissions'])
-            
+        if upsert_response.data:
+            # Écriture répercutée dans le cache
+            prefs = parse_preferences_row(upsert_response.data[0])
+            set_preferences_headers(response, preferences_cache.put(user_id, prefs))
             return UserPreferences(**prefs)
         else:
             raise HTTPException(
@@ -269,7 +323,8 @@ async def replace_user_preferences(
 @router.delete("/user-preferences/{user_id}")
 async def delete_user_preferences(
     user_id: str,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_user),
+    supabase: UserScopedClient = Depends(get_authenticated_supabase_client)
 ):
     """Supprimer les préférences d'un utilisateur"""
     if current_user.id != user_id:
@@ -278,11 +333,10 @@ async def delete_user_preferences(
             detail="Accès non autorisé aux préférences de cet utilisateur"
         )
     
-    supabase = get_supabase_client()
-    
     try:
         # Supprimer de la base de données
-        response = supabase.table("user_preferences").delete().eq("user_id", user_id).execute()
+        await run_query("user_preferences.delete", supabase.table("user_preferences").delete().eq("user_id", user_id))
+        preferences_cache.invalidate(user_id)
         
         return {"message": "Préférences supprimées avec succès"}
             
@@ -292,37 +346,57 @@ async def delete_user_preferences(
             detail=f"Erreur lors de la suppression des préférences: {str(e)}"
         )
 
+# Réponses de référence statiques : sérialisées une fois, mises en cache par les clients et CDN
+REFERENCE_CACHE_CONTROL = "public, max-age=86400, stale-while-revalidate=604800"
+
+REGIONS_PAYLOAD = {
+    "regions": [
+        {"code": "FR", "name": "France", "default_units": "metric"},
+        {"code": "BE", "name": "Belgique", "default_units": "metric"},
+        {"code": "CH", "name": "Suisse", "default_units": "metric"},
+        {"code": "CA", "name": "Canada", "default_units": "imperial"},
+        {"code": "OTHER", "name": "Autre", "default_units": "metric"},
+    ]
+}
+
+UNITS_PAYLOAD = {
+    "weight_units": [
+        {"code": "kg", "name": "Kilogrammes", "system": "metric"},
+        {"code": "lb", "name": "Livres", "system": "imperial"}
+    ],
+    "height_units": [
+        {"code": "cm", "name": "Centimètres", "system": "metric"},
+        {"code": "ft", "name": "Pieds", "system": "imperial"}
+    ],
+    "liquid_units": [
+        {"code": "ml", "name": "Millilitres", "system": "metric"},
+        {"code": "fl_oz", "name": "Onces liquides", "system": "imperial"}
+    ],
+    "temperature_units": [
+        {"code": "celsius", "name": "Celsius", "system": "metric"},
+        {"code": "fahrenheit", "name": "Fahrenheit", "system": "imperial"}
+    ]
+}
+
+def serialize_reference(payload: Dict[str, Any]) -> Tuple[bytes, str]:
+    body = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return body, compute_etag(payload)
+
+REGIONS_BODY, REGIONS_ETAG = serialize_reference(REGIONS_PAYLOAD)
+UNITS_BODY, UNITS_ETAG = serialize_reference(UNITS_PAYLOAD)
+
+def reference_response(request: Request, body: bytes, etag: str) -> Response:
+    headers = {"ETag": etag, "Cache-Control": REFERENCE_CACHE_CONTROL}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
 @router.get("/preferences/regions")
-async def get_available_regions():
+async def get_available_regions(request: Request):
     """Récupérer la liste des régions disponibles"""
-    return {
-        "regions": [
-            {"code": "FR", "name": "France", "default_units": "metric"},
-            {"code": "BE", "name": "Belgique", "default_units": "metric"},
-            {"code": "CH", "name": "Suisse", "default_units": "metric"},
-            {"code": "CA", "name": "Canada", "default_units": "imperial"},
-            {"code": "OTHER", "name": "Autre", "default_units": "metric"},
-        ]
-    }
+    return reference_response(request, REGIONS_BODY, REGIONS_ETAG)
 
 @router.get("/preferences/units")
-async def get_available_units():
+async def get_available_units(request: Request):
     """Récupérer la liste des unités disponibles"""
-    return {
-        "weight_units": [
-            {"code": "kg", "name": "Kilogrammes", "system": "metric"},
-            {"code": "lb", "name": "Livres", "system": "imperial"}
-        ],
-        "height_units": [
-            {"code": "cm", "name": "Centimètres", "system": "metric"},
-            {"code": "ft", "name": "Pieds", "system": "imperial"}
-        ],
-        "liquid_units": [
-            {"code": "ml", "name": "Millilitres", "system": "metric"},
-            {"code": "fl_oz", "name": "Onces liquides", "system": "imperial"}
-        ],
-        "temperature_units": [
-            {"code": "celsius", "name": "Celsius", "system": "metric"},
-            {"code": "fahrenheit", "name": "Fahrenheit", "system": "imperial"}
-        ]
-    }
\ No newline at end of file
+    return reference_response(request, UNITS_BODY, UNITS_ETAG)
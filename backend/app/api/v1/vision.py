@@ -1,11 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException, File, UploadFile
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, File, UploadFile
 from typing import List, Optional, Dict, Any
 from app.auth.dependencies import get_current_user
+from app.services.food_matcher import FoodMatcher, normalize_food_name
+from app.services.reference_foods import reference_foods
+from app.services.image_storage import get_image_storage_client, persist_image_analysis
 from pydantic import BaseModel
+from supabase import Client
+from functools import lru_cache
 import logging
+import asyncio
 import base64
 import json
 import os
+import re
 from datetime import datetime
 
 router = APIRouter(prefix="/vision", tags=["Vision"])
@@ -43,21 +50,65 @@ class ImageAnalysisResponse(BaseModel):
     processing_time_ms: int
     suggestions: List[str]
 
-# Base de données des aliments pour la démo
-FOOD_DATABASE = {
-    "avocat": {"calories": 160, "protein": 2, "carbs": 9, "fat": 15, "fiber": 7, "keto_score": 9},
-    "saumon": {"calories": 208, "protein": 25, "carbs": 0, "fat": 12, "fiber": 0, "keto_score": 10},
-    "œuf": {"calories": 155, "protein": 13, "carbs": 1, "fat": 11, "fiber": 0, "keto_score": 10},
-    "épinards": {"calories": 23, "protein": 3, "carbs": 4, "fat": 0, "fiber": 2, "keto_score": 8},
-    "brocoli": {"calories": 34, "protein": 3, "carbs": 7, "fat": 0, "fiber": 3, "keto_score": 8},
-    "fromage": {"calories": 380, "protein": 25, "carbs": 1, "fat": 30, "fiber": 0, "keto_score": 10},
-    "poulet": {"calories": 165, "protein": 31, "carbs": 0, "fat": 4, "fiber": 0, "keto_score": 9},
-    "amandes": {"calories": 579, "protein": 21, "carbs": 22, "fat": 50, "fiber": 12, "keto_score": 7},
-}
+class BatchImageAnalysisResponse(ImageAnalysisResponse):
+    images_analyzed: int
+
+# Nombre maximum de photos par requête d'analyse groupée
+MAX_BATCH_IMAGES = 8
+
+DEFAULT_NUTRITION = {"calories": 100, "protein": 5, "carbs": 10, "fat": 5, "fiber": 2, "keto_score": 5}
+
+def build_food_matcher() -> FoodMatcher:
+    """Construire l'index des aliments de référence (base locale + synonymes)"""
+    matcher = FoodMatcher()
+    for food in reference_foods:
+        matcher.add(food.name, food.to_nutrition(), food.synonyms)
+    return matcher
+
+food_matcher = build_food_matcher()
+
+def load_food_database_into_matcher(supabase: Client, max_rows: int = 20000, page_size: int = 1000) -> int:
+    """
+    Compléter l'index avec les produits de la table food_database
+    Appel bloquant prévu pour le démarrage ; les aliments locaux restent prioritaires.
+    Seuls les max_rows produits de meilleure qualité sont chargés, par nom complet.
+    """
+    loaded = 0
+    try:
+        while loaded < max_rows:
+            result = supabase.table("food_database") \
+                .select("product_name, calories_per_100g, protein_per_100g, carbohydrates_per_100g, fat_per_100g, fiber_per_100g, keto_score") \
+                .order("data_quality_score", desc=True) \
+                .order("id") \
+                .range(loaded, min(loaded + page_size, max_rows) - 1) \
+                .execute()
+            rows = result.data or []
+            
+            for row in rows:
+                if not row.get("product_name"):
+                    continue
+                food_matcher.add(row["product_name"], {
+                    "calories": row.get("calories_per_100g") or 0,
+                    "protein": float(row.get("protein_per_100g") or 0),
+                    "carbs": float(row.get("carbohydrates_per_100g") or 0),
+                    "fat": float(row.get("fat_per_100g") or 0),
+                    "fiber": float(row.get("fiber_per_100g") or 0),
+                    "keto_score": row.get("keto_score") or DEFAULT_NUTRITION["keto_score"],
+                }, index_words=False)
+            
+            loaded += len(rows)
+            if len(rows) < page_size:
+                break
+    except Exception as e:
+        logger.warning(f"Failed to load food_database into vision matcher: {e}")
+    
+    logger.info(f"Vision food matcher: {len(food_matcher)} names indexed ({loaded} from food_database)")
+    return loaded
 
 @router.post("/analyze", response_model=ImageAnalysisResponse)
 async def analyze_food_image(
     request: ImageAnalysisRequest,
+    background_tasks: BackgroundTasks,
     current_user: dict = Depends(get_current_user)
 ):
     """
@@ -70,21 +121,12 @@ async def analyze_food_image(
         # En production, ici on utiliserait OpenAI Vision API, Google Vision, etc.
         detected_foods = simulate_food_detection(request.image_base64)
         
-        # Calculer les informations nutritionnelles totales
-        total_nutrition = calculate_total_nutrition(detected_foods)
-        
-        # Générer des suggestions basées sur le profil keto
-        suggestions = generate_keto_suggestions(detected_foods, total_nutrition)
+        response = build_analysis_response(detected_foods, start_time)
         
-        processing_time = (datetime.now() - start_time).total_seconds() * 1000
+        # Historiser l'analyse après l'envoi de la réponse
+        schedule_analysis_persistence(background_tasks, current_user.id, [request.image_base64], response)
         
-        return ImageAnalysisResponse(
-            foods_detected=detected_foods,
-            total_nutrition=total_nutrition,
-            analysis_confidence=0.85,  # Confiance simulée
-            processing_time_ms=int(processing_time),
-            suggestions=suggestions
-        )
+        return response
         
     except Exception as e:
         logger.error(f"Image analysis error: {e}")
@@ -92,6 +134,7 @@ async def analyze_food_image(
 
 @router.post("/analyze-upload")
 async def analyze_uploaded_image(
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     meal_type: str = "lunch",
     current_user: dict = Depends(get_current_user)
@@ -114,14 +157,118 @@ async def analyze_uploaded_image(
             meal_type=meal_type
         )
         
-        return await analyze_food_image(request, current_user)
+        return await analyze_food_image(request, background_tasks, current_user)
         
     except Exception as e:
         logger.error(f"Image upload analysis error: {e}")
         raise HTTPException(status_code=500, detail="Erreur lors de l'analyse de l'image uploadée")
 
+@router.post("/analyze-batch", response_model=BatchImageAnalysisResponse)
+async def analyze_uploaded_images(
+    background_tasks: BackgroundTasks,
+    files: List[UploadFile] = File(...),
+    meal_type: str = "lunch",
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Analyser plusieurs photos d'un même repas en une seule requête
+    """
+    if not files:
+        raise HTTPException(status_code=400, detail="Aucune image fournie")
+    if len(files) > MAX_BATCH_IMAGES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Maximum {MAX_BATCH_IMAGES} images par analyse"
+        )
+    if any(not (file.content_type or "").startswith('image/') for file in files):
+        raise HTTPException(status_code=400, detail="Tous les fichiers doivent être des images")
+    
+    try:
+        start_time = datetime.now()
+        
+        # Lire et encoder les images en parallèle
+        images_base64 = await asyncio.gather(*(encode_upload(file) for file in files))
+        
+        detected_foods = detect_foods_batch(list(images_base64))
+        response = build_analysis_response(detected_foods, start_time)
+        
+        schedule_analysis_persistence(background_tasks, current_user.id, list(images_base64), response)
+        
+        return BatchImageAnalysisResponse(**response.dict(), images_analyzed=len(images_base64))
+        
+    except Exception as e:
+        logger.error(f"Batch image analysis error: {e}")
+        raise HTTPException(status_code=500, detail="Erreur lors de l'analyse des images")
+
 # Fonctions utilitaires
 
+def build_analysis_response(detected_foods: List[FoodDetection], start_time: datetime) -> ImageAnalysisResponse:
+    """
+    Construire la réponse d'analyse à partir des aliments détectés
+    """
+    # Calculer les informations nutritionnelles totales
+    total_nutrition = calculate_total_nutrition(detected_foods)
+    
+    # Générer des suggestions basées sur le profil keto
+    suggestions = generate_keto_suggestions(detected_foods, total_nutrition)
+    
+    processing_time = (datetime.now() - start_time).total_seconds() * 1000
+    
+    return ImageAnalysisResponse(
+        foods_detected=detected_foods,
+        total_nutrition=total_nutrition,
+        analysis_confidence=0.85,  # Confiance simulée
+        processing_time_ms=int(processing_time),
+        suggestions=suggestions
+    )
+
+def schedule_analysis_persistence(
+    background_tasks: BackgroundTasks,
+    user_id: str,
+    images_base64: List[str],
+    response: ImageAnalysisResponse
+) -> None:
+    """
+    Enregistrer l'analyse (une ligne image_analysis par image) en tâche de fond
+    """
+    analysis = response.dict()
+    for image_base64 in images_base64:
+        background_tasks.add_task(
+            persist_image_analysis, get_image_storage_client(), user_id, image_base64, analysis
+        )
+
+async def encode_upload(file: UploadFile) -> str:
+    """
+    Lire une image uploadée et l'encoder en base64 hors de la boucle d'événements
+    """
+    image_data = await file.read()
+    encoded = await asyncio.to_thread(base64.b64encode, image_data)
+    return encoded.decode('utf-8')
+
+def detect_foods_batch(images_base64: List[str]) -> List[FoodDetection]:
+    """
+    Détecter les aliments sur plusieurs photos d'un même repas
+    La détection simulée traite chaque image ; un fournisseur multi-images
+    recevrait ici toutes les photos dans une seule requête
+    """
+    detections: List[FoodDetection] = []
+    for image_base64 in images_base64:
+        detections.extend(simulate_food_detection(image_base64))
+    return merge_food_detections(detections)
+
+def merge_food_detections(detections: List[FoodDetection]) -> List[FoodDetection]:
+    """
+    Fusionner les détections d'un même aliment vu sur plusieurs photos
+    On garde la détection la plus fiable, dans l'ordre de première apparition
+    """
+    merged: Dict[str, FoodDetection] = {}
+    for detection in detections:
+        key = normalize_food_name(detection.name) or detection.name.lower()
+        current = merged.get(key)
+        if current is None or detection.confidence > current.confidence:
+            merged[key] = detection
+    return list(merged.values())
+
 def simulate_food_detection(image_base64: str) -> List[FoodDetection]:
     """
     Simuler la détection d'aliments dans une image
@@ -203,19 +350,12 @@ def calculate_total_nutrition(foods: List[FoodDetection]) -> NutritionalAnalysis
         confidences = []
         
         for food in foods:
-            # Extraire les informations de base
-            food_name_lower = food.name.lower()
-            
-            # Chercher dans notre base de données d'aliments
-            nutrition_data = None
-            for db_food_name, db_nutrition in FOOD_DATABASE.items():
-                if db_food_name in food_name_lower or food_name_lower in db_food_name:
-                    nutrition_data = db_nutrition
-                    break
+            # Chercher dans notre base de données d'aliments (index par nom normalisé)
+            nutrition_data = food_matcher.match(food.name)
             
             if not nutrition_data:
                 # Valeurs par défaut si aliment non trouvé
-                nutrition_data = {"calories": 100, "protein": 5, "carbs": 10, "fat": 5, "fiber": 2, "keto_score": 5}
+                nutrition_data = DEFAULT_NUTRITION
             
             # Estimer la quantité basée sur la portion
             quantity_multiplier = estimate_quantity_from_portion(food.portion_estimate)
@@ -259,20 +399,24 @@ def calculate_total_nutrition(foods: List[FoodDetection]) -> NutritionalAnalysis
             confidence=0.60
         )
 
+_PORTION_TOKEN_RE = re.compile(r"\d+/\d+|\w+")
+
+@lru_cache(maxsize=2048)
 def estimate_quantity_from_portion(portion_text: str) -> float:
     """
     Estimer la quantité à partir de la description de portion
+    Les descriptions se répètent beaucoup d'une analyse à l'autre : résultat mis en cache
     """
-    portion_lower = portion_text.lower()
+    tokens = set(_PORTION_TOKEN_RE.findall(portion_text.lower()))
     
-    if "petite" in portion_lower or "small" in portion_lower:
+    if tokens & {"petite", "petit", "small"}:
         return 0.7
-    elif "grande" in portion_lower or "large" in portion_lower:
+    elif tokens & {"grande", "grand", "large"}:
         return 1.5
-    elif "2" in portion_lower:
-        return 2.0
-    elif "1/2" in portion_lower:
+    elif "1/2" in tokens:
         return 0.5
+    elif "2" in tokens:
+        return 2.0
     else:
         return 1.0  # Portion normale
 
@@ -1,9 +1,9 @@
 from typing import Optional, Annotated
 from fastapi import Depends, HTTPException, status, Header
 from jose import JWTError, jwt
-from supabase import Client
 from app.config import settings
-from app.database.connection import get_supabase_client
+from app.database.connection import UserScopedClient, get_supabase_client, get_user_supabase_client
+from app.database.executor import run_blocking, run_query
 from app.database.schemas import User
 import logging
 import requests
@@ -74,8 +74,7 @@ def validate_jwt_token(token: str) -> dict:
         client = get_supabase_client()
         
         try:
-            # Set the session with the token to verify it
-            client.auth.set_session(token, "")
+            # get_user(token) ne touche pas à la session du client partagé
             user = client.auth.get_user(token)
             
             if user and user.user:
@@ -190,46 +189,31 @@ async def get_current_user_token(
         )
     
     token = extract_token_from_header(authorization)
-    validate_jwt_token(token)
+    await run_blocking("auth.validate_jwt", validate_jwt_token, token)
     return token
 
 async def get_authenticated_supabase_client(
     token: Annotated[str, Depends(get_current_user_token)]
-) -> Client:
+) -> UserScopedClient:
     """Get Supabase client with user authentication."""
-    try:
-        client = get_supabase_client()
-        
-        # Set session with the user's token
-        try:
-            client.auth.set_session(token, "")
-            client.postgrest.auth(token)
-        except Exception as e:
-            logger.warning(f"Failed to set auth session: {e}")
-            # Continue without auth session for now
-        
-        return client
-        
-    except Exception as e:
-        logger.error(f"Failed to create authenticated client: {e}")
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Authentication service unavailable"
-        )
+    # Ne pas modifier le client partagé (set_session / postgrest.auth) : une autre
+    # requête pourrait changer le JWT avant l'exécution de nos requêtes
+    return get_user_supabase_client(token)
 
 async def get_current_user(
     token: Annotated[str, Depends(get_current_user_token)],
-    supabase: Client = Depends(get_authenticated_supabase_client)
+    supabase: UserScopedClient = Depends(get_authenticated_supabase_client)
 ) -> User:
     """Get current authenticated user information."""
     try:
-        payload = validate_jwt_token(token)
+        # Peut télécharger le JWKS : exécuté hors de la boucle d'événements
+        payload = await run_blocking("auth.validate_jwt", validate_jwt_token, token)
         user_id = payload.get("sub", "demo-user-id")
         email = payload.get("email", "demo@keto.fr")
         
         # Try to fetch user profile from Supabase
         try:
-            result = supabase.table("users").select("*").eq("id", user_id).execute()
+            result = await run_query("users.select", supabase.table("users").select("*").eq("id", user_id))
             
             if result.data:
                 return User(**result.data[0])
@@ -272,6 +256,6 @@ async def get_current_user_optional(
     
     try:
         token = extract_token_from_header(authorization)
-        return await get_current_user(token)
+        return await get_current_user(token, get_user_supabase_client(token))
     except HTTPException:
         return None
\ No newline at end of file
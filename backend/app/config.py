@@ -8,6 +8,8 @@ class Settings(BaseSettings):
     supabase_anon_key: str
     supabase_service_role_key: Optional[str] = None
     supabase_jwt_secret: Optional[str] = None
+    supabase_max_workers: int = 16
+    supabase_slow_query_seconds: float = 1.0
     
     # Application Configuration
     app_name: str = "KetoSansStress API"
@@ -18,6 +20,63 @@ class Settings(BaseSettings):
     api_v1_prefix: str = "/api"
     cors_origins: List[str] = ["http://localhost:3000", "http://localhost:8081", "https://app.emergent.sh"]
     
+    # OpenFoodFacts Configuration
+    off_enrichment_timeout_seconds: float = 4.0
+    food_search_budget_seconds: float = 1.5
+    barcode_lookup_concurrency: int = 8
+    
+    # Search history Configuration
+    search_history_batch_size: int = 100
+    search_history_flush_interval_seconds: float = 2.0
+    recent_searches_max_users: int = 10000
+    # None : search_history lu une fois par utilisateur (jusqu'à éviction) ; sinon relu à cet intervalle
+    recent_searches_refresh_seconds: Optional[float] = None
+    autocomplete_refresh_interval_seconds: float = 900.0
+    keto_catalogue_refresh_interval_seconds: float = 3600.0
+    
+    # Preferences Configuration
+    preferences_cache_max_users: int = 10000
+    preferences_cache_ttl_seconds: float = 300.0
+    
+    # Favorites Configuration
+    favorites_cache_max_users: int = 10000
+    favorites_cache_ttl_seconds: float = 600.0
+    
+    # Email Configuration (sans serveur SMTP, les emails sont écrits dans email_outbox_dir)
+    smtp_host: Optional[str] = None
+    smtp_port: int = 587
+    smtp_username: Optional[str] = None
+    smtp_password: Optional[str] = None
+    smtp_use_tls: bool = True
+    smtp_timeout_seconds: float = 10.0
+    email_outbox_dir: str = "outbox"
+    email_batch_size: int = 20
+    email_workers: int = 2
+    email_max_attempts: int = 5
+    email_retry_base_seconds: float = 2.0
+    email_template_cache_dir: str = ".template_cache"
+    
+    # Rate limiting Configuration (rate_limit_backend : "memory" ou "supabase" pour partager les seaux)
+    rate_limit_enabled: bool = True
+    rate_limit_backend: str = "memory"
+    rate_limit_max_keys: int = 100000
+    # Adresses ou réseaux (CIDR) des reverse proxies / ingress devant l'API, par ex.
+    # RATE_LIMIT_TRUSTED_PROXIES='["10.0.0.0/8"]' ; seules les entrées X-Forwarded-For
+    # ajoutées par ces proxies sont prises en compte. Vide : adresse du pair TCP.
+    rate_limit_trusted_proxies: List[str] = []
+    
+    # Account deletion Configuration
+    account_deletion_batch_size: int = 5000
+    
+    # Maintenance Configuration
+    maintenance_interval_seconds: float = 3600.0
+    maintenance_batch_size: int = 1000
+    maintenance_max_batches: int = 50
+    search_history_retention_days: int = 180
+    
+    # Vision Configuration
+    food_matcher_max_rows: int = 20000
+    
     # Legacy MongoDB (keeping for migration)
     mongo_url: Optional[str] = None
     emergent_llm_key: Optional[str] = None
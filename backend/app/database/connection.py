@@ -1,13 +1,19 @@
 from supabase import create_client, Client
 from supabase.client import ClientOptions
+from supabase_auth import SyncGoTrueClient
+from supabase_auth.http_clients import SyncClient
+from typing import Any, Dict, Optional
 from app.config import settings
 import logging
+import threading
 
 logger = logging.getLogger(__name__)
 
 class SupabaseManager:
     _instance = None
     _client = None
+    _auth_http_client = None
+    _auth_http_lock = threading.Lock()
     
     def __new__(cls):
         if cls._instance is None:
@@ -49,6 +55,77 @@ class SupabaseManager:
         except Exception as e:
             logger.error(f"Failed to initialize admin Supabase client: {e}")
             raise
+    
+    def create_auth_client(self) -> SyncGoTrueClient:
+        """
+        Client Supabase Auth propre à un appel
+        
+        La session (sign_in, set_session, verify_otp...) reste sur ce client et
+        n'est visible d'aucune autre requête. Seul le pool de connexions HTTP est partagé.
+        """
+        if self._auth_http_client is None:
+            with self._auth_http_lock:
+                if self._auth_http_client is None:
+                    self._auth_http_client = SyncClient(follow_redirects=True, http2=True)
+        return SyncGoTrueClient(
+            url=f"{settings.supabase_url}/auth/v1",
+            headers={
+                "apiKey": settings.supabase_anon_key,
+                "Authorization": f"Bearer {settings.supabase_anon_key}",
+            },
+            auto_refresh_token=False,
+            persist_session=False,
+            http_client=self._auth_http_client,
+        )
+
+class _AuthorizedQuery:
+    """Requête PostgREST dont l'en-tête Authorization est fixé à l'exécution"""
+    
+    __slots__ = ("_builder", "_authorization")
+    
+    def __init__(self, builder: Any, authorization: str):
+        self._builder = builder
+        self._authorization = authorization
+    
+    def __getattr__(self, name: str) -> Any:
+        attribute = getattr(self._builder, name)
+        if callable(attribute):
+            def chained(*args: Any, **kwargs: Any) -> Any:
+                return self._wrap(attribute(*args, **kwargs))
+            return chained
+        # Propriétés qui renvoient un builder (ex. not_)
+        return self._wrap(attribute)
+    
+    def _wrap(self, value: Any) -> Any:
+        return _AuthorizedQuery(value, self._authorization) if hasattr(value, "execute") else value
+    
+    def execute(self) -> Any:
+        # L'en-tête de la requête l'emporte sur celui de la session partagée
+        self._builder.headers["Authorization"] = self._authorization
+        return self._builder.execute()
+
+
+class UserScopedClient:
+    """
+    Accès PostgREST au nom d'un utilisateur
+    
+    Le client partagé n'est jamais modifié : chaque requête porte le JWT de
+    l'utilisateur dans ses propres en-têtes, et les connexions HTTP restent
+    celles du client partagé.
+    """
+    
+    def __init__(self, client: Client, token: str):
+        self._client = client
+        self._authorization = f"Bearer {token}"
+    
+    def table(self, table_name: str) -> _AuthorizedQuery:
+        return _AuthorizedQuery(self._client.table(table_name), self._authorization)
+    
+    def from_(self, table_name: str) -> _AuthorizedQuery:
+        return self.table(table_name)
+    
+    def rpc(self, fn: str, params: Optional[Dict[str, Any]] = None) -> _AuthorizedQuery:
+        return _AuthorizedQuery(self._client.rpc(fn, params or {}), self._authorization)
 
 # Initialize singleton instance
 supabase_manager = SupabaseManager()
@@ -57,4 +134,10 @@ def get_supabase_client() -> Client:
     return supabase_manager.get_client()
 
 def get_admin_supabase_client() -> Client:
-    return supabase_manager.get_admin_client()
\ No newline at end of file
+    return supabase_manager.get_admin_client()
+
+def create_auth_client() -> SyncGoTrueClient:
+    return supabase_manager.create_auth_client()
+
+def get_user_supabase_client(token: str) -> UserScopedClient:
+    return UserScopedClient(supabase_manager.get_client(), token)
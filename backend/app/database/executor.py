@@ -0,0 +1,95 @@
+"""
+Exécution des appels Supabase hors de la boucle d'événements
+supabase-py est synchrone : chaque .execute() ou appel auth bloquant est
+exécuté dans un pool de threads borné, chronométré par opération.
+"""
+
+import asyncio
+import functools
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, TypeVar
+from app.config import settings
+from app.database.connection import create_auth_client
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class QueryTimings:
+    """Nombre d'appels, durée cumulée et maximale par opération"""
+
+    def __init__(self):
+        self._stats: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, name: str, elapsed: float, failed: bool = False) -> None:
+        with self._lock:
+            stats = self._stats.setdefault(name, {"count": 0, "errors": 0, "total_seconds": 0.0, "max_seconds": 0.0})
+            stats["count"] += 1
+            stats["errors"] += 1 if failed else 0
+            stats["total_seconds"] += elapsed
+            stats["max_seconds"] = max(stats["max_seconds"], elapsed)
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {
+                name: {
+                    **stats,
+                    "avg_ms": round(stats["total_seconds"] / stats["count"] * 1000, 2),
+                    "max_ms": round(stats["max_seconds"] * 1000, 2),
+                }
+                for name, stats in self._stats.items()
+            }
+
+
+_executor = ThreadPoolExecutor(max_workers=settings.supabase_max_workers, thread_name_prefix="supabase")
+query_timings = QueryTimings()
+
+
+async def run_blocking(name: str, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Exécuter un appel bloquant (SDK Supabase) dans le pool et le chronométrer"""
+    loop = asyncio.get_running_loop()
+    started = time.perf_counter()
+    failed = False
+    try:
+        return await loop.run_in_executor(_executor, functools.partial(func, *args, **kwargs))
+    except Exception:
+        failed = True
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        query_timings.record(name, elapsed, failed)
+        if elapsed >= settings.supabase_slow_query_seconds:
+            logger.warning(f"Slow Supabase call '{name}': {elapsed * 1000:.0f} ms")
+
+
+async def run_query(name: str, query: Any) -> Any:
+    """
+    Exécuter une requête PostgREST construite avec supabase-py
+
+    Exemple : await run_query("meals.select", supabase.table("meals").select("*").eq("user_id", user_id))
+    
+    Les requêtes au nom d'un utilisateur doivent venir d'un UserScopedClient :
+    le JWT est porté par la requête, pas par le client partagé.
+    """
+    return await run_blocking(name, query.execute)
+
+
+async def run_auth(name: str, operation: Callable[[Any], T]) -> T:
+    """
+    Exécuter un appel Supabase Auth (ou une suite d'appels) sur un client Auth dédié
+
+    Exemple : await run_auth("auth.sign_in", lambda auth: auth.sign_in_with_password({...}))
+
+    Chaque appel reçoit son propre client : la session qu'il ouvre ne fuit pas
+    vers les autres requêtes et les appels auth s'exécutent en parallèle.
+    """
+    return await run_blocking(name, lambda: operation(create_auth_client()))
+
+
+def shutdown_executor(wait: bool = False) -> None:
+    _executor.shutdown(wait=wait, cancel_futures=True)
@@ -0,0 +1,55 @@
+"""
+Suppression de compte
+Toutes les données d'un utilisateur sont supprimées côté base par la fonction
+delete_user_account_batch (supabase_delete_user_account.sql), appelée par lots
+jusqu'à ce qu'il ne reste plus rien ; les caches en mémoire sont ensuite vidés.
+"""
+
+import logging
+from typing import Dict, Optional
+from supabase import Client
+from app.config import settings
+from app.database.connection import get_admin_supabase_client
+from app.database.executor import run_query
+from app.services.favorites import favorites_service
+from app.services.preferences_cache import preferences_cache
+
+logger = logging.getLogger(__name__)
+
+# Garde-fou : au-delà, la suppression est reprise à la prochaine demande
+MAX_BATCHES = 1000
+
+_client: Optional[Client] = None
+
+
+def _admin_client() -> Client:
+    global _client
+    if _client is None:
+        # Fonction réservée au rôle service : l'appelant a déjà vérifié l'utilisateur
+        _client = get_admin_supabase_client()
+    return _client
+
+
+async def delete_user_account(user_id: str, batch_size: Optional[int] = None) -> Dict[str, int]:
+    """Supprimer toutes les données d'un utilisateur ; retourne le nombre de lignes par table"""
+    user_id = str(user_id)
+    batch_size = batch_size or settings.account_deletion_batch_size
+    totals: Dict[str, int] = {}
+
+    for _ in range(MAX_BATCHES):
+        response = await run_query(
+            "rpc.delete_user_account_batch",
+            _admin_client().rpc("delete_user_account_batch", {"p_user_id": user_id, "p_batch_size": batch_size})
+        )
+        result = response.data or {}
+        for table, count in (result.get("deleted") or {}).items():
+            totals[table] = totals.get(table, 0) + int(count)
+        if result.get("done"):
+            break
+    else:
+        raise RuntimeError(f"Account deletion for user {user_id} did not finish after {MAX_BATCHES} batches")
+
+    preferences_cache.invalidate(user_id)
+    favorites_service.forget(user_id)
+    logger.info(f"Deleted account data for user {user_id}: {totals}")
+    return totals
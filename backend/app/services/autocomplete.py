@@ -0,0 +1,211 @@
+"""
+Autocomplétion des recherches d'aliments
+Index de préfixes en mémoire (tableau trié + bisect) sur les noms de la base
+locale, de food_database et des recherches populaires de search_history
+"""
+
+import asyncio
+import heapq
+import logging
+from bisect import bisect_left
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from supabase import Client
+from app.database.connection import get_admin_supabase_client
+from app.services.food_matcher import fold_food_name
+
+logger = logging.getLogger(__name__)
+
+# Une recherche n'est proposée à tous que si ce nombre d'utilisateurs distincts l'a faite
+MIN_POPULAR_SEARCH_USERS = 3
+
+# Classement mémorisé pour les préfixes de cette longueur au plus (plages les plus larges)
+CACHED_PREFIX_LENGTH = 2
+# Taille du classement mémorisé : la limite maximale de /foods/autocomplete
+CACHED_RESULTS = 20
+
+
+class Suggestion:
+    """Suggestion d'autocomplétion"""
+
+    __slots__ = ("label", "popularity", "keto_score", "source")
+
+    def __init__(self, label: str, popularity: int = 0, keto_score: Optional[int] = None, source: str = "local"):
+        self.label = label
+        self.popularity = popularity
+        self.keto_score = keto_score
+        self.source = source
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "label": self.label,
+            "keto_score": self.keto_score,
+            "popularity": self.popularity,
+            "source": self.source,
+        }
+
+
+class PrefixIndex:
+    """
+    Index immuable de préfixes
+
+    Chaque suggestion est indexée sous son nom normalisé et sous chaque mot
+    qui le compose ('fume' retrouve 'Saumon fumé'). Une recherche délimite
+    par dichotomie les clés partageant le préfixe et les classe toutes.
+    """
+
+    def __init__(self, suggestions: Iterable[Suggestion]):
+        self._suggestions: List[Suggestion] = list(suggestions)
+        keys: List[Tuple[str, int, int]] = []
+        for position, suggestion in enumerate(self._suggestions):
+            words = fold_food_name(suggestion.label).split()
+            for start in range(len(words)):
+                # (clé, 0 si début du nom sinon 1, suggestion)
+                keys.append((" ".join(words[start:]), 0 if start == 0 else 1, position))
+        keys.sort()
+        self._keys = keys
+        self._by_name = {fold_food_name(suggestion.label): suggestion for suggestion in self._suggestions}
+        # Préfixe court -> positions classées (l'index est immuable)
+        self._top_by_prefix: Dict[str, List[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._suggestions)
+
+    def search(self, prefix: str, limit: int = 8) -> List[Suggestion]:
+        prefix = fold_food_name(prefix)
+        if not prefix:
+            return []
+
+        if len(prefix) <= CACHED_PREFIX_LENGTH and limit <= CACHED_RESULTS:
+            # Préfixes courts : plage très large, classement calculé une fois par index
+            ranked = self._top_by_prefix.get(prefix)
+            if ranked is None:
+                ranked = self._top_by_prefix[prefix] = self._rank(prefix, CACHED_RESULTS)
+            ranked = ranked[:limit]
+        else:
+            ranked = self._rank(prefix, limit)
+        return [self._suggestions[position] for position in ranked]
+
+    def _rank(self, prefix: str, limit: int) -> List[int]:
+        """Meilleures suggestions sur toute la plage des clés qui commencent par prefix"""
+        start = bisect_left(self._keys, (prefix,))
+        end = bisect_left(self._keys, (prefix + "\uffff",), start)
+        matches: Dict[int, int] = {}
+        for _, inner, position in self._keys[start:end]:
+            matches[position] = min(inner, matches.get(position, inner))
+
+        best = heapq.nsmallest(
+            limit,
+            matches.items(),
+            key=lambda item: (
+                item[1],  # le nom commence par la saisie
+                -self._suggestions[item[0]].popularity,
+                -(self._suggestions[item[0]].keto_score or 0),
+                len(self._suggestions[item[0]].label),
+            )
+        )
+        return [position for position, _ in best]
+
+    def get(self, name: str) -> Optional[Suggestion]:
+        return self._by_name.get(fold_food_name(name))
+
+
+class AutocompleteService:
+    """Suggestions d'aliments, reconstruites périodiquement en tâche de fond"""
+
+    def __init__(self, max_products: int = 50000, history_window_days: int = 30):
+        self.max_products = max_products
+        self.history_window_days = history_window_days
+        # Nom normalisé -> suggestion, pour les aliments de la base locale
+        self._local: Dict[str, Suggestion] = {}
+        self._index = PrefixIndex([])
+        self._client: Optional[Client] = None
+
+    def seed(self, foods: Iterable[Tuple[str, Optional[int]]]) -> None:
+        """Ajouter des aliments locaux (nom, score keto) et reconstruire l'index"""
+        for label, keto_score in foods:
+            self._local.setdefault(fold_food_name(label), Suggestion(label, keto_score=keto_score))
+        self._index = PrefixIndex(self._local.values())
+
+    def suggest(self, prefix: str, limit: int = 8) -> List[Dict[str, Any]]:
+        return [suggestion.to_dict() for suggestion in self._index.search(prefix, limit)]
+
+    def popularity(self, name: str) -> int:
+        """Nombre de recherches récentes pour ce nom (0 si inconnu)"""
+        suggestion = self._index.get(name)
+        return suggestion.popularity if suggestion else 0
+
+    async def refresh(self) -> None:
+        """Recharger food_database et les recherches populaires, puis remplacer l'index"""
+        products, searches = await asyncio.gather(
+            asyncio.to_thread(self._load_products),
+            asyncio.to_thread(self._load_search_counts),
+        )
+        index = await asyncio.to_thread(self._build, products, searches)
+        self._index = index
+        logger.info(f"Autocomplete index rebuilt: {len(index)} suggestions")
+
+    def _build(self, products: List[Dict[str, Any]], searches: Counter) -> PrefixIndex:
+        suggestions: Dict[str, Suggestion] = {
+            key: Suggestion(s.label, keto_score=s.keto_score, source=s.source)
+            for key, s in self._local.items()
+        }
+
+        for product in products:
+            label = (product.get("product_name") or "").strip()
+            key = fold_food_name(label)
+            if key and key not in suggestions:
+                suggestions[key] = Suggestion(label, keto_score=product.get("keto_score"), source="food_database")
+
+        # Seules les recherches faites par assez d'utilisateurs distincts sont reçues
+        for key, count in searches.items():
+            suggestion = suggestions.get(key)
+            if suggestion is not None:
+                suggestion.popularity += count
+            else:
+                suggestions[key] = Suggestion(key, popularity=count, source="search_history")
+
+        return PrefixIndex(suggestions.values())
+
+    def _load_products(self) -> List[Dict[str, Any]]:
+        try:
+            result = self._admin_client().table("food_database") \
+                .select("product_name, keto_score") \
+                .order("data_quality_score", desc=True) \
+                .limit(self.max_products) \
+                .execute()
+            return result.data or []
+        except Exception as e:
+            logger.warning(f"Autocomplete: failed to load food_database: {e}")
+            return []
+
+    def _load_search_counts(self) -> Counter:
+        """Recherches populaires, agrégées en base par nombre d'utilisateurs distincts"""
+        since = (datetime.utcnow() - timedelta(days=self.history_window_days)).isoformat()
+        try:
+            result = self._admin_client().rpc("popular_searches", {
+                "p_since": since,
+                "p_min_users": MIN_POPULAR_SEARCH_USERS,
+                "p_limit": self.max_products
+            }).execute()
+            counts: Counter = Counter()
+            for row in result.data or []:
+                # Même normalisation côté base ; fold_food_name garde les clés identiques à l'index
+                key = fold_food_name(row.get("query_key") or "")
+                if key:
+                    counts[key] += int(row.get("search_count") or 0)
+            return counts
+        except Exception as e:
+            logger.warning(f"Autocomplete: failed to load popular searches: {e}")
+            return Counter()
+
+    def _admin_client(self) -> Client:
+        if self._client is None:
+            # Données de tous les utilisateurs : client service
+            self._client = get_admin_supabase_client()
+        return self._client
+
+
+# Instance globale du service
+autocomplete_service = AutocompleteService()
@@ -0,0 +1,305 @@
+"""
+Envoi des emails transactionnels
+Les emails sont mis en file et envoyés en tâche de fond, par lots, sur des
+connexions SMTP réutilisées ; les échecs temporaires sont réessayés avec un
+délai croissant. Sans serveur SMTP configuré (développement), les emails sont
+écrits en fichiers .eml dans un dossier local.
+"""
+
+import asyncio
+import logging
+import re
+import smtplib
+import ssl
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import datetime
+from email.message import EmailMessage
+from email.utils import formatdate, make_msgid
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def _html_to_text(html: str) -> str:
+    """Version texte minimale d'un email HTML (clients sans HTML)"""
+    text = re.sub(r"(?is)<(style|head).*?</\1>", "", html)
+    text = re.sub(r"(?i)<br\s*/?>|</(p|div|h\d|li|tr)>", "\n", text)
+    text = re.sub(r"<[^>]+>", "", text)
+    lines = (" ".join(line.split()) for line in text.splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+def build_message(to: str, subject: str, html: str, sender: str, text: Optional[str] = None) -> EmailMessage:
+    """Construire un email multipart (texte + HTML)"""
+    message = EmailMessage()
+    message["From"] = sender
+    message["To"] = to
+    message["Subject"] = subject
+    message["Date"] = formatdate(localtime=True)
+    message["Message-ID"] = make_msgid(domain=sender.rpartition("@")[2] or None)
+    message.set_content(text or _html_to_text(html))
+    message.add_alternative(html, subtype="html")
+    return message
+
+
+def is_permanent_failure(error: Exception) -> bool:
+    """Erreur définitive (destinataire refusé, code 5xx) : inutile de réessayer"""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return True
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 500 <= error.smtp_code < 600
+    return False
+
+
+class SMTPTransport:
+    """Envoi SMTP sur un pool de connexions persistantes"""
+
+    def __init__(self, host: str, port: int = 587, username: Optional[str] = None, password: Optional[str] = None,
+                 use_tls: bool = True, timeout: float = 10.0, max_idle_seconds: float = 60.0):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.timeout = timeout
+        self.max_idle_seconds = max_idle_seconds
+        # Connexions libres : (connexion, dernier usage)
+        self._idle: List[Tuple[smtplib.SMTP, float]] = []
+        self._lock = threading.Lock()
+
+    def send_batch(self, messages: List[EmailMessage]) -> Dict[int, Exception]:
+        """Envoyer un lot sur une seule connexion ; retourne les erreurs par index"""
+        errors: Dict[int, Exception] = {}
+        connection = self._acquire()
+        for index, message in enumerate(messages):
+            try:
+                connection.send_message(message)
+                continue
+            except (smtplib.SMTPServerDisconnected, OSError):
+                self._close(connection)
+            except Exception as e:
+                errors[index] = e
+                continue
+
+            # Connexion coupée : une seule reconnexion, sinon le reste du lot est en échec
+            try:
+                connection = self._connect()
+                connection.send_message(message)
+            except Exception as e:
+                errors.update({remaining: e for remaining in range(index, len(messages))})
+                return errors
+        self._release(connection)
+        return errors
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection, _ in idle:
+            self._close(connection)
+
+    def _acquire(self) -> smtplib.SMTP:
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                connection, last_used = self._idle.pop()
+            if time.monotonic() - last_used < self.max_idle_seconds:
+                return connection
+            # Connexion restée longtemps inactive : vérifier qu'elle est encore ouverte
+            try:
+                if connection.noop()[0] == 250:
+                    return connection
+            except Exception:
+                pass
+            self._close(connection)
+        return self._connect()
+
+    def _release(self, connection: smtplib.SMTP) -> None:
+        with self._lock:
+            self._idle.append((connection, time.monotonic()))
+
+    def _connect(self) -> smtplib.SMTP:
+        connection = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        if self.use_tls:
+            connection.starttls(context=ssl.create_default_context())
+        if self.username:
+            connection.login(self.username, self.password or "")
+        return connection
+
+    @staticmethod
+    def _close(connection: smtplib.SMTP) -> None:
+        try:
+            connection.quit()
+        except Exception:
+            connection.close()
+
+
+class FileSinkTransport:
+    """Développement : chaque email est écrit dans un fichier .eml"""
+
+    def __init__(self, directory: str):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def send_batch(self, messages: List[EmailMessage]) -> Dict[int, Exception]:
+        errors: Dict[int, Exception] = {}
+        for index, message in enumerate(messages):
+            filename = f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}.eml"
+            try:
+                (self.directory / filename).write_bytes(message.as_bytes())
+            except Exception as e:
+                errors[index] = e
+        return errors
+
+    def close(self) -> None:
+        pass
+
+
+@dataclass
+class _QueuedEmail:
+    message: EmailMessage
+    attempts: int = 0
+
+
+class EmailDeliveryQueue:
+    """File d'envoi en tâche de fond, vidée par lots avec réessais"""
+
+    def __init__(self, transport, batch_size: int = 20, workers: int = 2, max_attempts: int = 5,
+                 retry_base_delay: float = 2.0, max_pending: int = 10000):
+        self.transport = transport
+        self.batch_size = batch_size
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retry_base_delay = retry_base_delay
+        self._queue: "asyncio.Queue[_QueuedEmail]" = asyncio.Queue(maxsize=max_pending)
+        self._tasks: List[asyncio.Task] = []
+        # Réessais programmés, remis en file à l'arrêt
+        self._retries: Dict[asyncio.TimerHandle, _QueuedEmail] = {}
+        self._stats = {"queued": 0, "sent": 0, "retried": 0, "failed": 0, "dropped": 0}
+
+    def enqueue(self, message: EmailMessage) -> bool:
+        """Mettre un email en file (non bloquant) ; False si la file est pleine"""
+        try:
+            self._queue.put_nowait(_QueuedEmail(message))
+        except asyncio.QueueFull:
+            self._stats["dropped"] += 1
+            logger.error(f"Email queue full, dropping email to {message['To']}")
+            return False
+        self._stats["queued"] += 1
+        return True
+
+    def stats(self) -> Dict[str, int]:
+        return {**self._stats, "pending": self._queue.qsize(), "scheduled_retries": len(self._retries)}
+
+    async def start(self) -> None:
+        """Démarrer les tâches d'envoi"""
+        if not self._tasks:
+            self._tasks = [
+                asyncio.create_task(self._run(), name=f"email-delivery-{index}")
+                for index in range(self.workers)
+            ]
+
+    async def stop(self) -> None:
+        """Arrêter les tâches d'envoi et tenter une dernière fois les emails en attente"""
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+
+        for handle, item in list(self._retries.items()):
+            handle.cancel()
+            self._queue.put_nowait(item)
+        self._retries.clear()
+
+        while not self._queue.empty():
+            batch = self._take_batch(self._queue.get_nowait())
+            await self._deliver(batch, final=True)
+        await asyncio.to_thread(self.transport.close)
+
+    async def _run(self) -> None:
+        while True:
+            batch = self._take_batch(await self._queue.get())
+            try:
+                await self._deliver(batch)
+            except Exception as e:
+                logger.error(f"Email delivery worker error: {e}")
+
+    def _take_batch(self, first: _QueuedEmail) -> List[_QueuedEmail]:
+        batch = [first]
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except asyncio.QueueEmpty:
+                break
+        return batch
+
+    async def _deliver(self, batch: List[_QueuedEmail], final: bool = False) -> None:
+        try:
+            errors = await asyncio.to_thread(self.transport.send_batch, [item.message for item in batch])
+        except Exception as e:
+            # Serveur injoignable : tout le lot est en échec temporaire
+            errors = {index: e for index in range(len(batch))}
+
+        for index, item in enumerate(batch):
+            error = errors.get(index)
+            if error is None:
+                self._stats["sent"] += 1
+                continue
+
+            item.attempts += 1
+            if final or item.attempts >= self.max_attempts or is_permanent_failure(error):
+                self._stats["failed"] += 1
+                logger.error(f"Email to {item.message['To']} failed after {item.attempts} attempt(s): {error}")
+                continue
+
+            # Délai exponentiel : 2 s, 4 s, 8 s...
+            delay = self.retry_base_delay * 2 ** (item.attempts - 1)
+            self._stats["retried"] += 1
+            logger.warning(f"Email to {item.message['To']} failed ({error}), retrying in {delay:.0f}s")
+            self._schedule_retry(item, delay)
+
+    def _schedule_retry(self, item: _QueuedEmail, delay: float) -> None:
+        def requeue() -> None:
+            self._retries.pop(handle, None)
+            try:
+                self._queue.put_nowait(item)
+            except asyncio.QueueFull:
+                self._stats["dropped"] += 1
+                logger.error(f"Email queue full, dropping retry to {item.message['To']}")
+
+        handle = asyncio.get_running_loop().call_later(delay, requeue)
+        self._retries[handle] = item
+
+
+def build_transport():
+    """SMTP si un serveur est configuré, sinon fichiers .eml (développement)"""
+    if settings.smtp_host:
+        return SMTPTransport(
+            host=settings.smtp_host,
+            port=settings.smtp_port,
+            username=settings.smtp_username,
+            password=settings.smtp_password,
+            use_tls=settings.smtp_use_tls,
+            timeout=settings.smtp_timeout_seconds
+        )
+    logger.info(f"No SMTP server configured, writing emails to {settings.email_outbox_dir}")
+    return FileSinkTransport(settings.email_outbox_dir)
+
+
+# Instance globale du service
+email_delivery_queue = EmailDeliveryQueue(
+    build_transport(),
+    batch_size=settings.email_batch_size,
+    workers=settings.email_workers,
+    max_attempts=settings.email_max_attempts,
+    retry_base_delay=settings.email_retry_base_seconds
+)
@@ -3,11 +3,20 @@ import secrets
 import logging
 from typing import Optional, Dict, Any
 from datetime import datetime, timedelta
-from jinja2 import Environment, FileSystemLoader, select_autoescape
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader, select_autoescape
+from markupsafe import Markup, escape
 from pathlib import Path
+from app.config import settings
+from app.services.email_delivery import build_message, email_delivery_queue
 
 logger = logging.getLogger(__name__)
 
+# Fragments statiques (sans variable), rendus une seule fois au démarrage
+STATIC_FRAGMENTS = {
+    "email_header": "_email-header.html",
+    "email_footer": "_email-footer.html",
+}
+
 class EmailService:
     """Service de gestion des emails avec templates HTML"""
     
@@ -16,13 +25,51 @@ class EmailService:
         template_dir = Path(__file__).parent.parent.parent / "templates"
         self.env = Environment(
             loader=FileSystemLoader(template_dir),
-            autoescape=select_autoescape(['html', 'xml'])
+            autoescape=select_autoescape(['html', 'xml']),
+            bytecode_cache=self._build_bytecode_cache(),
+            # En production les templates ne changent pas : pas de stat() à chaque rendu
+            auto_reload=settings.debug
         )
+        self.env.globals["fragments"] = self._render_fragments()
+        self._precompile_templates()
         
         # Configuration de base
         self.base_url = os.getenv("FRONTEND_URL", "https://ketosansstress.app")
         self.from_email = os.getenv("MAIL_FROM", "noreply@ketosansstress.app")
-        
+    
+    @staticmethod
+    def _build_bytecode_cache() -> Optional[FileSystemBytecodeCache]:
+        """Cache du code compilé des templates, conservé entre les redémarrages"""
+        try:
+            cache_dir = Path(settings.email_template_cache_dir)
+            cache_dir.mkdir(parents=True, exist_ok=True)
+            return FileSystemBytecodeCache(str(cache_dir))
+        except OSError as e:
+            logger.warning(f"Template bytecode cache disabled: {e}")
+            return None
+    
+    def _render_fragments(self) -> Dict[str, Markup]:
+        fragments = {}
+        for name, template_name in STATIC_FRAGMENTS.items():
+            try:
+                fragments[name] = Markup(self.env.get_template(template_name).render())
+            except Exception as e:
+                logger.error(f"Error rendering email fragment {template_name}: {e}")
+                fragments[name] = Markup("")
+        return fragments
+    
+    def _precompile_templates(self) -> None:
+        """Compiler (ou relire depuis le cache) tous les templates au démarrage"""
+        for template_name in self.env.list_templates(extensions=["html"]):
+            try:
+                self.env.get_template(template_name)
+            except Exception as e:
+                logger.error(f"Error compiling template {template_name}: {e}")
+    
+    def send_email(self, to: str, subject: str, html: str) -> bool:
+        """Mettre un email en file d'envoi (retour immédiat, envoi en tâche de fond)"""
+        return email_delivery_queue.enqueue(build_message(to, subject, html, self.from_email))
+    
     def generate_confirmation_token(self) -> str:
         """Générer un token unique pour la confirmation email"""
         return secrets.token_urlsafe(32)
@@ -54,65 +101,29 @@ class EmailService:
             logger.error(f"Error rendering email confirmed page: {e}")
             return self._get_fallback_confirmed_html(first_name)
     
+    def render_account_deletion_request_email(self, full_name: str, email: str, confirmation_url: str, expires_in_hours: int = 24) -> str:
+        """Rendre l'email de confirmation de suppression de compte"""
+        template = self.env.get_template('account-deletion-request.html')
+        return template.render(
+            full_name=full_name,
+            email=email,
+            confirmation_url=confirmation_url,
+            expires_in_hours=expires_in_hours
+        )
+    
+    def render_account_deleted_email(self, full_name: str, email: str, deleted_at: Optional[datetime] = None) -> str:
+        """Rendre l'email envoyé après la suppression du compte"""
+        template = self.env.get_template('account-deleted.html')
+        return template.render(full_name=full_name, email=email, deleted_at=deleted_at or datetime.now())
+    
     def render_error_page(self, error_message: str) -> str:
         """Rendre une page d'erreur HTML"""
-        return f"""
-        <!DOCTYPE html>
-        <html lang="fr">
-        <head>
-            <meta charset="UTF-8">
-            <meta name="viewport" content="width=device-width, initial-scale=1.0">
-            <title>Erreur - Keto Sans Stress</title>
-            <style>
-                body {{
-                    font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, sans-serif;
-                    background: #FAFAFA;
-                    display: flex;
-                    align-items: center;
-                    justify-content: center;
-                    min-height: 100vh;
-                    margin: 0;
-                    padding: 20px;
-                }}
-                .container {{
-                    background: white;
-                    border-radius: 16px;
-                    padding: 40px;
-                    max-width: 500px;
-                    text-align: center;
-                    box-shadow: 0 4px 6px rgba(0,0,0,0.1);
-                }}
-                .error-icon {{
-                    font-size: 64px;
-                    margin-bottom: 16px;
-                }}
-                h1 {{
-                    color: #F44336;
-                    font-size: 24px;
-                    margin-bottom: 16px;
-                }}
-                p {{
-                    color: #757575;
-                    font-size: 16px;
-                    line-height: 1.6;
-                }}
-                .back-link {{
-                    color: #4CAF50;
-                    text-decoration: none;
-                    font-weight: 500;
-                }}
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <div class="error-icon">❌</div>
-                <h1>Une erreur s'est produite</h1>
-                <p>{error_message}</p>
-                <p><a href="/" class="back-link">← Retour à l'accueil</a></p>
-            </div>
-        </body>
-        </html>
-        """
+        try:
+            template = self.env.get_template('error-page.html')
+            return template.render(error_message=error_message)
+        except Exception as e:
+            logger.error(f"Error rendering error page: {e}")
+            return f"<!DOCTYPE html><html lang=\"fr\"><body><h1>Une erreur s'est produite</h1><p>{escape(error_message)}</p></body></html>"
     
     def _get_fallback_email_html(self, first_name: str, token: str) -> str:
         """HTML de fallback si le template ne peut pas être rendu"""
@@ -170,6 +181,10 @@ def generate_confirmation_token() -> str:
     """Générer un token de confirmation"""
     return email_service.generate_confirmation_token()
 
+def send_email(to: str, subject: str, html: str) -> bool:
+    """Envoyer un email en tâche de fond"""
+    return email_service.send_email(to, subject, html)
+
 def render_confirmation_email(first_name: str, token: str) -> str:
     """Rendre l'email de confirmation"""
     return email_service.render_email_confirmation_template(first_name, token)
@@ -0,0 +1,229 @@
+"""
+Aliments favoris
+Classement par fréquence et récence des repas enregistrés (compteur à
+décroissance exponentielle) plus les aliments épinglés par l'utilisateur.
+Les favoris sont tenus à jour à chaque repas ajouté et servis depuis la
+mémoire ; le TTL borne le retard sur les repas enregistrés par une autre instance.
+"""
+
+import asyncio
+import heapq
+import logging
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+from cachetools import TTLCache
+from supabase import Client
+from app.config import settings
+from app.database.connection import get_admin_supabase_client
+from app.database.executor import run_blocking
+from app.services.food_matcher import fold_food_name
+from app.services.reference_foods import reference_foods
+
+logger = logging.getLogger(__name__)
+
+# Un repas compte moitié moins après HALF_LIFE_DAYS jours
+HALF_LIFE_DAYS = 14.0
+# Les scores sont exprimés par rapport à cette date : ajouter un repas ne
+# nécessite pas de faire décroître les autres, et l'ordre reste correct
+_SCORE_EPOCH = datetime(2025, 1, 1, tzinfo=timezone.utc)
+# Unités converties en grammes (ou millilitres, comptés comme des grammes)
+_UNIT_GRAMS = {"g": 1.0, "gr": 1.0, "gramme": 1.0, "grammes": 1.0, "kg": 1000.0, "ml": 1.0, "cl": 10.0, "l": 1000.0}
+
+
+def _parse_datetime(value: Any) -> datetime:
+    if isinstance(value, datetime):
+        moment = value
+    elif value:
+        moment = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    else:
+        moment = datetime.now(timezone.utc)
+    return moment if moment.tzinfo else moment.replace(tzinfo=timezone.utc)
+
+
+def _decayed_weight(consumed_at: Any) -> float:
+    days = (_parse_datetime(consumed_at) - _SCORE_EPOCH).total_seconds() / 86400
+    return 2.0 ** (days / HALF_LIFE_DAYS)
+
+
+def food_from_meal(meal: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Aliment (format FoodSearchResult) à partir d'un repas enregistré
+
+    Les valeurs du repas portent sur la quantité consommée : elles sont
+    ramenées à 100 g quand l'unité est un poids ou un volume. Pour une
+    portion, seules les valeurs d'un aliment de référence sont connues ;
+    sans aliment de référence, le repas n'est pas proposé en favori.
+    """
+    name = meal.get("food_name") or "Aliment"
+    grams_per_unit = _UNIT_GRAMS.get(str(meal.get("unit") or "").strip().lower())
+    quantity = float(meal.get("quantity") or 0)
+    if grams_per_unit is None or quantity <= 0:
+        reference = reference_foods.by_name(name)
+        return reference.to_search_result() if reference else None
+
+    scale = 100 / (quantity * grams_per_unit)
+    return {
+        "id": f"meal_{fold_food_name(name).replace(' ', '_')}",
+        "name": name,
+        "brand": meal.get("brand"),
+        "category": "favori",
+        "calories_per_100g": round(float(meal.get("calories") or 0) * scale, 1),
+        "proteins_per_100g": round(float(meal.get("protein") or 0) * scale, 2),
+        "carbs_per_100g": round(float(meal.get("carbohydrates") or 0) * scale, 2),
+        "fats_per_100g": round(float(meal.get("total_fat") or 0) * scale, 2),
+        "fiber_per_100g": round(float(meal.get("fiber") or 0) * scale, 2),
+        "source": "history",
+    }
+
+
+class UserFavorites:
+    """Top-K d'un utilisateur : compteurs décroissants bornés + aliments épinglés"""
+
+    __slots__ = ("max_tracked", "scores", "foods", "pins", "_top")
+
+    def __init__(self, max_tracked: int = 200):
+        self.max_tracked = max_tracked
+        self.scores: Dict[str, float] = {}
+        self.foods: Dict[str, Dict[str, Any]] = {}
+        self.pins: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._top: Optional[List[str]] = None
+
+    def record(self, food: Optional[Dict[str, Any]], consumed_at: Any) -> None:
+        if food is None:
+            return
+        key = fold_food_name(food["name"])
+        if not key:
+            return
+        self.scores[key] = self.scores.get(key, 0.0) + _decayed_weight(consumed_at)
+        self.foods[key] = food
+        if len(self.scores) > self.max_tracked:
+            # Oublier l'aliment le moins fréquent/récent
+            weakest = min(self.scores, key=self.scores.__getitem__)
+            del self.scores[weakest]
+            del self.foods[weakest]
+        self._top = None
+
+    def pin(self, food: Dict[str, Any]) -> str:
+        key = fold_food_name(food["name"])
+        self.pins[key] = food
+        self._top = None
+        return key
+
+    def unpin(self, key: str) -> None:
+        self.pins.pop(key, None)
+        self._top = None
+
+    def top(self, limit: int) -> List[Dict[str, Any]]:
+        if self._top is None:
+            # Classement mis en cache jusqu'au prochain repas ou épinglage
+            ranked = heapq.nlargest(self.max_tracked, self.scores, key=self.scores.__getitem__)
+            self._top = list(self.pins) + [key for key in ranked if key not in self.pins]
+        return [self.pins.get(key) or self.foods[key] for key in self._top[:limit]]
+
+
+class FavoritesService:
+    """Favoris de tous les utilisateurs, LRU et TTL sur les utilisateurs"""
+
+    def __init__(self, max_users: int = 10000, ttl: float = 600.0, history_days: int = 90,
+                 history_limit: int = 500):
+        self.history_days = history_days
+        self.history_limit = history_limit
+        # TTL : les repas et épinglages faits sur une autre instance sont relus
+        self._users: TTLCache = TTLCache(maxsize=max_users, ttl=ttl)
+        self._client: Optional[Client] = None
+
+    def record_meal(self, user_id: str, meal: Dict[str, Any]) -> None:
+        """Mettre à jour les favoris après l'ajout d'un repas"""
+        favorites = self._users.get(str(user_id))
+        # Utilisateur pas encore chargé : le repas sera lu avec l'historique
+        if favorites is not None:
+            favorites.record(food_from_meal(meal), meal.get("consumed_at"))
+
+    async def favorites(self, user_id: str, limit: int) -> List[Dict[str, Any]]:
+        favorites = await self._get(str(user_id))
+        return favorites.top(limit)
+
+    async def pin(self, user_id: str, food: Dict[str, Any]) -> str:
+        favorites = await self._get(str(user_id))
+        key = fold_food_name(food["name"])
+        await run_blocking("favorite_foods.upsert", self._save_pin, str(user_id), key, food)
+        favorites.pin(food)
+        return key
+
+    async def unpin(self, user_id: str, key: str) -> None:
+        favorites = await self._get(str(user_id))
+        await run_blocking("favorite_foods.delete", self._delete_pin, str(user_id), key)
+        favorites.unpin(key)
+
+    def forget(self, user_id: str) -> None:
+        """Oublier les favoris en mémoire d'un utilisateur ; ils sont relus au prochain accès"""
+        self._users.pop(str(user_id), None)
+
+    async def _get(self, user_id: str) -> UserFavorites:
+        favorites = self._users.get(user_id)
+        if favorites is not None:
+            return favorites
+
+        meals, pins = await asyncio.gather(
+            run_blocking("meals.select_favorites", self._load_meals, user_id),
+            run_blocking("favorite_foods.select", self._load_pins, user_id),
+        )
+        favorites = UserFavorites()
+        for meal in meals:
+            favorites.record(food_from_meal(meal), meal.get("consumed_at"))
+        for pin in pins:
+            favorites.pin(pin["food_data"])
+
+        self._users[user_id] = favorites
+        return favorites
+
+    def _load_meals(self, user_id: str) -> List[Dict[str, Any]]:
+        since = (datetime.utcnow() - timedelta(days=self.history_days)).isoformat()
+        result = self._admin_client().table("meals") \
+            .select("food_name, brand, quantity, unit, calories, protein, carbohydrates, total_fat, fiber, consumed_at") \
+            .eq("user_id", user_id) \
+            .gte("consumed_at", since) \
+            .order("consumed_at", desc=True) \
+            .limit(self.history_limit) \
+            .execute()
+        return result.data or []
+
+    def _load_pins(self, user_id: str) -> List[Dict[str, Any]]:
+        try:
+            result = self._admin_client().table("favorite_foods") \
+                .select("food_key, food_data") \
+                .eq("user_id", user_id) \
+                .order("pinned_at") \
+                .execute()
+            return result.data or []
+        except Exception as e:
+            logger.warning(f"Failed to load pinned favorites for user {user_id}: {e}")
+            return []
+
+    def _save_pin(self, user_id: str, key: str, food: Dict[str, Any]) -> None:
+        self._admin_client().table("favorite_foods").upsert({
+            "user_id": user_id,
+            "food_key": key,
+            "food_data": food,
+            "pinned_at": datetime.utcnow().isoformat()
+        }, on_conflict="user_id,food_key").execute()
+
+    def _delete_pin(self, user_id: str, key: str) -> None:
+        self._admin_client().table("favorite_foods").delete() \
+            .eq("user_id", user_id) \
+            .eq("food_key", key) \
+            .execute()
+
+    def _admin_client(self) -> Client:
+        if self._client is None:
+            # Requêtes filtrées par user_id : un client service partagé, sans jeton utilisateur
+            self._client = get_admin_supabase_client()
+        return self._client
+
+
+# Instance globale du service
+favorites_service = FavoritesService(
+    max_users=settings.favorites_cache_max_users,
+    ttl=settings.favorites_cache_ttl_seconds
+)
@@ -0,0 +1,106 @@
+"""
+Correspondance entre aliments détectés et aliments de référence
+Index de noms normalisés : le coût d'une recherche dépend de la longueur
+du texte détecté, pas de la taille de la base de référence
+"""
+
+import re
+import unicodedata
+from typing import Any, Dict, Iterable, Optional
+
+_LIGATURES = str.maketrans({"œ": "oe", "æ": "ae"})
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# Mots trop courants pour identifier un aliment à eux seuls ('huile d'olive' -> pas 'd')
+STOPWORDS = frozenset({
+    "a", "au", "aux", "avec", "d", "de", "des", "du", "en", "et", "l", "la", "le", "les",
+    "ou", "par", "pour", "san", "sur", "un", "une",  # "san" : "sans" au singulier
+})
+# Longueur minimale d'un mot indexé seul
+MIN_TOKEN_LENGTH = 3
+
+
+def _singularize(token: str) -> str:
+    """Pluriel français simplifié : 'épinards' -> 'epinard', 'choux' -> 'chou'"""
+    if len(token) > 3 and token[-1] in "sx":
+        return token[:-1]
+    return token
+
+
+def fold_food_name(name: str) -> str:
+    """
+    Minuscules, sans accents ni ligatures, ponctuation retirée :
+    'Œufs brouillés' -> 'oeufs brouilles'
+    """
+    text = unicodedata.normalize("NFKD", name.lower().translate(_LIGATURES))
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return " ".join(_TOKEN_RE.findall(text))
+
+
+def normalize_food_name(name: str) -> str:
+    """
+    Normaliser un nom d'aliment pour la recherche
+
+    Comme fold_food_name, avec les mots au singulier :
+    'Œufs brouillés' -> 'oeuf brouille'
+    """
+    return " ".join(_singularize(token) for token in fold_food_name(name).split())
+
+
+class FoodMatcher:
+    """Index des aliments de référence par nom normalisé et synonymes"""
+
+    def __init__(self):
+        # nom normalisé complet -> données de l'aliment
+        self._names: Dict[str, Any] = {}
+        # mot isolé d'un nom composé -> données ('huile' -> huile d'olive)
+        self._tokens: Dict[str, Any] = {}
+        self._max_words = 1
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def add(self, name: str, data: Any, synonyms: Iterable[str] = (), index_words: bool = True) -> None:
+        """
+        Ajouter un aliment de référence
+
+        Le premier aliment enregistré pour un nom reste prioritaire : les
+        données locales, chargées en premier, ne sont pas écrasées.
+        index_words=False n'indexe que le nom complet (produits de la base,
+        dont les mots isolés désigneraient n'importe quel produit).
+        """
+        for label in (name, *synonyms):
+            key = normalize_food_name(label)
+            if not key:
+                continue
+            self._names.setdefault(key, data)
+            words = key.split()
+            self._max_words = max(self._max_words, len(words))
+            if index_words and len(words) > 1:
+                for word in words:
+                    if len(word) >= MIN_TOKEN_LENGTH and word not in STOPWORDS:
+                        self._tokens.setdefault(word, data)
+
+    def match(self, text: str) -> Optional[Any]:
+        """
+        Trouver l'aliment de référence correspondant à un texte détecté
+
+        Cherche d'abord le groupe de mots le plus long présent dans l'index
+        ('saumon fumé grillé' -> 'saumon fume'), puis un mot d'un nom composé.
+        """
+        words = normalize_food_name(text).split()
+        if not words:
+            return None
+
+        for size in range(min(self._max_words, len(words)), 0, -1):
+            for start in range(len(words) - size + 1):
+                data = self._names.get(" ".join(words[start:start + size]))
+                if data is not None:
+                    return data
+
+        for word in words:
+            data = self._tokens.get(word)
+            if data is not None:
+                return data
+
+        return None
@@ -0,0 +1,213 @@
+"""
+Recherche d'aliments multi-sources
+Interroge en parallèle les aliments de référence, food_database, le cache
+OpenFoodFacts et OpenFoodFacts en direct, dans un budget de latence.
+Les résultats sont fusionnés (code-barres / nom normalisé) puis classés par
+pertinence : correspondance du texte, popularité des recherches et score keto.
+"""
+
+import asyncio
+import logging
+import math
+import re
+from typing import Any, Dict, List, Optional, Set
+from supabase import Client
+from app.config import settings
+from app.database.connection import get_admin_supabase_client
+from app.database.executor import run_blocking
+from app.services.autocomplete import autocomplete_service
+from app.services.food_matcher import fold_food_name, normalize_food_name
+from app.services.keto_catalogue import CATALOGUE_COLUMNS
+from app.services.reference_foods import reference_foods
+from integrations.openfoodfacts import food_search_service
+
+logger = logging.getLogger(__name__)
+
+# Ordre de priorité lors de la fusion : la première source garde le produit
+SOURCE_PRIORITY = ("local", "food_database", "openfoodfacts_cache", "openfoodfacts")
+
+# Poids du score de pertinence
+TEXT_WEIGHT = 0.6
+KETO_WEIGHT = 0.2
+POPULARITY_WEIGHT = 0.15
+QUALITY_WEIGHT = 0.05
+# Nombre de recherches à partir duquel la popularité est maximale
+POPULARITY_SATURATION = 100
+
+# Caractères réservés par les filtres PostgREST
+_FILTER_RESERVED_RE = re.compile(r"[%_,()*\\]")
+
+
+def text_match_score(query: str, name: str) -> float:
+    """1 si le nom est la recherche, puis début du nom, début d'un mot, sous-chaîne"""
+    query, name = normalize_food_name(query), normalize_food_name(name)
+    if not query or not name:
+        return 0.0
+    if name == query:
+        return 1.0
+    if name.startswith(query):
+        return 0.8
+    if any(word.startswith(query) for word in name.split()):
+        return 0.6
+    if query in name:
+        return 0.4
+    # Trouvé par OpenFoodFacts sur la marque ou les ingrédients
+    return 0.1
+
+
+def relevance_score(query: str, product: Dict[str, Any]) -> float:
+    name = product.get("product_name") or ""
+    popularity = min(1.0, math.log1p(autocomplete_service.popularity(name)) / math.log1p(POPULARITY_SATURATION))
+    return (
+        TEXT_WEIGHT * text_match_score(query, name)
+        + KETO_WEIGHT * (product.get("keto_score") or 0) / 10
+        + POPULARITY_WEIGHT * popularity
+        + QUALITY_WEIGHT * (product.get("data_quality_score") or 0)
+    )
+
+
+def _dedupe_keys(product: Dict[str, Any]) -> List[str]:
+    """Un produit est un doublon s'il partage son code-barres ou son nom et sa marque"""
+    keys = []
+    if product.get("barcode"):
+        keys.append(f"barcode:{product['barcode']}")
+    name = normalize_food_name(product.get("product_name") or "")
+    if name:
+        keys.append(f"name:{name}|{normalize_food_name(product.get('brand') or '')}")
+    return keys
+
+
+class FederatedFoodSearch:
+    """Recherche fusionnée sur toutes les sources d'aliments"""
+
+    def __init__(self, budget_seconds: float = 1.5, barcode_concurrency: int = 8):
+        self.budget_seconds = budget_seconds
+        self.barcode_concurrency = barcode_concurrency
+        # Recherches OpenFoodFacts dépassant le budget : elles remplissent le cache
+        self._background: Set[asyncio.Task] = set()
+        self._client: Optional[Client] = None
+
+    async def search(self, query: str, limit: int = 20, category: Optional[str] = None,
+                     budget_seconds: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        Rechercher des aliments sur toutes les sources
+
+        Returns:
+            Produits au format food_database, avec data_source et relevance,
+            triés par pertinence. Les sources qui n'ont pas répondu dans le
+            budget sont ignorées. La catégorie est filtrée par chaque source,
+            avant la limite.
+        """
+        sources: Dict[str, List[Dict[str, Any]]] = {
+            "local": [food.to_product() for food in reference_foods.search(query, category=category, limit=limit)],
+        }
+        cached = food_search_service.get_cached_search(query, limit, category)
+        if cached is not None:
+            sources["openfoodfacts_cache"] = cached
+
+        tasks = {
+            asyncio.create_task(run_blocking("food_database.search", self._search_food_database, query, limit, category)): "food_database",
+        }
+        # Disjoncteur ouvert : répondre avec le cache et les sources locales sans attendre OFF
+        if cached is None and food_search_service.openfoodfacts.is_available():
+            tasks[asyncio.create_task(asyncio.to_thread(food_search_service.search_foods, query, limit, category))] = "openfoodfacts"
+
+        done, pending = await asyncio.wait(tasks, timeout=budget_seconds or self.budget_seconds)
+        for task in done:
+            try:
+                sources[tasks[task]] = task.result()
+            except Exception as e:
+                logger.warning(f"Food search source '{tasks[task]}' failed: {e}")
+        for task in pending:
+            logger.info(f"Food search source '{tasks[task]}' exceeded the latency budget")
+            self._background.add(task)
+            task.add_done_callback(self._background.discard)
+
+        return self._merge(query, sources, limit)
+
+    def _merge(self, query: str, sources: Dict[str, List[Dict[str, Any]]], limit: int) -> List[Dict[str, Any]]:
+        merged: List[Dict[str, Any]] = []
+        seen: Set[str] = set()
+        for source in SOURCE_PRIORITY:
+            for product in sources.get(source, []):
+                keys = _dedupe_keys(product)
+                if not keys or seen.intersection(keys):
+                    continue
+                seen.update(keys)
+                merged.append({
+                    **product,
+                    "data_source": "openfoodfacts" if source == "openfoodfacts_cache" else source,
+                    "relevance": round(relevance_score(query, product), 4),
+                })
+
+        return sorted(merged, key=lambda product: product["relevance"], reverse=True)[:limit]
+
+    async def lookup_barcodes(self, barcodes: List[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+        """
+        Résoudre une liste de codes-barres
+
+        Le cache produit et food_database (une seule requête IN) répondent
+        d'abord ; les codes restants sont demandés à OpenFoodFacts en
+        parallèle, au plus barcode_concurrency à la fois.
+
+        Returns:
+            code-barres -> produit (format food_database), ou None si introuvable
+        """
+        found: Dict[str, Optional[Dict[str, Any]]] = {}
+        for barcode in barcodes:
+            cached = food_search_service.get_cached_product(barcode)
+            if cached is not None:
+                found[barcode] = cached
+
+        misses = [barcode for barcode in dict.fromkeys(barcodes) if barcode not in found]
+        if misses:
+            try:
+                for row in await run_blocking("food_database.select_barcodes", self._load_barcodes, misses):
+                    found[row["barcode"]] = {**row, "data_source": "food_database"}
+            except Exception as e:
+                logger.warning(f"Barcode lookup in food_database failed: {e}")
+
+        semaphore = asyncio.Semaphore(self.barcode_concurrency)
+
+        async def fetch(barcode: str) -> None:
+            async with semaphore:
+                found[barcode] = await asyncio.to_thread(food_search_service.get_food_by_barcode, barcode)
+
+        await asyncio.gather(*(fetch(barcode) for barcode in misses if barcode not in found))
+        return found
+
+    def _load_barcodes(self, barcodes: List[str]) -> List[Dict[str, Any]]:
+        result = self._admin_client().table("food_database") \
+            .select(CATALOGUE_COLUMNS) \
+            .in_("barcode", barcodes) \
+            .execute()
+        return result.data or []
+
+    def _search_food_database(self, query: str, limit: int, category: Optional[str] = None) -> List[Dict[str, Any]]:
+        # Recherche plein texte (index GIN to_tsvector('french', product_name))
+        pattern = _FILTER_RESERVED_RE.sub(" ", query).strip()
+        if not fold_food_name(pattern):
+            return []
+        request = self._admin_client().table("food_database") \
+            .select(CATALOGUE_COLUMNS) \
+            .text_search("product_name", pattern, options={"type": "plain", "config": "french"})
+        if category:
+            request = request.contains("categories", [category])
+        result = request \
+            .order("data_quality_score", desc=True) \
+            .limit(limit) \
+            .execute()
+        return result.data or []
+
+    def _admin_client(self) -> Client:
+        if self._client is None:
+            # Catalogue partagé : un seul client service, créé au premier appel
+            self._client = get_admin_supabase_client()
+        return self._client
+
+
+# Instance globale du service
+federated_food_search = FederatedFoodSearch(
+    budget_seconds=settings.food_search_budget_seconds,
+    barcode_concurrency=settings.barcode_lookup_concurrency
+)
@@ -0,0 +1,144 @@
+"""
+Stockage des analyses d'images
+Chaque image est stockée une seule fois en binaire (table image_blobs),
+identifiée par son empreinte SHA-256 et référencée par image_analysis
+"""
+
+import base64
+import hashlib
+import logging
+import zlib
+from typing import Any, Dict, Optional
+from postgrest.types import ReturnMethod
+from supabase import Client
+from app.database.connection import get_admin_supabase_client
+
+logger = logging.getLogger(__name__)
+
+_client: Optional[Client] = None
+
+# Signatures des formats d'image courants
+IMAGE_SIGNATURES = (
+    (b"\xff\xd8\xff", "jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "png"),
+    (b"GIF8", "gif"),
+    (b"RIFF", "webp"),
+)
+
+def decode_image_base64(image_base64: str) -> bytes:
+    """Décoder une image base64 (avec ou sans préfixe data:image/...;base64,)"""
+    if image_base64.startswith("data:"):
+        image_base64 = image_base64.split(",", 1)[-1]
+    return base64.b64decode(image_base64)
+
+def detect_image_format(image_bytes: bytes) -> Optional[str]:
+    """Détecter le format d'une image à partir de ses premiers octets"""
+    for signature, image_format in IMAGE_SIGNATURES:
+        if image_bytes.startswith(signature):
+            return image_format
+    return None
+
+def prepare_image_blob(image_base64: str) -> Dict[str, Any]:
+    """
+    Préparer une image pour le stockage binaire
+
+    Les JPEG sont déjà compressés : zlib n'est conservé que s'il réduit la taille.
+    """
+    image_bytes = decode_image_base64(image_base64)
+    compressed = zlib.compress(image_bytes, 6)
+    use_zlib = len(compressed) < len(image_bytes)
+    stored = compressed if use_zlib else image_bytes
+
+    return {
+        "content_hash": hashlib.sha256(image_bytes).hexdigest(),
+        "data": stored,
+        "encoding": "zlib" if use_zlib else "identity",
+        "image_format": detect_image_format(image_bytes),
+        "byte_size": len(image_bytes),
+        "stored_size": len(stored),
+    }
+
+def load_image_bytes(blob: Dict[str, Any]) -> bytes:
+    """Retrouver les octets d'origine d'une ligne image_blobs"""
+    data = blob["data"]
+    if isinstance(data, str):
+        # PostgREST renvoie le bytea au format hexadécimal \x...
+        data = bytes.fromhex(data[2:] if data.startswith("\\x") else data)
+    return zlib.decompress(data) if blob.get("encoding") == "zlib" else data
+
+def get_image_storage_client() -> Client:
+    """
+    Client service mis en cache pour l'enregistrement en tâche de fond
+
+    La tâche s'exécute après la réponse : elle ne peut pas dépendre de la session
+    du client partagé, et l'utilisateur est fixé explicitement par user_id.
+    """
+    global _client
+    if _client is None:
+        _client = get_admin_supabase_client()
+    return _client
+
+def persist_image_analysis(
+    supabase: Client,
+    user_id: str,
+    image_base64: str,
+    analysis: Dict[str, Any],
+    ai_provider: str = "custom"
+) -> Optional[str]:
+    """
+    Enregistrer une analyse d'image et son image (dédupliquée)
+
+    Args:
+        supabase: Client Supabase (client service, voir get_image_storage_client)
+        user_id: Utilisateur ayant demandé l'analyse
+        image_base64: Image analysée
+        analysis: Réponse d'analyse (ImageAnalysisResponse.dict())
+        ai_provider: Fournisseur IA ('seefood', 'emergent_llm', 'custom')
+
+    Returns:
+        Identifiant de la ligne image_analysis, ou None en cas d'échec
+    """
+    try:
+        blob = prepare_image_blob(image_base64)
+
+        # Une image déjà connue (même empreinte) n'est pas réécrite ;
+        # returning=minimal : inutile de recevoir l'image en retour
+        supabase.table("image_blobs").upsert(
+            {**blob, "data": "\\x" + blob["data"].hex()},
+            on_conflict="content_hash",
+            ignore_duplicates=True,
+            returning=ReturnMethod.minimal
+        ).execute()
+    except Exception as e:
+        logger.warning(f"Failed to store image blob for user {user_id}: {e}")
+        return None
+
+    try:
+        nutrition = analysis.get("total_nutrition", {})
+        foods = analysis.get("foods_detected", [])
+        result = supabase.table("image_analysis").insert({
+            "user_id": user_id,
+            "image_hash": blob["content_hash"],
+            "image_size_bytes": blob["byte_size"],
+            "image_format": blob["image_format"],
+            "ai_provider": ai_provider,
+            "confidence_score": analysis.get("analysis_confidence"),
+            "foods_detected": foods,
+            "portions_detected": [food.get("portion_estimate") for food in foods],
+            "estimated_calories": nutrition.get("calories"),
+            "estimated_macros": {
+                "protein": nutrition.get("protein"),
+                "carbs": nutrition.get("carbohydrates"),
+                "fat": nutrition.get("total_fat"),
+                "fiber": nutrition.get("fiber"),
+            },
+            "keto_compatibility_score": nutrition.get("keto_score"),
+            "analysis_duration_ms": analysis.get("processing_time_ms"),
+            "processing_status": "completed",
+        }).execute()
+
+        return result.data[0]["id"] if result.data else None
+
+    except Exception as e:
+        logger.warning(f"Failed to persist image analysis for user {user_id}: {e}")
+        return None
@@ -0,0 +1,99 @@
+"""
+Catalogue d'aliments keto-friendly
+Construit en tâche de fond à partir de food_database (keto_score / is_keto_friendly)
+et servi depuis la mémoire, avec facettes par catégorie et pagination
+"""
+
+import asyncio
+import logging
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+from app.database.connection import get_admin_supabase_client
+
+logger = logging.getLogger(__name__)
+
+# Score à partir duquel un aliment est considéré keto-friendly
+KETO_FRIENDLY_MIN_SCORE = 7
+
+CATALOGUE_COLUMNS = (
+    "openfoodfacts_id, barcode, product_name, brand, calories_per_100g, protein_per_100g, "
+    "carbohydrates_per_100g, fat_per_100g, fiber_per_100g, categories, keto_score, "
+    "is_keto_friendly, data_quality_score"
+)
+
+
+def primary_category(food: Dict[str, Any]) -> str:
+    categories = food.get("categories") or []
+    if isinstance(categories, str):
+        return categories or "autre"
+    return categories[0] if categories else "autre"
+
+
+class KetoCatalogue:
+    """Catalogue précalculé, remplacé en bloc à chaque rafraîchissement"""
+
+    def __init__(self, max_products: int = 5000):
+        self.max_products = max_products
+        self._seed: List[Dict[str, Any]] = []
+        self._items: List[Dict[str, Any]] = []
+        self._by_category: Dict[str, List[Dict[str, Any]]] = {}
+        self._facets: List[Dict[str, Any]] = []
+        self.refreshed_at: Optional[str] = None
+
+    def seed(self, foods: Iterable[Dict[str, Any]]) -> None:
+        """Aliments de référence servis tant que food_database n'est pas chargé (ou vide)"""
+        self._seed = [food for food in foods if (food.get("keto_score") or 0) >= KETO_FRIENDLY_MIN_SCORE]
+        if not self._items:
+            self._publish(self._seed)
+
+    def page(self, limit: int = 50, offset: int = 0, category: Optional[str] = None) -> Dict[str, Any]:
+        """Une page du catalogue, éventuellement filtrée par catégorie"""
+        items = self._by_category.get(category.lower(), []) if category else self._items
+        return {
+            "items": items[offset:offset + limit],
+            "total": len(items),
+            "categories": self._facets,
+            "refreshed_at": self.refreshed_at,
+        }
+
+    async def refresh(self) -> None:
+        rows = await asyncio.to_thread(self._load)
+        # Base vide ou inaccessible : garder le catalogue actuel
+        if rows:
+            self._publish(rows)
+            logger.info(f"Keto catalogue refreshed: {len(rows)} foods, {len(self._facets)} categories")
+
+    def _publish(self, foods: List[Dict[str, Any]]) -> None:
+        items = sorted(
+            foods,
+            key=lambda food: (food.get("keto_score") or 0, food.get("data_quality_score") or 0),
+            reverse=True
+        )
+        by_category: Dict[str, List[Dict[str, Any]]] = {}
+        for food in items:
+            by_category.setdefault(primary_category(food).lower(), []).append(food)
+
+        counts = Counter({category: len(foods) for category, foods in by_category.items()})
+
+        # Remplacement en bloc : les lectures concurrentes voient l'ancien ou le nouveau catalogue
+        self._items, self._by_category = items, by_category
+        self._facets = [{"category": category, "count": count} for category, count in counts.most_common()]
+        self.refreshed_at = datetime.utcnow().isoformat()
+
+    def _load(self) -> List[Dict[str, Any]]:
+        try:
+            result = get_admin_supabase_client().table("food_database") \
+                .select(CATALOGUE_COLUMNS) \
+                .or_(f"is_keto_friendly.eq.true,keto_score.gte.{KETO_FRIENDLY_MIN_SCORE}") \
+                .order("keto_score", desc=True) \
+                .limit(self.max_products) \
+                .execute()
+            return result.data or []
+        except Exception as e:
+            logger.warning(f"Keto catalogue: failed to load food_database: {e}")
+            return []
+
+
+# Instance globale du service
+keto_catalogue = KetoCatalogue()
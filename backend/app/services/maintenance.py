@@ -0,0 +1,108 @@
+"""
+Maintenance de la base
+Purge périodique, par lots bornés, des demandes de suppression expirées, de
+l'historique de recherche trop ancien et des seaux de limitation de débit
+partagés inactifs (fonction purge_rows_batch, supabase_maintenance_purge.sql).
+"""
+
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from supabase import Client
+from app.config import settings
+from app.database.connection import get_admin_supabase_client
+from app.database.executor import run_query
+
+logger = logging.getLogger(__name__)
+
+
+class MaintenanceService:
+    """Purges planifiées ; les nombres de lignes supprimées sont exposés en métriques"""
+
+    def __init__(self, batch_size: int = 1000, max_batches: int = 50, search_history_retention_days: int = 180,
+                 purge_rate_limit_buckets: bool = False):
+        self.batch_size = batch_size
+        # Borne le travail d'un passage : le reste est purgé au passage suivant
+        self.max_batches = max_batches
+        # (table, date limite) ; les lignes antérieures à la date sont supprimées
+        self.jobs: List[Tuple[str, Callable[[datetime], datetime]]] = [
+            ("account_deletion_requests", lambda now: now),
+            ("search_history", lambda now: now - timedelta(days=search_history_retention_days)),
+        ]
+        if purge_rate_limit_buckets:
+            # Seaux partagés inactifs depuis un jour : pleins, inutile de les garder
+            self.jobs.append(("rate_limit_buckets", lambda now: now - timedelta(days=1)))
+        self._client: Optional[Client] = None
+        self._metrics: Dict[str, Any] = {
+            "runs": 0,
+            "last_run_at": None,
+            "last_duration_ms": None,
+            "last_deleted": {},
+            "total_deleted": {},
+            "errors": 0,
+        }
+
+    async def run(self) -> Dict[str, int]:
+        """Un passage de purge ; retourne le nombre de lignes supprimées par table"""
+        started = time.perf_counter()
+        now = datetime.now(timezone.utc)
+        deleted: Dict[str, int] = {}
+
+        for table, cutoff in self.jobs:
+            try:
+                deleted[table] = await self._purge(table, cutoff(now))
+            except Exception as e:
+                # Une table en échec n'empêche pas la purge des autres
+                self._metrics["errors"] += 1
+                logger.error(f"Maintenance purge of {table} failed: {e}")
+
+        self._metrics["runs"] += 1
+        self._metrics["last_run_at"] = now.isoformat()
+        self._metrics["last_duration_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        self._metrics["last_deleted"] = deleted
+        for table, count in deleted.items():
+            self._metrics["total_deleted"][table] = self._metrics["total_deleted"].get(table, 0) + count
+
+        if any(deleted.values()):
+            logger.info(f"Maintenance purge: {deleted}")
+        return deleted
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            **self._metrics,
+            "last_deleted": dict(self._metrics["last_deleted"]),
+            "total_deleted": dict(self._metrics["total_deleted"]),
+        }
+
+    async def _purge(self, table: str, before: datetime) -> int:
+        total = 0
+        for _ in range(self.max_batches):
+            response = await run_query(
+                f"rpc.purge_rows_batch.{table}",
+                self._admin_client().rpc("purge_rows_batch", {
+                    "p_table": table,
+                    "p_before": before.isoformat(),
+                    "p_batch_size": self.batch_size
+                })
+            )
+            deleted = int(response.data or 0)
+            total += deleted
+            if deleted < self.batch_size:
+                break
+        return total
+
+    def _admin_client(self) -> Client:
+        if self._client is None:
+            # Lignes de tous les utilisateurs : client service
+            self._client = get_admin_supabase_client()
+        return self._client
+
+
+# Instance globale du service
+maintenance_service = MaintenanceService(
+    batch_size=settings.maintenance_batch_size,
+    max_batches=settings.maintenance_max_batches,
+    search_history_retention_days=settings.search_history_retention_days,
+    purge_rate_limit_buckets=settings.rate_limit_backend == "supabase"
+)
@@ -0,0 +1,140 @@
+"""
+Analyse de repas en événements (server-sent events)
+Parseur JSON incrémental : les aliments détectés et les totaux nutritionnels
+sont émis dès qu'ils apparaissent dans le texte reçu, quel que soit son découpage
+"""
+
+import json
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+# Champs numériques de la réponse IA renvoyés comme totaux en cours
+TOTAL_FIELDS = (
+    "total_calories",
+    "total_proteins",
+    "total_carbs",
+    "total_fats",
+    "total_fiber",
+    "net_carbs",
+    "keto_score",
+    "confidence",
+)
+
+# Listes dont chaque élément est émis séparément : champ -> (événement, clé)
+LIST_FIELDS = {
+    "foods_detected": ("food", "name"),
+    "portions": ("portion", "portion"),
+}
+
+
+def format_sse(event: str, data: Dict[str, Any]) -> str:
+    """Formater un événement server-sent events"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+class IncrementalMealParser:
+    """
+    Parseur incrémental de l'objet JSON renvoyé par l'IA
+
+    Seuls les champs de premier niveau sont suivis : les éléments des listes
+    foods_detected / portions et les valeurs scalaires. Le texte avant la
+    première accolade (préambule du modèle) est ignoré.
+    """
+
+    def __init__(self):
+        self._text = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._scalar_start: Optional[int] = None
+        self._expect_key = False
+        self._key: Optional[str] = None
+        self._complete = False
+        self.values: Dict[str, Any] = {}
+        self.lists: Dict[str, List[Any]] = {field: [] for field in LIST_FIELDS}
+        # Listes effectivement présentes dans la réponse
+        self._seen_lists: Set[str] = set()
+
+    @property
+    def complete(self) -> bool:
+        return self._complete
+
+    def feed(self, chunk: str) -> List[Tuple[str, Dict[str, Any]]]:
+        """Ajouter un morceau de réponse et retourner les événements produits"""
+        events: List[Tuple[str, Dict[str, Any]]] = []
+        self._text += chunk
+
+        while self._pos < len(self._text) and not self._complete:
+            char = self._text[self._pos]
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    self._on_string(json.loads(self._text[self._string_start:self._pos + 1]), events)
+            elif self._depth == 0:
+                if char == "{":
+                    self._depth = 1
+                    self._expect_key = True
+            elif char == '"':
+                self._in_string = True
+                self._string_start = self._pos
+            elif char in "{[":
+                if self._depth == 1 and char == "[" and self._key in LIST_FIELDS:
+                    self._seen_lists.add(self._key)
+                self._depth += 1
+            elif char in "}]":
+                self._finish_scalar(events)
+                self._depth -= 1
+                if self._depth == 0:
+                    self._complete = True
+            elif char == ",":
+                self._finish_scalar(events)
+                if self._depth == 1:
+                    self._expect_key = True
+            elif self._depth == 1 and not char.isspace() and char != ":" and self._scalar_start is None:
+                self._scalar_start = self._pos
+
+            self._pos += 1
+
+        return events
+
+    def result(self) -> Optional[Dict[str, Any]]:
+        """Objet complet analysé, ou None si la réponse n'était pas un JSON complet"""
+        if not self._complete:
+            return None
+        # Une liste absente de la réponse garde la valeur par défaut de l'appelant
+        return {**self.values, **{field: self.lists[field] for field in self._seen_lists}}
+
+    def _totals(self) -> Dict[str, Any]:
+        return {field: self.values[field] for field in TOTAL_FIELDS if field in self.values}
+
+    def _on_string(self, value: str, events: List[Tuple[str, Dict[str, Any]]]) -> None:
+        if self._depth == 1 and self._expect_key:
+            self._key = value
+            self._expect_key = False
+        elif self._depth == 1:
+            self.values[self._key] = value
+        elif self._depth == 2 and self._key in LIST_FIELDS:
+            items = self.lists[self._key]
+            items.append(value)
+            event, field = LIST_FIELDS[self._key]
+            events.append((event, {"index": len(items) - 1, field: value}))
+
+    def _finish_scalar(self, events: List[Tuple[str, Dict[str, Any]]]) -> None:
+        if self._scalar_start is None:
+            return
+        raw = self._text[self._scalar_start:self._pos].strip()
+        self._scalar_start = None
+        try:
+            value = json.loads(raw)
+        except ValueError:
+            # Valeur non JSON (ex : expression laissée par le modèle) : ignorée
+            return
+        self.values[self._key] = value
+        if self._key in TOTAL_FIELDS:
+            events.append(("totals", self._totals()))
@@ -0,0 +1,56 @@
+"""
+Cache des préférences utilisateur
+Rempli à la lecture et mis à jour à chaque écriture (write-through) ; chaque
+version porte un ETag pour que les clients puissent revalider sans corps (304).
+"""
+
+import hashlib
+import json
+import threading
+from typing import Any, Dict, Optional, Tuple
+from cachetools import TTLCache
+from app.config import settings
+
+
+def compute_etag(data: Dict[str, Any]) -> str:
+    """ETag fort, stable quel que soit l'ordre des clés"""
+    payload = json.dumps(data, sort_keys=True, default=str, separators=(",", ":"))
+    return '"' + hashlib.sha1(payload.encode("utf-8")).hexdigest() + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Comparer un en-tête If-None-Match (liste, '*', préfixe W/) à un ETag"""
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    return "*" in candidates or any(candidate.removeprefix("W/") == etag for candidate in candidates)
+
+
+class PreferencesCache:
+    """user_id -> (préférences, ETag)"""
+
+    def __init__(self, max_users: int = 10000, ttl: float = 300.0):
+        # TTL : borne la durée de vie d'une version modifiée par une autre instance
+        self._entries: TTLCache = TTLCache(maxsize=max_users, ttl=ttl)
+        self._lock = threading.Lock()
+
+    def get(self, user_id: str) -> Optional[Tuple[Dict[str, Any], str]]:
+        with self._lock:
+            return self._entries.get(user_id)
+
+    def put(self, user_id: str, preferences: Dict[str, Any]) -> str:
+        etag = compute_etag(preferences)
+        with self._lock:
+            self._entries[user_id] = (preferences, etag)
+        return etag
+
+    def invalidate(self, user_id: str) -> None:
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+
+# Instance globale du service
+preferences_cache = PreferencesCache(
+    max_users=settings.preferences_cache_max_users,
+    ttl=settings.preferences_cache_ttl_seconds
+)
@@ -0,0 +1,186 @@
+"""
+Limitation de débit des routes d'authentification
+Seaux à jetons par adresse IP et par email, tenus en mémoire : les rafales
+(bourrage d'identifiants, inscriptions en masse) sont refusées avant tout
+appel à Supabase Auth. Un backend partagé (table Supabase) peut s'ajouter au
+seau local pour appliquer les mêmes limites sur toutes les instances.
+"""
+
+import hashlib
+import ipaddress
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple, Union
+from fastapi import HTTPException, Request, status
+from supabase import Client
+from app.config import settings
+from app.database.connection import get_admin_supabase_client
+from app.database.executor import run_query
+
+logger = logging.getLogger(__name__)
+
+
+class Limit(NamedTuple):
+    """capacity requêtes en rafale, seau entièrement rechargé en period secondes"""
+    capacity: float
+    period: float
+
+
+class RateLimitPolicy(NamedTuple):
+    ip: Limit
+    email: Limit
+
+
+RATE_LIMITS: Dict[str, RateLimitPolicy] = {
+    "login": RateLimitPolicy(ip=Limit(20, 60), email=Limit(5, 300)),
+    "register": RateLimitPolicy(ip=Limit(5, 3600), email=Limit(3, 3600)),
+    "resend_confirmation": RateLimitPolicy(ip=Limit(5, 600), email=Limit(3, 3600)),
+    "password_reset": RateLimitPolicy(ip=Limit(5, 600), email=Limit(3, 3600)),
+}
+
+
+class TokenBucketLimiter:
+    """Seaux à jetons en mémoire : clé -> (jetons restants, dernière mise à jour)"""
+
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def consume(self, key: str, limit: Limit, cost: float = 1.0) -> float:
+        """Prendre cost jetons ; retourne 0 si accepté, sinon le délai d'attente en secondes"""
+        return self.consume_all([(key, limit)], cost)
+
+    def consume_all(self, buckets: Sequence[Tuple[str, Limit]], cost: float = 1.0) -> float:
+        """Prendre cost jetons dans chaque seau, tout ou rien : un refus ne consomme aucun seau"""
+        now = time.monotonic()
+        with self._lock:
+            refilled = []
+            retry_after = 0.0
+            for key, limit in buckets:
+                rate = limit.capacity / limit.period
+                tokens, updated_at = self._buckets.pop(key, (limit.capacity, now))
+                tokens = min(limit.capacity, tokens + (now - updated_at) * rate)
+                if tokens < cost:
+                    retry_after = max(retry_after, (cost - tokens) / rate)
+                refilled.append((key, tokens))
+
+            for key, tokens in refilled:
+                self._buckets[key] = (tokens if retry_after else tokens - cost, now)
+            # Un seau inutilisé depuis longtemps est plein : l'oublier ne change rien
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return retry_after
+
+
+class SupabaseRateLimitBackend:
+    """Seaux partagés entre instances (fonction consume_rate_limit, supabase_rate_limit_buckets.sql)"""
+
+    def __init__(self):
+        self._client: Optional[Client] = None
+
+    async def consume_all(self, buckets: Sequence[Tuple[str, Limit]], cost: float = 1.0) -> float:
+        """Comme TokenBucketLimiter.consume_all, en un seul appel"""
+        if self._client is None:
+            self._client = get_admin_supabase_client()
+        response = await run_query(
+            "rpc.consume_rate_limit",
+            self._client.rpc("consume_rate_limit", {
+                "p_keys": [key for key, _ in buckets],
+                "p_capacities": [limit.capacity for _, limit in buckets],
+                "p_periods": [limit.period for _, limit in buckets],
+                "p_cost": cost
+            })
+        )
+        return float(response.data or 0)
+
+
+class RateLimiter:
+    """Vérification des limites d'une route : seau local d'abord, puis backend partagé"""
+
+    def __init__(self, local: TokenBucketLimiter, shared: Optional[SupabaseRateLimitBackend] = None,
+                 trusted_proxies: Iterable[str] = ()):
+        self.local = local
+        self.shared = shared
+        # Réseaux des reverse proxies dont l'en-tête X-Forwarded-For est fiable
+        self.trusted_proxies: List[Union[ipaddress.IPv4Network, ipaddress.IPv6Network]] = [
+            ipaddress.ip_network(proxy.strip(), strict=False) for proxy in trusted_proxies if proxy.strip()
+        ]
+        self._rejected: Dict[str, int] = {}
+
+    async def check(self, scope: str, ip: str, email: Optional[str] = None) -> float:
+        """0 si la requête est acceptée, sinon le délai d'attente (Retry-After) en secondes"""
+        policy = RATE_LIMITS[scope]
+        buckets = [(f"{scope}:ip:{ip}", policy.ip)]
+        if email:
+            # Empreinte : pas d'adresse email en clair dans les clés partagées
+            email_hash = hashlib.sha256(email.strip().lower().encode("utf-8")).hexdigest()[:32]
+            buckets.append((f"{scope}:email:{email_hash}", policy.email))
+
+        # Seaux IP et email pris ensemble : une requête refusée ne consomme rien
+        retry_after = self.local.consume_all(buckets)
+        if not retry_after and self.shared is not None:
+            try:
+                retry_after = await self.shared.consume_all(buckets)
+            except Exception as e:
+                # Backend partagé indisponible : le seau local suffit
+                logger.warning(f"Shared rate limit backend failed: {e}")
+        if retry_after:
+            self._rejected[scope] = self._rejected.get(scope, 0) + 1
+        return retry_after
+
+    def client_ip(self, request: Request) -> str:
+        """
+        Adresse du client
+
+        Derrière des proxies de confiance, X-Forwarded-For est lu de droite à
+        gauche : chaque proxy ajoute l'adresse de son pair à la fin, et la
+        première adresse hors des proxies de confiance est celle du client.
+        Les entrées plus à gauche, fournies par le client, sont ignorées.
+        """
+        peer = request.client.host if request.client else "unknown"
+        if not self.trusted_proxies or not self._is_trusted(peer):
+            return peer
+
+        hops = [hop.strip() for hop in request.headers.get("x-forwarded-for", "").split(",") if hop.strip()]
+        for hop in reversed(hops):
+            if not self._is_trusted(hop):
+                return hop
+        # Toute la chaîne est interne : la requête vient du proxy le plus éloigné
+        return hops[0] if hops else peer
+
+    def _is_trusted(self, address: str) -> bool:
+        try:
+            ip = ipaddress.ip_address(address)
+        except ValueError:
+            return False
+        return any(ip in network for network in self.trusted_proxies)
+
+    def stats(self) -> Dict[str, int]:
+        return dict(self._rejected)
+
+
+# Instance globale du service
+rate_limiter = RateLimiter(
+    TokenBucketLimiter(max_keys=settings.rate_limit_max_keys),
+    shared=SupabaseRateLimitBackend() if settings.rate_limit_backend == "supabase" else None,
+    trusted_proxies=settings.rate_limit_trusted_proxies
+)
+
+
+async def enforce_rate_limit(request: Request, scope: str, email: Optional[str] = None) -> None:
+    """Lever une erreur 429 (avec Retry-After) si la limite de la route est atteinte"""
+    if not settings.rate_limit_enabled:
+        return
+    ip = rate_limiter.client_ip(request)
+    retry_after = await rate_limiter.check(scope, ip, email)
+    if retry_after:
+        logger.warning(f"Rate limit exceeded for {scope} from {ip}")
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many requests, please try again later",
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+        )
@@ -0,0 +1,203 @@
+"""
+Aliments de référence
+Source unique des valeurs nutritionnelles locales partagée par les routers
+(recherche, favoris, vision, analyse de repas), indexée une fois à l'import
+"""
+
+from bisect import bisect_left
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from app.services.food_matcher import FoodMatcher, fold_food_name
+
+
+class ReferenceFood:
+    """Aliment de référence, valeurs pour 100g"""
+
+    __slots__ = (
+        "id", "name", "category", "brand", "calories", "protein", "carbs",
+        "fat", "fiber", "keto_score", "image_url", "synonyms",
+    )
+
+    def __init__(self, id: str, name: str, category: str, calories: float, protein: float,
+                 carbs: float, fat: float, fiber: float, keto_score: int,
+                 brand: Optional[str] = None, image_url: Optional[str] = None,
+                 synonyms: Tuple[str, ...] = ()):
+        self.id = id
+        self.name = name
+        self.category = category
+        self.brand = brand
+        self.calories = calories
+        self.protein = protein
+        self.carbs = carbs
+        self.fat = fat
+        self.fiber = fiber
+        self.keto_score = keto_score
+        self.image_url = image_url
+        self.synonyms = synonyms
+
+    def to_search_result(self) -> Dict[str, Any]:
+        """Format FoodSearchResult (/foods)"""
+        return {
+            "id": self.id,
+            "name": self.name,
+            "brand": self.brand,
+            "category": self.category,
+            "calories_per_100g": self.calories,
+            "proteins_per_100g": self.protein,
+            "carbs_per_100g": self.carbs,
+            "fats_per_100g": self.fat,
+            "fiber_per_100g": self.fiber,
+            "image_url": self.image_url,
+            "source": "local",
+        }
+
+    def to_nutrition(self) -> Dict[str, Any]:
+        """Format des valeurs nutritionnelles de l'analyse d'images"""
+        return {
+            "calories": self.calories,
+            "protein": self.protein,
+            "carbs": self.carbs,
+            "fat": self.fat,
+            "fiber": self.fiber,
+            "keto_score": self.keto_score,
+        }
+
+    def to_product(self) -> Dict[str, Any]:
+        """Format des lignes de food_database"""
+        return {
+            "openfoodfacts_id": None,
+            "barcode": None,
+            "product_name": self.name,
+            "brand": self.brand,
+            "calories_per_100g": self.calories,
+            "protein_per_100g": self.protein,
+            "carbohydrates_per_100g": self.carbs,
+            "fat_per_100g": self.fat,
+            "fiber_per_100g": self.fiber,
+            "categories": [self.category],
+            "keto_score": self.keto_score,
+            "is_keto_friendly": self.keto_score >= 7,
+            "image_url": self.image_url,
+            "data_source": "local",
+        }
+
+
+class ReferenceFoodStore:
+    """
+    Aliments de référence et leurs index
+
+    Recherche par identifiant, nom normalisé ou catégorie en O(1), par début
+    de mot du nom ou d'un synonyme par dichotomie.
+    """
+
+    def __init__(self, foods: Iterable[ReferenceFood]):
+        self.foods: Tuple[ReferenceFood, ...] = tuple(foods)
+        self._by_id = {food.id: food for food in self.foods}
+        self._by_name: Dict[str, ReferenceFood] = {}
+        by_category: Dict[str, List[ReferenceFood]] = {}
+        keys: List[Tuple[str, int]] = []
+        self.matcher = FoodMatcher()
+
+        for position, food in enumerate(self.foods):
+            by_category.setdefault(food.category.lower(), []).append(food)
+            self.matcher.add(food.name, food, food.synonyms)
+            for label in (food.name, *food.synonyms):
+                folded = fold_food_name(label)
+                self._by_name.setdefault(folded, food)
+                words = folded.split()
+                for start in range(len(words)):
+                    keys.append((" ".join(words[start:]), position))
+
+        keys.sort()
+        self._keys = keys
+        self._by_category = {category: tuple(foods) for category, foods in by_category.items()}
+        self.categories: Tuple[str, ...] = tuple(sorted({food.category for food in self.foods}))
+
+    def __len__(self) -> int:
+        return len(self.foods)
+
+    def __iter__(self):
+        return iter(self.foods)
+
+    def get(self, food_id: str) -> Optional[ReferenceFood]:
+        return self._by_id.get(food_id)
+
+    def by_name(self, name: str) -> Optional[ReferenceFood]:
+        """Aliment dont le nom (ou un synonyme) correspond exactement, accents et casse ignorés"""
+        return self._by_name.get(fold_food_name(name))
+
+    def by_category(self, category: str) -> Tuple[ReferenceFood, ...]:
+        return self._by_category.get(category.lower(), ())
+
+    def match(self, text: str) -> Optional[ReferenceFood]:
+        """Aliment cité dans un texte libre ('saumon fumé grillé' -> Saumon)"""
+        return self.matcher.match(text)
+
+    def search(self, query: str, category: Optional[str] = None, limit: int = 10) -> List[ReferenceFood]:
+        """Aliments dont un mot du nom ou d'un synonyme commence par la recherche"""
+        prefix = fold_food_name(query)
+        if not prefix:
+            return []
+
+        results: List[ReferenceFood] = []
+        seen = set()
+        index = bisect_left(self._keys, (prefix,))
+        while index < len(self._keys) and len(results) < limit:
+            key, position = self._keys[index]
+            if not key.startswith(prefix):
+                break
+            food = self.foods[position]
+            if position not in seen and (not category or food.category.lower() == category.lower()):
+                seen.add(position)
+                results.append(food)
+            index += 1
+        return results
+
+
+# Aliments de référence (valeurs pour 100g)
+reference_foods = ReferenceFoodStore([
+    ReferenceFood(
+        "avocado", "Avocat", "fruits", 160, 2, 9, 15, 7, keto_score=9,
+        image_url="https://images.unsplash.com/photo-1523049673857-eb18f1d7b578?w=100",
+        synonyms=("avocado", "guacamole"),
+    ),
+    ReferenceFood(
+        "salmon", "Saumon", "poisson", 208, 25, 0, 12, 0, keto_score=10,
+        image_url="https://images.unsplash.com/photo-1519708227418-c8e56d59a7a0?w=100",
+        synonyms=("salmon",),
+    ),
+    ReferenceFood(
+        "eggs", "Œufs", "protéines", 155, 13, 1, 11, 0, keto_score=10,
+        image_url="https://images.unsplash.com/photo-1582722872445-44dc5f7e3c8f?w=100",
+        synonyms=("egg", "omelette"),
+    ),
+    ReferenceFood(
+        "spinach", "Épinards", "légumes", 23, 3, 4, 0, 2, keto_score=8,
+        image_url="https://images.unsplash.com/photo-1576045057995-568f588f82fb?w=100",
+        synonyms=("spinach",),
+    ),
+    ReferenceFood(
+        "chicken", "Poulet", "viande", 165, 31, 0, 4, 0, keto_score=9,
+        image_url="https://images.unsplash.com/photo-1604503468506-a8da13d82791?w=100",
+        synonyms=("chicken", "volaille"),
+    ),
+    ReferenceFood(
+        "broccoli", "Brocoli", "légumes", 34, 3, 7, 0, 3, keto_score=8,
+        image_url="https://images.unsplash.com/photo-1459411621453-7b03977f4bfc?w=100",
+        synonyms=("broccoli",),
+    ),
+    ReferenceFood(
+        "cheese", "Fromage", "produits laitiers", 380, 25, 1, 30, 0, keto_score=10,
+        brand="Emmental",
+        image_url="https://images.unsplash.com/photo-1486297678162-eb2a19b0a32d?w=100",
+        synonyms=("cheese", "emmental", "comté", "gruyère"),
+    ),
+    ReferenceFood(
+        "almonds", "Amandes", "noix", 579, 21, 22, 50, 12, keto_score=7,
+        image_url="https://images.unsplash.com/photo-1508747703725-719777637510?w=100",
+        synonyms=("almond",),
+    ),
+    ReferenceFood("butter", "Beurre", "produits laitiers", 717, 0.85, 0.06, 81, 0, keto_score=10, synonyms=("butter",)),
+    ReferenceFood("olive_oil", "Huile d'olive", "matières grasses", 884, 0, 0, 100, 0, keto_score=10, synonyms=("olive oil",)),
+    ReferenceFood("bread", "Pain", "boulangerie", 265, 9, 49, 3.2, 2.7, keto_score=1, synonyms=("bread",)),
+    ReferenceFood("baguette", "Baguette", "boulangerie", 274, 8.5, 55.8, 1.3, 2.3, keto_score=1),
+])
@@ -0,0 +1,44 @@
+"""
+Tâches de fond périodiques
+Démarrées et arrêtées depuis le hook lifespan de l'application
+"""
+
+import asyncio
+import logging
+from typing import Awaitable, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class PeriodicTask:
+    """Exécuter une coroutine à intervalle régulier, sans jamais interrompre la boucle"""
+
+    def __init__(self, name: str, interval: float, func: Callable[[], Awaitable[object]], run_immediately: bool = True):
+        self.name = name
+        self.interval = interval
+        self.func = func
+        self.run_immediately = run_immediately
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name=self.name)
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        if not self.run_immediately:
+            await asyncio.sleep(self.interval)
+        while True:
+            try:
+                await self.func()
+            except Exception as e:
+                logger.error(f"Periodic task '{self.name}' failed: {e}")
+            await asyncio.sleep(self.interval)
@@ -0,0 +1,252 @@
+"""
+Historique de recherche
+Écriture différée : les recherches sont mises en tampon, dédupliquées et
+insérées par lots en tâche de fond, hors du chemin critique de /foods/search.
+Les recherches récentes de chaque utilisateur sont gardées en mémoire.
+"""
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
+from typing import Any, Deque, Dict, List, Optional, Tuple
+from supabase import Client
+from app.config import settings
+from app.database.connection import get_admin_supabase_client
+from app.database.executor import run_blocking
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_query(query: str) -> str:
+    """Clé de déduplication d'une recherche : minuscules, espaces normalisés"""
+    return " ".join(query.lower().split())
+
+
+def _searched_at_key(value: Any) -> datetime:
+    """Date de recherche comparable (UTC sans fuseau) : la base renvoie +00:00, le tampon non"""
+    try:
+        moment = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except (TypeError, ValueError):
+        return datetime.min
+    return moment.astimezone(timezone.utc).replace(tzinfo=None) if moment.tzinfo else moment
+
+
+class SearchHistoryWriter:
+    """Tampon d'écriture de l'historique, vidé par taille ou par délai"""
+
+    def __init__(self, batch_size: int = 100, flush_interval: float = 2.0, max_pending: int = 5000):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        # (user_id, recherche normalisée) -> ligne à insérer ; l'ordre d'insertion suit la dernière recherche
+        self._pending: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._flush_requested: Optional[asyncio.Event] = None
+        self._stopping = False
+        self._task: Optional[asyncio.Task] = None
+        # Un seul vidage à la fois : l'arrêt attend le lot en cours
+        self._flush_lock = asyncio.Lock()
+        self._client: Optional[Client] = None
+
+    def record(self, user_id: str, query: str, result_count: int = 0) -> None:
+        """Ajouter une recherche au tampon (non bloquant)"""
+        key = (str(user_id), normalize_query(query))
+        if not key[1]:
+            return
+
+        # Une recherche répétée avant le prochain lot ne produit qu'une ligne
+        self._pending.pop(key, None)
+        self._pending[key] = {
+            "user_id": str(user_id),
+            "query": query.strip(),
+            "searched_at": datetime.utcnow().isoformat(),
+            "result_count": result_count,
+            "search_type": "text",
+        }
+
+        if len(self._pending) > self.max_pending:
+            # Base indisponible depuis longtemps : abandonner les plus anciennes
+            self._pending.pop(next(iter(self._pending)))
+
+        if len(self._pending) >= self.batch_size and self._flush_requested is not None:
+            self._flush_requested.set()
+
+    async def start(self) -> None:
+        """Démarrer la tâche de vidage périodique"""
+        if self._task is None:
+            self._stopping = False
+            self._flush_requested = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Arrêter la tâche de fond (après le lot en cours) et écrire les recherches restantes"""
+        if self._task is not None:
+            self._stopping = True
+            self._flush_requested.set()
+            await self._task
+            self._task = None
+        await self.flush()
+
+    async def flush(self) -> int:
+        """
+        Insérer les recherches en attente par lots ; retourne le nombre de lignes
+
+        Une ligne ne quitte le tampon qu'une fois écrite : un lot en échec
+        est retenté au vidage suivant.
+        """
+        async with self._flush_lock:
+            written = 0
+            pending = list(self._pending.items())
+            for start in range(0, len(pending), self.batch_size):
+                batch = pending[start:start + self.batch_size]
+                try:
+                    await run_blocking("search_history.insert", self._insert, [row for _, row in batch])
+                except Exception as e:
+                    # L'historique reste « best effort » : ne jamais bloquer la recherche
+                    logger.warning(f"Failed to save search history batch ({len(batch)} rows): {e}")
+                    continue
+                for key, row in batch:
+                    # Recherche répétée pendant l'écriture : la nouvelle ligne reste en attente
+                    if self._pending.get(key) is row:
+                        del self._pending[key]
+                written += len(batch)
+            return written
+
+    def _insert(self, rows: List[Dict[str, Any]]) -> None:
+        if self._client is None:
+            # Lignes de plusieurs utilisateurs dans un même lot : client service
+            self._client = get_admin_supabase_client()
+        self._client.table("search_history").insert(rows).execute()
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._flush_requested.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_requested.clear()
+            if self._stopping:
+                break
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Search history writer error: {e}")
+
+
+class RecentSearchCache:
+    """
+    Recherches récentes distinctes par utilisateur
+
+    Un tampon circulaire par utilisateur (plus récente en premier), LRU sur
+    les utilisateurs pour borner la mémoire. La table search_history n'est lue
+    qu'au premier accès d'un utilisateur, puis après son éviction. Avec
+    refresh_seconds, elle est relue à cet intervalle pour y retrouver les
+    recherches faites sur les autres instances.
+    """
+
+    def __init__(self, max_users: int = 10000, per_user: int = 20, refresh_seconds: Optional[float] = None):
+        self.max_users = max_users
+        self.per_user = per_user
+        self.refresh_seconds = refresh_seconds
+        self._users: "OrderedDict[str, Deque[Dict[str, Any]]]" = OrderedDict()
+        # user_id -> date (monotone) du dernier chargement réussi depuis la base
+        self._hydrated: Dict[str, float] = {}
+        self._client: Optional[Client] = None
+
+    def push(self, user_id: str, query: str, searched_at: Optional[str] = None) -> None:
+        """Ajouter une recherche en tête du tampon de l'utilisateur"""
+        user_id = str(user_id)
+        key = normalize_query(query)
+        if not key:
+            return
+
+        entries = self._entries(user_id)
+        for entry in list(entries):
+            if normalize_query(entry["query"]) == key:
+                entries.remove(entry)
+        entries.appendleft({
+            "query": query.strip(),
+            "searched_at": searched_at or datetime.utcnow().isoformat()
+        })
+
+    async def recent(self, user_id: str, limit: int) -> List[Dict[str, Any]]:
+        """Recherches récentes d'un utilisateur, chargées depuis la base si besoin"""
+        user_id = str(user_id)
+        hydrated_at = self._hydrated.get(user_id)
+        stale = (
+            hydrated_at is None
+            or (self.refresh_seconds is not None and time.monotonic() - hydrated_at >= self.refresh_seconds)
+        )
+        if stale:
+            try:
+                rows = await run_blocking("search_history.select_recent", self._load, user_id)
+            except Exception as e:
+                # Servir le tampon en mémoire ; la lecture est retentée au prochain appel
+                logger.warning(f"Failed to load recent searches for user {user_id}: {e}")
+            else:
+                self._hydrate(user_id, rows)
+
+        entries = self._entries(user_id)
+        return list(entries)[:limit]
+
+    def _entries(self, user_id: str) -> Deque[Dict[str, Any]]:
+        entries = self._users.get(user_id)
+        if entries is None:
+            entries = deque(maxlen=self.per_user)
+            self._users[user_id] = entries
+            if len(self._users) > self.max_users:
+                evicted, _ = self._users.popitem(last=False)
+                self._hydrated.pop(evicted, None)
+        else:
+            self._users.move_to_end(user_id)
+        return entries
+
+    def _hydrate(self, user_id: str, rows: List[Dict[str, Any]]) -> None:
+        # Tampon (recherches pas encore écrites) et base fusionnés par date, la plus récente d'abord
+        candidates = list(self._entries(user_id)) + [
+            {"query": row["query"], "searched_at": row.get("searched_at")}
+            for row in rows if row.get("query")
+        ]
+        candidates.sort(key=lambda entry: _searched_at_key(entry["searched_at"]), reverse=True)
+
+        recent: List[Dict[str, Any]] = []
+        seen = set()
+        for entry in candidates:
+            key = normalize_query(entry["query"])
+            if key and key not in seen and len(recent) < self.per_user:
+                seen.add(key)
+                recent.append(entry)
+
+        self._users[user_id] = deque(recent, maxlen=self.per_user)
+        self._hydrated[user_id] = time.monotonic()
+
+    def _load(self, user_id: str) -> List[Dict[str, Any]]:
+        if self._client is None:
+            # Lecture filtrée par user_id : client service, sans la session du client partagé
+            self._client = get_admin_supabase_client()
+        # Plusieurs lignes par recherche possibles : lire plus large que le tampon
+        result = self._client.table("search_history") \
+            .select("query, searched_at") \
+            .eq("user_id", user_id) \
+            .order("searched_at", desc=True) \
+            .limit(self.per_user * 5) \
+            .execute()
+        return result.data or []
+
+
+# Instances globales du service
+search_history_writer = SearchHistoryWriter(
+    batch_size=settings.search_history_batch_size,
+    flush_interval=settings.search_history_flush_interval_seconds
+)
+recent_search_cache = RecentSearchCache(
+    max_users=settings.recent_searches_max_users,
+    refresh_seconds=settings.recent_searches_refresh_seconds
+)
+
+
+def record_search(user_id: str, query: str, result_count: int = 0) -> None:
+    """Enregistrer une recherche : historique différé et recherches récentes"""
+    search_history_writer.record(user_id, query, result_count)
+    recent_search_cache.push(user_id, query)
@@ -0,0 +1,138 @@
+"""
+Disjoncteur et requêtes doublées pour les API externes
+Quand un service répond mal ou trop lentement, les appels échouent
+immédiatement au lieu d'attendre le timeout complet.
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Deque, Optional, Set, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class CircuitOpenError(Exception):
+    """Appel refusé : le disjoncteur est ouvert"""
+
+
+class CircuitBreaker:
+    """
+    Disjoncteur à fenêtre glissante
+
+    - fermé : les appels passent ; s'ils sont trop souvent en erreur ou trop
+      lents sur les derniers appels, le disjoncteur s'ouvre
+    - ouvert : les appels sont refusés pendant reset_timeout secondes
+    - semi-ouvert : un seul appel d'essai ; sa réussite referme le disjoncteur
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_rate_threshold: float = 0.5, slow_call_seconds: float = 3.0,
+                 window_size: int = 20, min_calls: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_rate_threshold = failure_rate_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.min_calls = min_calls
+        self.reset_timeout = reset_timeout
+        # True pour un appel en échec (erreur ou trop lent)
+        self._outcomes: Deque[bool] = deque(maxlen=window_size)
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return self.HALF_OPEN
+            return self._state
+
+    def allow(self) -> bool:
+        """Réserver un appel ; False si le disjoncteur le refuse"""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if time.monotonic() - self._opened_at < self.reset_timeout or self._trial_in_flight:
+                return False
+            self._state = self.HALF_OPEN
+            self._trial_in_flight = True
+            return True
+
+    def record(self, latency: float, success: bool) -> None:
+        failed = not success or latency >= self.slow_call_seconds
+        with self._lock:
+            if self._state == self.HALF_OPEN:
+                self._trial_in_flight = False
+                if failed:
+                    self._open()
+                else:
+                    self._state = self.CLOSED
+                    self._outcomes.clear()
+                    logger.info(f"Circuit '{self.name}' closed")
+                return
+
+            self._outcomes.append(failed)
+            if len(self._outcomes) >= self.min_calls:
+                failure_rate = sum(self._outcomes) / len(self._outcomes)
+                if failure_rate >= self.failure_rate_threshold:
+                    self._open()
+
+    def _open(self) -> None:
+        self._state = self.OPEN
+        self._opened_at = time.monotonic()
+        self._outcomes.clear()
+        logger.warning(f"Circuit '{self.name}' opened for {self.reset_timeout:.0f}s")
+
+
+class LatencyTracker:
+    """Latences récentes des appels réussis, pour estimer le p95"""
+
+    def __init__(self, window_size: int = 200, default: float = 1.0):
+        self.default = default
+        self._latencies: Deque[float] = deque(maxlen=window_size)
+        self._lock = threading.Lock()
+
+    def add(self, latency: float) -> None:
+        with self._lock:
+            self._latencies.append(latency)
+
+    def percentile(self, fraction: float) -> float:
+        with self._lock:
+            latencies = sorted(self._latencies)
+        if len(latencies) < 20:
+            return self.default
+        return latencies[min(len(latencies) - 1, int(len(latencies) * fraction))]
+
+
+def hedged_call(executor: ThreadPoolExecutor, func: Callable[[], T], delay: float) -> T:
+    """
+    Appeler func dans executor ; sans réponse après delay secondes, lancer un
+    second appel identique. Le premier des deux qui réussit est renvoyé, l'autre
+    est annulé s'il n'a pas démarré (sinon son résultat est ignoré).
+
+    Un premier appel qui échoue avant delay n'est pas doublé : l'erreur est levée.
+    """
+    primary = executor.submit(func)
+    done, _ = wait([primary], timeout=delay)
+    if done:
+        return primary.result()
+
+    pending: Set[Future] = {primary, executor.submit(func)}
+    error: Optional[BaseException] = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                for loser in pending:
+                    loser.cancel()
+                return future.result()
+            error = error or future.exception()
+    raise error
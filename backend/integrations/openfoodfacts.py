@@ -5,9 +5,14 @@ Intégration pour rechercher et enrichir les données alimentaires
 
 import requests
 import logging
-from typing import Dict, List, Optional, Any
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Any, Tuple
 from datetime import datetime, timedelta
+from cachetools import TTLCache
 import json
+from integrations.circuit_breaker import CircuitBreaker, CircuitOpenError, LatencyTracker, hedged_call
 
 logger = logging.getLogger(__name__)
 
@@ -18,17 +23,64 @@ class OpenFoodFactsAPI:
     SEARCH_URL = f"{BASE_URL}/cgi/search.pl"
     PRODUCT_URL = f"{BASE_URL}/api/v0/product"
     
-    def __init__(self):
+    # Profils de champs : une liste de résultats n'a besoin que du nom, de la
+    # marque et des macros ; la fiche complète est chargée à l'ouverture du produit
+    SEARCH_FIELDS = 'code,product_name,brands,categories,nutriments,image_small_url'
+    DETAIL_FIELDS = 'code,product_name,brands,categories,labels,allergens,nutriments,ingredients_text,image_url'
+    
+    REQUEST_TIMEOUT_SECONDS = 10
+    # Une requête sans réponse après le p95 des latences (au moins ce délai) est doublée
+    HEDGE_MIN_DELAY_SECONDS = 0.3
+    
+    def __init__(self, hedge_requests: bool = True):
         self.session = requests.Session()
         self.session.headers.update({
             'User-Agent': 'KetoSansStress/1.0 (https://ketosansstress.fr; support@ketosansstress.fr)'
         })
+        # OFF lent ou en erreur : échouer immédiatement plutôt qu'attendre le timeout
+        self.breaker = CircuitBreaker("openfoodfacts")
+        self.latencies = LatencyTracker()
+        # Pool des appels et de leurs doublons : le premier appel y est soumis aussi
+        self._hedge_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="openfoodfacts-hedge") if hedge_requests else None
+    
+    def is_available(self) -> bool:
+        """False tant que le disjoncteur est ouvert"""
+        return self.breaker.state != CircuitBreaker.OPEN
+    
+    def _get_json(self, url: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        """GET via le disjoncteur, doublé si la réponse tarde"""
+        if not self.breaker.allow():
+            raise CircuitOpenError("OpenFoodFacts indisponible (disjoncteur ouvert)")
+        
+        # Latence mesurée depuis le début de l'appel, attente dans le pool comprise
+        started = time.monotonic()
+        try:
+            if self._hedge_executor is not None:
+                delay = max(self.HEDGE_MIN_DELAY_SECONDS, self.latencies.percentile(0.95))
+                data = hedged_call(self._hedge_executor, lambda: self._fetch_json(url, params), delay)
+            else:
+                data = self._fetch_json(url, params)
+        except Exception:
+            self.breaker.record(time.monotonic() - started, success=False)
+            raise
+        
+        self.breaker.record(time.monotonic() - started, success=True)
+        return data
+    
+    def _fetch_json(self, url: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        started = time.monotonic()
+        response = self.session.get(url, params=params, timeout=self.REQUEST_TIMEOUT_SECONDS)
+        response.raise_for_status()
+        data = response.json()
+        self.latencies.add(time.monotonic() - started)
+        return data
     
     def search_products(self, 
                        query: str, 
                        country: str = "france",
                        language: str = "fr",
-                       limit: int = 20) -> List[Dict[str, Any]]:
+                       limit: int = 20,
+                       category: Optional[str] = None) -> List[Dict[str, Any]]:
         """
         Rechercher des produits par nom
         
@@ -37,6 +89,7 @@ class OpenFoodFactsAPI:
             country: Pays de recherche (france par défaut)
             language: Langue des résultats (fr par défaut)
             limit: Nombre maximum de résultats
+            category: Catégorie OpenFoodFacts à laquelle restreindre la recherche
         
         Returns:
             Liste des produits trouvés
@@ -49,25 +102,27 @@ class OpenFoodFactsAPI:
                 'json': 1,
                 'page_size': limit,
                 'countries': country,
-                'fields': 'code,product_name,brands,categories,nutriments,ingredients_text,image_url,keto_score'
+                'fields': self.SEARCH_FIELDS
             }
+            if category:
+                params.update({'tagtype_0': 'categories', 'tag_contains_0': 'contains', 'tag_0': category})
             
-            response = self.session.get(self.SEARCH_URL, params=params, timeout=10)
-            response.raise_for_status()
-            
-            data = response.json()
+            data = self._get_json(self.SEARCH_URL, params)
             products = data.get('products', [])
             
             # Filtrer et enrichir les produits
             enriched_products = []
             for product in products:
-                enriched = self._enrich_product_data(product)
+                enriched = self._enrich_product_data(product, detail=False)
                 if enriched:
                     enriched_products.append(enriched)
             
             logger.info(f"Trouvé {len(enriched_products)} produits pour '{query}'")
             return enriched_products
             
+        except CircuitOpenError:
+            logger.debug(f"Recherche OpenFoodFacts ignorée pour '{query}' (disjoncteur ouvert)")
+            return []
         except Exception as e:
             logger.error(f"Erreur lors de la recherche OpenFoodFacts: {e}")
             return []
@@ -84,10 +139,7 @@ class OpenFoodFactsAPI:
         """
         try:
             url = f"{self.PRODUCT_URL}/{barcode}.json"
-            response = self.session.get(url, timeout=10)
-            response.raise_for_status()
-            
-            data = response.json()
+            data = self._get_json(url, {'fields': self.DETAIL_FIELDS})
             
             if data.get('status') == 1 and 'product' in data:
                 enriched = self._enrich_product_data(data['product'])
@@ -97,16 +149,21 @@ class OpenFoodFactsAPI:
                 logger.warning(f"Aucun produit trouvé pour le code-barres {barcode}")
                 return None
                 
+        except CircuitOpenError:
+            logger.debug(f"Code-barres {barcode} non recherché (disjoncteur OpenFoodFacts ouvert)")
+            return None
         except Exception as e:
             logger.error(f"Erreur lors de la récupération du produit {barcode}: {e}")
             return None
     
-    def _enrich_product_data(self, product: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    def _enrich_product_data(self, product: Dict[str, Any], detail: bool = True) -> Optional[Dict[str, Any]]:
         """
         Enrichir les données d'un produit avec calculs spécifiques au keto
         
         Args:
             product: Données brutes du produit OpenFoodFacts
+            detail: Fiche complète (ingrédients, labels, allergènes) ou
+                résumé pour une liste de résultats
         
         Returns:
             Données enrichies du produit ou None si données insuffisantes
@@ -134,7 +191,8 @@ class OpenFoodFactsAPI:
             is_keto_friendly = keto_score >= 7 if keto_score else False
             
             # Score de qualité des données
-            data_quality = self._calculate_data_quality(product, nutriments)
+            image_url = product.get('image_url') or product.get('image_small_url', '')
+            data_quality = self._calculate_data_quality({**product, 'image_url': image_url}, nutriments)
             
             enriched_product = {
                 'openfoodfacts_id': product.get('code', ''),
@@ -154,10 +212,7 @@ class OpenFoodFactsAPI:
                 
                 # Métadonnées du produit
                 'categories': self._parse_categories(product.get('categories', '')),
-                'labels': self._parse_labels(product.get('labels', '')),
-                'allergens': self._parse_allergens(product.get('allergens', '')),
-                'ingredients_text': product.get('ingredients_text', ''),
-                'image_url': product.get('image_url', ''),
+                'image_url': image_url,
                 
                 # Compatibilité keto
                 'keto_score': keto_score,
@@ -167,8 +222,16 @@ class OpenFoodFactsAPI:
                 'data_source': 'openfoodfacts',
                 'data_quality_score': data_quality,
                 'last_updated': datetime.utcnow().isoformat(),
+                'details_loaded': detail,
             }
             
+            if detail:
+                enriched_product.update({
+                    'labels': self._parse_labels(product.get('labels', '')),
+                    'allergens': self._parse_allergens(product.get('allergens', '')),
+                    'ingredients_text': product.get('ingredients_text', ''),
+                })
+            
             return enriched_product
             
         except Exception as e:
@@ -313,25 +376,74 @@ class OpenFoodFactsAPI:
 class FoodSearchService:
     """Service de recherche d'aliments avec cache et intelligence"""
     
+    # Les fiches OpenFoodFacts évoluent peu : quelques heures de cache suffisent
+    SEARCH_CACHE_SIZE = 1024
+    SEARCH_CACHE_TTL_SECONDS = 6 * 3600
+    PRODUCT_CACHE_SIZE = 4096
+    PRODUCT_CACHE_TTL_SECONDS = 24 * 3600
+    
     def __init__(self):
         self.openfoodfacts = OpenFoodFactsAPI()
+        # query normalisée -> (limite demandée à OFF, résultats triés)
+        self._search_cache: TTLCache = TTLCache(
+            maxsize=self.SEARCH_CACHE_SIZE,
+            ttl=self.SEARCH_CACHE_TTL_SECONDS
+        )
+        # code-barres -> fiche complète du produit
+        self._product_cache: TTLCache = TTLCache(
+            maxsize=self.PRODUCT_CACHE_SIZE,
+            ttl=self.PRODUCT_CACHE_TTL_SECONDS
+        )
+        # search_foods est appelé depuis des threads (asyncio.to_thread)
+        self._cache_lock = threading.Lock()
+    
+    @staticmethod
+    def _cache_key(query: str, category: Optional[str] = None) -> str:
+        key = " ".join(query.lower().split())
+        return f"{key}|{category.lower()}" if category else key
+    
+    def get_cached_search(self, query: str, limit: int = 20,
+                          category: Optional[str] = None) -> Optional[List[Dict[str, Any]]]:
+        """
+        Récupérer une recherche depuis le cache sans appel réseau
         
-    def search_foods(self, query: str, limit: int = 20) -> List[Dict[str, Any]]:
+        Returns:
+            Les résultats en cache, ou None si la recherche n'est pas en cache
+            (ou a été faite avec une limite plus petite)
+        """
+        with self._cache_lock:
+            entry: Optional[Tuple[int, List[Dict[str, Any]]]] = self._search_cache.get(self._cache_key(query, category))
+        
+        if entry is None:
+            return None
+        
+        fetched_limit, results = entry
+        if fetched_limit < limit and len(results) >= fetched_limit:
+            # Le cache contient moins de résultats que ce qu'OFF pourrait renvoyer
+            return None
+        return results[:limit]
+    
+    def search_foods(self, query: str, limit: int = 20, category: Optional[str] = None) -> List[Dict[str, Any]]:
         """
         Rechercher des aliments avec plusieurs sources
         
         Args:
             query: Terme de recherche
             limit: Nombre maximum de résultats
+            category: Catégorie à laquelle restreindre la recherche
         
         Returns:
             Liste des aliments trouvés, triés par pertinence et score keto
         """
+        cached = self.get_cached_search(query, limit, category)
+        if cached is not None:
+            return cached
+        
         try:
             # Recherche OpenFoodFacts
-            off_results = self.openfoodfacts.search_products(query, limit=limit)
+            off_results = self.openfoodfacts.search_products(query, limit=limit, category=category)
             
-            # TODO: Ajouter d'autres sources (base locale, etc.)
+            # La fusion avec les autres sources est faite par app/services/food_search.py
             
             # Trier par score keto et qualité des données
             sorted_results = sorted(
@@ -344,16 +456,34 @@ class FoodSearchService:
                 reverse=True
             )
             
+            # search_products renvoie [] en cas d'erreur réseau : ne pas le mémoriser
+            if sorted_results:
+                with self._cache_lock:
+                    self._search_cache[self._cache_key(query, category)] = (limit, sorted_results)
+            
             return sorted_results[:limit]
             
         except Exception as e:
             logger.error(f"Erreur lors de la recherche d'aliments: {e}")
             return []
     
+    def get_cached_product(self, barcode: str) -> Optional[Dict[str, Any]]:
+        """Fiche produit en cache, sans appel réseau"""
+        with self._cache_lock:
+            return self._product_cache.get(barcode)
+    
     def get_food_by_barcode(self, barcode: str) -> Optional[Dict[str, Any]]:
-        """Récupérer un aliment par code-barres"""
+        """Récupérer la fiche complète d'un aliment par code-barres"""
+        cached = self.get_cached_product(barcode)
+        if cached is not None:
+            return cached
+        
         try:
-            return self.openfoodfacts.get_product_by_barcode(barcode)
+            product = self.openfoodfacts.get_product_by_barcode(barcode)
+            if product:
+                with self._cache_lock:
+                    self._product_cache[barcode] = product
+            return product
         except Exception as e:
             logger.error(f"Erreur lors de la récupération par code-barres: {e}")
             return None
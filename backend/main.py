@@ -5,6 +5,7 @@ Main FastAPI application with modern architecture
 
 from fastapi import FastAPI, HTTPException, UploadFile, File, Depends
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from contextlib import asynccontextmanager
 import logging
 import uvicorn
@@ -18,6 +19,7 @@ from integrations.openfoodfacts import food_search_service
 
 # Import database connection
 from app.database.connection import get_supabase_client
+from app.database.executor import query_timings, run_query, shutdown_executor
 
 # Import authentication dependencies
 from app.auth.dependencies import get_current_user, get_current_user_optional
@@ -28,12 +30,24 @@ from app.api.v1.meals import router as meals_router
 from app.api.v1.preferences import router as preferences_router
 from app.api.v1.foods import router as foods_router
 from app.api.v1.vision import router as vision_router  # ✅ Nouveau router vision
+from app.api.v1.vision import load_food_database_into_matcher
+from app.services.meal_stream import IncrementalMealParser, format_sse
+from app.services.search_history import search_history_writer
+from app.services.email_delivery import email_delivery_queue
+from app.services.autocomplete import autocomplete_service
+from app.services.food_search import federated_food_search
+from app.services.keto_catalogue import keto_catalogue
+from app.services.maintenance import maintenance_service
+from app.services.rate_limit import rate_limiter
+from app.services.reference_foods import reference_foods
+from app.services.scheduler import PeriodicTask
 
 # Legacy imports for meal analysis (will be migrated)
 from emergentintegrations.llm.chat import LlmChat, UserMessage, ImageContent
 import json
 import base64
-from typing import List, Optional
+import asyncio
+from typing import AsyncIterator, Dict, List, Optional, Tuple
 from pydantic import BaseModel
 from dotenv import load_dotenv
 import os
@@ -78,20 +92,8 @@ class WeightEntry(BaseModel):
     weight: float
     date: str
 
-# French food database (keeping for compatibility)
-FRENCH_FOODS_DB = {
-    "pain": {"calories": 265, "proteins": 9, "carbs": 49, "fats": 3.2, "fiber": 2.7},
-    "baguette": {"calories": 274, "proteins": 8.5, "carbs": 55.8, "fats": 1.3, "fiber": 2.3},
-    "fromage": {"calories": 356, "proteins": 25, "carbs": 1.3, "fats": 28, "fiber": 0},
-    "beurre": {"calories": 717, "proteins": 0.85, "carbs": 0.06, "fats": 81, "fiber": 0},
-    "avocat": {"calories": 160, "proteins": 2, "carbs": 9, "fats": 15, "fiber": 7},
-    "saumon": {"calories": 208, "proteins": 25, "carbs": 0, "fats": 12, "fiber": 0},
-    "œuf": {"calories": 155, "proteins": 13, "carbs": 1.1, "fats": 11, "fiber": 0},
-    "épinards": {"calories": 23, "proteins": 2.9, "carbs": 3.6, "fats": 0.4, "fiber": 2.2},
-    "brocoli": {"calories": 34, "proteins": 2.8, "carbs": 7, "fats": 0.4, "fiber": 2.6},
-    "poulet": {"calories": 239, "proteins": 27, "carbs": 0, "fats": 14, "fiber": 0},
-    "huile_olive": {"calories": 884, "proteins": 0, "carbs": 0, "fats": 100, "fiber": 0}
-}
+# Catalogue keto servi avant le premier chargement de food_database
+keto_catalogue.seed(food.to_product() for food in reference_foods)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -101,15 +103,41 @@ async def lifespan(app: FastAPI):
     logger.info(f"Environment: {'Development' if settings.debug else 'Production'}")
     
     # Test Supabase connection
+    matcher_task = None
     try:
         client = get_supabase_client()
         logger.info("✅ Supabase connection established")
+        
+        # Compléter l'index vision avec food_database sans retarder le démarrage
+        matcher_task = asyncio.create_task(asyncio.to_thread(
+            load_food_database_into_matcher, client, settings.food_matcher_max_rows
+        ))
     except Exception as e:
         logger.error(f"❌ Supabase connection failed: {e}")
     
+    await search_history_writer.start()
+    await email_delivery_queue.start()
+    
+    # Tâches de rafraîchissement périodique
+    background_tasks = [
+        PeriodicTask("autocomplete-refresh", settings.autocomplete_refresh_interval_seconds, autocomplete_service.refresh),
+        PeriodicTask("keto-catalogue-refresh", settings.keto_catalogue_refresh_interval_seconds, keto_catalogue.refresh),
+        # Purge des lignes expirées, hors du démarrage
+        PeriodicTask("maintenance-purge", settings.maintenance_interval_seconds, maintenance_service.run, run_immediately=False),
+    ]
+    for task in background_tasks:
+        await task.start()
+    
     yield
     
     # Shutdown
+    for task in background_tasks:
+        await task.stop()
+    await search_history_writer.stop()
+    await email_delivery_queue.stop()
+    shutdown_executor()
+    if matcher_task and not matcher_task.done():
+        matcher_task.cancel()
     logger.info(f"Shutting down {settings.app_name}")
 
 # Create FastAPI application
@@ -138,26 +166,9 @@ app.include_router(foods_router, prefix=settings.api_v1_prefix, tags=["foods"])
 app.include_router(vision_router, prefix=settings.api_v1_prefix, tags=["vision"])  # ✅ Router vision ajouté
 
 # Legacy AI meal analysis function (will be migrated to separate service)
-async def analyze_meal_with_ai(image_base64: str) -> NutritionalInfo:
-    """Analyse un repas avec l'IA et calcule les informations nutritionnelles"""
-    try:
-        # Get Emergent LLM key from environment
-        emergent_llm_key = os.getenv("EMERGENT_LLM_KEY")
-        if not emergent_llm_key:
-            logger.warning("EMERGENT_LLM_KEY not found, using fallback values")
-            raise ValueError("No LLM key available")
-
-        # Initialize LLM chat
-        chat = LlmChat(
-            api_key=emergent_llm_key,
-            session_id=f"meal_analysis_{datetime.now().timestamp()}",
-            system_message="Tu es un expert en nutrition française spécialisé dans le régime cétogène. Analyse les images de repas et fournis des informations nutritionnelles précises en français. Concentre-toi sur les aliments français et les portions typiques."
-        ).with_model("openai", "gpt-4o")
-
-        # Create message with image
-        image_content = ImageContent(image_base64=image_base64)
-        
-        prompt = """Analyse cette image de repas et fournis les informations suivantes en format JSON :
+MEAL_ANALYSIS_SYSTEM_MESSAGE = "Tu es un expert en nutrition française spécialisé dans le régime cétogène. Analyse les images de repas et fournis des informations nutritionnelles précises en français. Concentre-toi sur les aliments français et les portions typiques."
+
+MEAL_ANALYSIS_PROMPT = """Analyse cette image de repas et fournis les informations suivantes en format JSON :
 
 {
   "foods_detected": ["liste des aliments identifiés en français"],
@@ -175,66 +186,128 @@ async def analyze_meal_with_ai(image_base64: str) -> NutritionalInfo:
 
 Sois précis sur les portions et utilise tes connaissances des aliments français. Pour le keto_score : 10 = parfait keto, 1 = incompatible keto."""
 
-        user_message = UserMessage(
-            text=prompt,
-            file_contents=[image_content]
-        )
+def create_meal_analysis_message(image_base64: str) -> Tuple[LlmChat, UserMessage]:
+    """Préparer la conversation IA et le message contenant l'image du repas"""
+    # Get Emergent LLM key from environment
+    emergent_llm_key = os.getenv("EMERGENT_LLM_KEY")
+    if not emergent_llm_key:
+        logger.warning("EMERGENT_LLM_KEY not found, using fallback values")
+        raise ValueError("No LLM key available")
+
+    # Initialize LLM chat
+    chat = LlmChat(
+        api_key=emergent_llm_key,
+        session_id=f"meal_analysis_{datetime.now().timestamp()}",
+        system_message=MEAL_ANALYSIS_SYSTEM_MESSAGE
+    ).with_model("openai", "gpt-4o")
+
+    # Create message with image
+    image_content = ImageContent(image_base64=image_base64)
+
+    user_message = UserMessage(
+        text=MEAL_ANALYSIS_PROMPT,
+        file_contents=[image_content]
+    )
+    return chat, user_message
+
+def parse_ai_response(response: str) -> dict:
+    """Extraire l'objet JSON de la réponse IA (valeurs par défaut si illisible)"""
+    try:
+        json_start = response.find('{')
+        json_end = response.rfind('}') + 1
+        if json_start != -1 and json_end != -1:
+            json_str = response[json_start:json_end]
+            return json.loads(json_str)
+        else:
+            raise ValueError("No JSON found in response")
+    except (json.JSONDecodeError, ValueError):
+        logger.warning("Failed to parse AI response, using fallback values")
+        return {
+            "foods_detected": ["Aliment non identifié"],
+            "portions": ["Portion moyenne"],
+            "total_calories": 300,
+            "total_proteins": 15,
+            "total_carbs": 10,
+            "total_fats": 20,
+            "total_fiber": 3,
+            "net_carbs": 7,
+            "keto_score": 7,
+            "confidence": 0.5
+        }
+
+def build_nutritional_info(nutrition_data: dict) -> NutritionalInfo:
+    """Convertir la réponse IA analysée en NutritionalInfo"""
+    return NutritionalInfo(
+        calories=nutrition_data.get("total_calories", 300),
+        proteins=nutrition_data.get("total_proteins", 15),
+        carbs=nutrition_data.get("total_carbs", 10),
+        net_carbs=nutrition_data.get("net_carbs", 7),
+        fats=nutrition_data.get("total_fats", 20),
+        fiber=nutrition_data.get("total_fiber", 3),
+        keto_score=nutrition_data.get("keto_score", 7),
+        foods_detected=nutrition_data.get("foods_detected", ["Aliment détecté"]),
+        portions=nutrition_data.get("portions", ["Portion moyenne"]),
+        confidence=nutrition_data.get("confidence", 0.8)
+    )
+
+def fallback_nutritional_info() -> NutritionalInfo:
+    """Valeurs retournées quand l'analyse IA est impossible"""
+    return NutritionalInfo(
+        calories=250,
+        proteins=12,
+        carbs=8,
+        net_carbs=5,
+        fats=18,
+        fiber=3,
+        keto_score=6,
+        foods_detected=["Aliment non analysé"],
+        portions=["Portion standard"],
+        confidence=0.5
+    )
+
+async def analyze_meal_with_ai(image_base64: str) -> NutritionalInfo:
+    """Analyse un repas avec l'IA et calcule les informations nutritionnelles"""
+    try:
+        chat, user_message = create_meal_analysis_message(image_base64)
 
         # Send message and get response
         response = await chat.send_message(user_message)
         
         # Parse JSON response
-        try:
-            json_start = response.find('{')
-            json_end = response.rfind('}') + 1
-            if json_start != -1 and json_end != -1:
-                json_str = response[json_start:json_end]
-                nutrition_data = json.loads(json_str)
-            else:
-                raise ValueError("No JSON found in response")
-        except (json.JSONDecodeError, ValueError):
-            logger.warning("Failed to parse AI response, using fallback values")
-            nutrition_data = {
-                "foods_detected": ["Aliment non identifié"],
-                "portions": ["Portion moyenne"],
-                "total_calories": 300,
-                "total_proteins": 15,
-                "total_carbs": 10,
-                "total_fats": 20,
-                "total_fiber": 3,
-                "net_carbs": 7,
-                "keto_score": 7,
-                "confidence": 0.5
-            }
-
-        return NutritionalInfo(
-            calories=nutrition_data.get("total_calories", 300),
-            proteins=nutrition_data.get("total_proteins", 15),
-            carbs=nutrition_data.get("total_carbs", 10),
-            net_carbs=nutrition_data.get("net_carbs", 7),
-            fats=nutrition_data.get("total_fats", 20),
-            fiber=nutrition_data.get("total_fiber", 3),
-            keto_score=nutrition_data.get("keto_score", 7),
-            foods_detected=nutrition_data.get("foods_detected", ["Aliment détecté"]),
-            portions=nutrition_data.get("portions", ["Portion moyenne"]),
-            confidence=nutrition_data.get("confidence", 0.8)
-        )
+        return build_nutritional_info(parse_ai_response(response))
 
     except Exception as e:
         logger.error(f"AI analysis error: {str(e)}")
         # Return fallback values
-        return NutritionalInfo(
-            calories=250,
-            proteins=12,
-            carbs=8,
-            net_carbs=5,
-            fats=18,
-            fiber=3,
-            keto_score=6,
-            foods_detected=["Aliment non analysé"],
-            portions=["Portion standard"],
-            confidence=0.5
-        )
+        return fallback_nutritional_info()
+
+async def meal_analysis_events(analysis_request: MealAnalysis) -> AsyncIterator[str]:
+    """
+    Événements SSE : « started » immédiatement, puis aliments, totaux et résultat final.
+    LlmChat n'expose pas de réponse en flux (send_message renvoie la réponse complète) :
+    les événements détaillés partent dès que cette réponse est reçue, pas pendant la génération.
+    """
+    yield format_sse("started", {"meal_type": analysis_request.meal_type})
+
+    parser = IncrementalMealParser()
+    try:
+        chat, user_message = create_meal_analysis_message(analysis_request.image_base64)
+        response = await chat.send_message(user_message)
+        for event, data in parser.feed(response):
+            yield format_sse(event, data)
+
+        nutrition_data = parser.result() or parse_ai_response(response)
+        nutritional_info = build_nutritional_info(nutrition_data)
+    except Exception as e:
+        logger.error(f"AI streaming analysis error: {str(e)}")
+        nutritional_info = fallback_nutritional_info()
+
+    yield format_sse("complete", {
+        "success": True,
+        "nutritional_info": nutritional_info.dict(),
+        "meal_type": analysis_request.meal_type,
+        "analyzed_at": datetime.now().isoformat()
+    })
 
 # Legacy endpoints for compatibility (will be gradually migrated)
 @app.get("/api/health")
@@ -244,7 +317,7 @@ async def health_check():
         # Test Supabase connection
         client = get_supabase_client()
         # Simple query to test connection
-        result = client.table("users").select("count", count="exact").execute()
+        result = await run_query("users.health_check", client.table("users").select("count", count="exact"))
         supabase_status = "healthy"
     except Exception as e:
         logger.error(f"Supabase health check failed: {e}")
@@ -254,6 +327,10 @@ async def health_check():
         "status": "healthy",
         "service": "KetoSansStress API v2.0",
         "supabase": supabase_status,
+        "supabase_calls": query_timings.snapshot(),
+        "email_queue": email_delivery_queue.stats(),
+        "maintenance": maintenance_service.metrics(),
+        "rate_limit_rejections": rate_limiter.stats(),
         "timestamp": datetime.now().isoformat()
     }
 
@@ -273,19 +350,32 @@ async def analyze_meal(analysis_request: MealAnalysis):
         logger.error(f"Meal analysis error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Erreur lors de l'analyse: {str(e)}")
 
+@app.post("/api/meals/analyze-stream")
+async def analyze_meal_stream(analysis_request: MealAnalysis):
+    """Meal analysis as server-sent events (sent once the full AI response is received)."""
+    return StreamingResponse(
+        meal_analysis_events(analysis_request),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.get("/api/foods/search/{query}")
 async def search_foods(query: str):
     """Search French foods database."""
     try:
-        results = []
-        query_lower = query.lower()
-        
-        for food_name, nutrition in FRENCH_FOODS_DB.items():
-            if query_lower in food_name.lower():
-                results.append({
-                    "name": food_name,
-                    "nutrition": nutrition
-                })
+        results = [
+            {
+                "name": food.name,
+                "nutrition": {
+                    "calories": food.calories,
+                    "proteins": food.protein,
+                    "carbs": food.carbs,
+                    "fats": food.fat,
+                    "fiber": food.fiber
+                }
+            }
+            for food in reference_foods.search(query, limit=len(reference_foods))
+        ]
         
         return {"results": results}
     except Exception as e:
@@ -459,14 +549,14 @@ async def get_weight_history(user_id: str, days: int = 30):
 async def search_foods_advanced(query: str, limit: int = 20):
     """Advanced food search using OpenFoodFacts and local database."""
     try:
-        # Utiliser le service de recherche OpenFoodFacts
-        results = food_search_service.search_foods(query, limit=limit)
+        # Recherche fusionnée (aliments de référence, food_database, OpenFoodFacts)
+        results = await federated_food_search.search(query, limit=limit)
         
         return {
             "query": query,
             "results": results,
             "count": len(results),
-            "source": "openfoodfacts"
+            "source": "federated"
         }
     except Exception as e:
         logger.error(f"Food search error: {str(e)}")
@@ -477,7 +567,7 @@ async def get_food_by_barcode(barcode: str):
     """Get food information by barcode using OpenFoodFacts."""
     try:
         # Rechercher par code-barres
-        result = food_search_service.get_food_by_barcode(barcode)
+        result = await asyncio.to_thread(food_search_service.get_food_by_barcode, barcode)
         
         if result:
             return {
@@ -494,6 +584,45 @@ async def get_food_by_barcode(barcode: str):
         logger.error(f"Barcode search error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Erreur lors de la recherche: {str(e)}")
 
+async def enrich_with_openfoodfacts(foods: List[str], timeout: float) -> Tuple[List[dict], List[str]]:
+    """
+    Rechercher les aliments détectés dans OpenFoodFacts en parallèle.
+
+    Les recherches déjà en cache sont servies sans appel réseau ; les autres
+    partent en même temps et celles qui dépassent `timeout` sont ignorées.
+    Retourne le meilleur résultat par aliment (dans l'ordre de détection)
+    et la liste des aliments dont la recherche n'a pas abouti à temps.
+    """
+    best_matches: Dict[int, dict] = {}
+    pending: Dict[asyncio.Task, int] = {}
+
+    for index, food in enumerate(foods):
+        cached = food_search_service.get_cached_search(food, limit=3)
+        if cached is not None:
+            if cached:
+                best_matches[index] = cached[0]
+            continue
+        task = asyncio.create_task(asyncio.to_thread(food_search_service.search_foods, food, 3))
+        pending[task] = index
+
+    timed_out: List[str] = []
+    if pending:
+        done, not_done = await asyncio.wait(pending.keys(), timeout=timeout)
+        for task in done:
+            try:
+                search_results = task.result()
+            except Exception as e:
+                logger.warning(f"OpenFoodFacts enrichment failed for '{foods[pending[task]]}': {e}")
+                continue
+            if search_results:
+                best_matches[pending[task]] = search_results[0]
+        for task in not_done:
+            # Le thread termine quand même la requête et alimente le cache
+            task.cancel()
+            timed_out.append(foods[pending[task]])
+
+    return [best_matches[index] for index in sorted(best_matches)], timed_out
+
 @app.post("/api/meals/analyze-enhanced")
 async def analyze_meal_enhanced(analysis_request: MealAnalysis):
     """Enhanced meal analysis with OpenFoodFacts integration."""
@@ -501,18 +630,19 @@ async def analyze_meal_enhanced(analysis_request: MealAnalysis):
         # Analyse IA classique
         nutritional_info = await analyze_meal_with_ai(analysis_request.image_base64)
         
-        # Enrichir avec OpenFoodFacts si possible
-        enhanced_results = []
-        for food in nutritional_info.foods_detected:
-            # Rechercher des correspondances dans OpenFoodFacts
-            search_results = food_search_service.search_foods(food, limit=3)
-            if search_results:
-                enhanced_results.extend(search_results[:1])  # Prendre le meilleur résultat
+        # Enrichir avec OpenFoodFacts si possible (meilleur résultat par aliment)
+        enhanced_results, timed_out = await enrich_with_openfoodfacts(
+            nutritional_info.foods_detected,
+            timeout=settings.off_enrichment_timeout_seconds
+        )
+        if timed_out:
+            logger.info(f"OpenFoodFacts enrichment timed out for: {timed_out}")
         
         return {
             "success": True,
             "ai_analysis": nutritional_info.dict(),
             "openfoodfacts_suggestions": enhanced_results,
+            "openfoodfacts_timed_out": timed_out,
             "meal_type": analysis_request.meal_type,
             "analyzed_at": datetime.now().isoformat()
         }
@@ -521,31 +651,18 @@ async def analyze_meal_enhanced(analysis_request: MealAnalysis):
         raise HTTPException(status_code=500, detail=f"Erreur lors de l'analyse: {str(e)}")
 
 @app.get("/api/foods/keto-friendly")
-async def get_keto_friendly_foods(limit: int = 50):
-    """Get a list of keto-friendly foods."""
+async def get_keto_friendly_foods(limit: int = 50, offset: int = 0, category: Optional[str] = None):
+    """Get a page of the precomputed keto-friendly catalogue."""
     try:
-        # Liste de recherches d'aliments keto-friendly
-        keto_searches = [
-            "avocat", "saumon", "huile olive", "fromage", "œuf", "beurre", 
-            "noix", "amandes", "brocoli", "épinards", "chou-fleur", "courgette"
-        ]
-        
-        all_results = []
-        for search_term in keto_searches:
-            results = food_search_service.search_foods(search_term, limit=5)
-            # Filtrer seulement les aliments avec un bon score keto
-            keto_results = [r for r in results if r.get('keto_score') is not None and r.get('keto_score') >= 7]
-            all_results.extend(keto_results)
-            
-            if len(all_results) >= limit:
-                break
-        
-        # Trier par score keto et limiter
-        sorted_results = sorted(all_results, key=lambda x: x.get('keto_score', 0), reverse=True)
+        limit = max(1, min(limit, 200))
+        page = keto_catalogue.page(limit=limit, offset=max(0, offset), category=category)
         
         return {
-            "keto_foods": sorted_results[:limit],
-            "count": len(sorted_results[:limit])
+            "keto_foods": page["items"],
+            "count": len(page["items"]),
+            "total": page["total"],
+            "categories": page["categories"],
+            "refreshed_at": page["refreshed_at"]
         }
     except Exception as e:
         logger.error(f"Keto foods error: {str(e)}")
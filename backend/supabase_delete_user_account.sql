@@ -0,0 +1,95 @@
+-- =====================================================
+-- SUPPRESSION DE COMPTE pour KetoSansStress
+-- Suppression ensembliste de toutes les données d'un utilisateur,
+-- par lots bornés pour ne pas verrouiller longtemps les grosses tables
+-- =====================================================
+
+-- Supprime au plus p_batch_size lignes des tables volumineuses de l'utilisateur.
+-- Quand il n'en reste plus, supprime dans la même transaction les préférences,
+-- le profil (les tables liées à users suivent par ON DELETE CASCADE) et les
+-- demandes de suppression, puis renvoie done = true.
+-- L'API rappelle la fonction tant que done = false ; chaque appel est une
+-- transaction courte, et un appel interrompu peut simplement être relancé.
+CREATE OR REPLACE FUNCTION public.delete_user_account_batch(p_user_id UUID, p_batch_size INTEGER DEFAULT 5000)
+RETURNS JSONB AS $$
+DECLARE
+    remaining INTEGER := p_batch_size;
+    deleted INTEGER;
+    counts JSONB := '{}'::jsonb;
+    table_name TEXT;
+    image_hashes TEXT[];
+BEGIN
+    -- Tables les plus volumineuses d'abord
+    FOREACH table_name IN ARRAY ARRAY['meals', 'search_history', 'weight_entries', 'daily_summaries', 'favorite_foods', 'nutrition_targets']
+    LOOP
+        EXIT WHEN remaining <= 0;
+        CONTINUE WHEN to_regclass('public.' || table_name) IS NULL;
+
+        EXECUTE format(
+            'DELETE FROM public.%I WHERE ctid = ANY (ARRAY(SELECT ctid FROM public.%I WHERE user_id = $1 LIMIT $2))',
+            table_name, table_name
+        ) USING p_user_id, remaining;
+        GET DIAGNOSTICS deleted = ROW_COUNT;
+
+        counts := counts || jsonb_build_object(table_name, deleted);
+        remaining := remaining - deleted;
+    END LOOP;
+
+    -- Analyses d'images : les images partagées (image_blobs) ne sont supprimées
+    -- que si plus aucune analyse ne les référence
+    IF remaining > 0 AND to_regclass('public.image_analysis') IS NOT NULL THEN
+        WITH removed AS (
+            DELETE FROM public.image_analysis
+            WHERE ctid = ANY (ARRAY(
+                SELECT ctid FROM public.image_analysis WHERE user_id = p_user_id LIMIT remaining
+            ))
+            RETURNING image_hash
+        )
+        SELECT COUNT(*), array_agg(DISTINCT image_hash) FILTER (WHERE image_hash IS NOT NULL)
+        INTO deleted, image_hashes
+        FROM removed;
+
+        counts := counts || jsonb_build_object('image_analysis', deleted);
+        remaining := remaining - deleted;
+
+        IF image_hashes IS NOT NULL THEN
+            DELETE FROM public.image_blobs b
+            WHERE b.content_hash = ANY (image_hashes)
+              AND NOT EXISTS (SELECT 1 FROM public.image_analysis a WHERE a.image_hash = b.content_hash);
+            GET DIAGNOSTICS deleted = ROW_COUNT;
+            counts := counts || jsonb_build_object('image_blobs', deleted);
+        END IF;
+    END IF;
+
+    IF remaining <= 0 THEN
+        RETURN jsonb_build_object('done', false, 'deleted', counts);
+    END IF;
+
+    -- Plus de données volumineuses : finir la suppression en une seule transaction
+    IF to_regclass('public.user_preferences') IS NOT NULL THEN
+        DELETE FROM public.user_preferences WHERE user_id = p_user_id;
+        GET DIAGNOSTICS deleted = ROW_COUNT;
+        counts := counts || jsonb_build_object('user_preferences', deleted);
+    END IF;
+
+    DELETE FROM public.users WHERE id = p_user_id;
+    GET DIAGNOSTICS deleted = ROW_COUNT;
+    counts := counts || jsonb_build_object('users', deleted);
+
+    -- user_id est TEXT ou UUID selon la version du schéma
+    IF to_regclass('public.account_deletion_requests') IS NOT NULL THEN
+        DELETE FROM public.account_deletion_requests WHERE user_id::text = p_user_id::text;
+        GET DIAGNOSTICS deleted = ROW_COUNT;
+        counts := counts || jsonb_build_object('account_deletion_requests', deleted);
+    END IF;
+
+    RETURN jsonb_build_object('done', true, 'deleted', counts);
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- Réservée à l'API (client service) : l'identité de l'utilisateur est vérifiée avant l'appel
+REVOKE EXECUTE ON FUNCTION public.delete_user_account_batch(UUID, INTEGER) FROM PUBLIC;
+GRANT EXECUTE ON FUNCTION public.delete_user_account_batch(UUID, INTEGER) TO service_role;
+
+-- Vérification finale
+SELECT '✅ Fonction delete_user_account_batch créée avec succès!' as status;
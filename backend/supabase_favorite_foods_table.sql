@@ -0,0 +1,31 @@
+-- =====================================================
+-- TABLE FAVORITE_FOODS pour KetoSansStress
+-- Aliments épinglés en favoris par l'utilisateur
+-- (les autres favoris sont calculés à partir des repas)
+-- =====================================================
+
+CREATE TABLE IF NOT EXISTS public.favorite_foods (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    user_id UUID NOT NULL REFERENCES public.users(id) ON DELETE CASCADE,
+    food_key TEXT NOT NULL,         -- Nom normalisé de l'aliment
+    food_data JSONB NOT NULL,       -- Aliment au format FoodSearchResult
+    pinned_at TIMESTAMPTZ DEFAULT NOW(),
+    UNIQUE (user_id, food_key)
+);
+
+CREATE INDEX IF NOT EXISTS idx_favorite_foods_user_id ON public.favorite_foods(user_id);
+
+-- Activer Row Level Security (RLS)
+ALTER TABLE public.favorite_foods ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Users can view own favorite foods" ON public.favorite_foods
+    FOR SELECT USING (auth.uid() = user_id);
+
+CREATE POLICY "Users can insert own favorite foods" ON public.favorite_foods
+    FOR INSERT WITH CHECK (auth.uid() = user_id);
+
+CREATE POLICY "Users can update own favorite foods" ON public.favorite_foods
+    FOR UPDATE USING (auth.uid() = user_id);
+
+CREATE POLICY "Users can delete own favorite foods" ON public.favorite_foods
+    FOR DELETE USING (auth.uid() = user_id);
@@ -0,0 +1,45 @@
+-- =====================================================
+-- STOCKAGE COMPACT DES IMAGES D'ANALYSE pour KetoSansStress
+-- Les images sont stockées une seule fois en binaire (bytea),
+-- identifiées par leur empreinte SHA-256 et partagées entre analyses
+-- =====================================================
+
+-- Créer la table image_blobs
+CREATE TABLE IF NOT EXISTS public.image_blobs (
+    content_hash TEXT PRIMARY KEY,  -- SHA-256 (hex) de l'image d'origine
+    data BYTEA NOT NULL,
+    encoding TEXT NOT NULL DEFAULT 'identity' CHECK (encoding IN ('identity', 'zlib')),
+    image_format TEXT,
+    byte_size INTEGER NOT NULL,     -- Taille de l'image d'origine
+    stored_size INTEGER NOT NULL,   -- Taille stockée (après compression éventuelle)
+    created_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+-- Les images (JPEG/PNG) sont déjà compressées : éviter une recompression TOAST inutile
+ALTER TABLE public.image_blobs ALTER COLUMN data SET STORAGE EXTERNAL;
+
+-- Référencer les images depuis image_analysis au lieu de stocker le base64
+ALTER TABLE public.image_analysis ADD COLUMN IF NOT EXISTS image_hash TEXT REFERENCES public.image_blobs(content_hash);
+ALTER TABLE public.image_analysis ALTER COLUMN image_base64 DROP NOT NULL;
+
+CREATE INDEX IF NOT EXISTS idx_image_analysis_image_hash ON public.image_analysis(image_hash);
+
+-- Activer Row Level Security (RLS)
+ALTER TABLE public.image_blobs ENABLE ROW LEVEL SECURITY;
+
+-- Politique RLS : tout utilisateur authentifié peut déposer une image
+CREATE POLICY "Authenticated users can insert image blobs" ON public.image_blobs
+    FOR INSERT TO authenticated WITH CHECK (true);
+
+-- Politique RLS : une image n'est lisible que par les utilisateurs qui l'ont analysée
+CREATE POLICY "Users can view own image blobs" ON public.image_blobs
+    FOR SELECT USING (
+        EXISTS (
+            SELECT 1 FROM public.image_analysis
+            WHERE image_analysis.image_hash = image_blobs.content_hash
+            AND image_analysis.user_id = auth.uid()
+        )
+    );
+
+COMMENT ON TABLE public.image_blobs IS 'Images d''analyse stockées une seule fois en binaire, dédupliquées par empreinte SHA-256';
+COMMENT ON COLUMN public.image_blobs.encoding IS 'identity = octets d''origine, zlib = compressé quand cela réduit la taille';
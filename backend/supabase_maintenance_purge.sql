@@ -0,0 +1,39 @@
+-- =====================================================
+-- PURGE PÉRIODIQUE pour KetoSansStress
+-- Suppression par lots bornés des lignes expirées, appelée par la tâche
+-- de maintenance de l'API (app/services/maintenance.py)
+-- =====================================================
+
+-- Supprime au plus p_batch_size lignes de p_table antérieures à p_before ;
+-- retourne le nombre de lignes supprimées (< p_batch_size : plus rien à purger)
+CREATE OR REPLACE FUNCTION public.purge_rows_batch(p_table TEXT, p_before TIMESTAMPTZ, p_batch_size INTEGER DEFAULT 1000)
+RETURNS INTEGER AS $$
+DECLARE
+    column_name TEXT;
+    deleted INTEGER;
+BEGIN
+    -- Seules ces tables peuvent être purgées, chacune sur sa colonne indexée
+    column_name := CASE p_table
+        WHEN 'account_deletion_requests' THEN 'expires_at'
+        WHEN 'search_history' THEN 'searched_at'
+        WHEN 'rate_limit_buckets' THEN 'updated_at'
+    END;
+    IF column_name IS NULL THEN
+        RAISE EXCEPTION 'Table % cannot be purged', p_table;
+    END IF;
+
+    EXECUTE format(
+        'DELETE FROM public.%I WHERE ctid = ANY (ARRAY(SELECT ctid FROM public.%I WHERE %I < $1 LIMIT $2))',
+        p_table, p_table, column_name
+    ) USING p_before, p_batch_size;
+    GET DIAGNOSTICS deleted = ROW_COUNT;
+    RETURN deleted;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- Réservée à l'API (client service)
+REVOKE EXECUTE ON FUNCTION public.purge_rows_batch(TEXT, TIMESTAMPTZ, INTEGER) FROM PUBLIC;
+GRANT EXECUTE ON FUNCTION public.purge_rows_batch(TEXT, TIMESTAMPTZ, INTEGER) TO service_role;
+
+-- Vérification finale
+SELECT '✅ Fonction purge_rows_batch créée avec succès!' as status;
@@ -0,0 +1,36 @@
+-- =====================================================
+-- RECHERCHES POPULAIRES pour KetoSansStress
+-- Agrégation côté base de search_history pour l'autocomplétion publique :
+-- une recherche n'est proposée que si assez d'utilisateurs DISTINCTS l'ont faite
+-- =====================================================
+
+CREATE EXTENSION IF NOT EXISTS unaccent;
+
+-- Même normalisation que fold_food_name (app/services/food_matcher.py) :
+-- minuscules, sans accents ni ligatures, ponctuation retirée
+CREATE OR REPLACE FUNCTION public.fold_search_query(p_query TEXT)
+RETURNS TEXT AS $$
+    SELECT btrim(regexp_replace(lower(public.unaccent(p_query)), '[^a-z0-9]+', ' ', 'g'));
+$$ LANGUAGE sql STABLE;
+
+-- p_min_users : seuil de confidentialité ; une recherche faite par un seul
+-- utilisateur, même répétée, n'est jamais renvoyée
+CREATE OR REPLACE FUNCTION public.popular_searches(p_since TIMESTAMPTZ, p_min_users INTEGER DEFAULT 3, p_limit INTEGER DEFAULT 5000)
+RETURNS TABLE (query_key TEXT, user_count BIGINT, search_count BIGINT) AS $$
+    SELECT public.fold_search_query(query) AS query_key,
+           COUNT(DISTINCT user_id) AS user_count,
+           COUNT(*) AS search_count
+    FROM public.search_history
+    WHERE searched_at >= p_since
+    GROUP BY 1
+    HAVING public.fold_search_query(query) <> '' AND COUNT(DISTINCT user_id) >= p_min_users
+    ORDER BY user_count DESC, search_count DESC
+    LIMIT p_limit;
+$$ LANGUAGE sql STABLE SECURITY DEFINER SET search_path = public;
+
+-- Réservée à l'API (client service)
+REVOKE EXECUTE ON FUNCTION public.popular_searches(TIMESTAMPTZ, INTEGER, INTEGER) FROM PUBLIC;
+GRANT EXECUTE ON FUNCTION public.popular_searches(TIMESTAMPTZ, INTEGER, INTEGER) TO service_role;
+
+-- Vérification finale
+SELECT '✅ Fonction popular_searches créée avec succès!' as status;
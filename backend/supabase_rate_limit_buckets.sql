@@ -0,0 +1,79 @@
+-- =====================================================
+-- LIMITATION DE DÉBIT PARTAGÉE pour KetoSansStress
+-- Seaux à jetons communs à toutes les instances de l'API
+-- (utilisés quand RATE_LIMIT_BACKEND=supabase)
+-- =====================================================
+
+-- UNLOGGED : données jetables, pas d'écriture dans le WAL à chaque requête
+CREATE UNLOGGED TABLE IF NOT EXISTS public.rate_limit_buckets (
+    key TEXT PRIMARY KEY,  -- portée:ip:adresse ou portée:email:empreinte
+    tokens DOUBLE PRECISION NOT NULL,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+-- Purge des seaux inactifs (tâche de maintenance)
+CREATE INDEX IF NOT EXISTS idx_rate_limit_buckets_updated_at
+ON public.rate_limit_buckets(updated_at);
+
+-- Activer Row Level Security (RLS) : table réservée à l'API (rôle service)
+ALTER TABLE public.rate_limit_buckets ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Service role can manage rate limit buckets"
+ON public.rate_limit_buckets
+FOR ALL
+TO service_role
+USING (true)
+WITH CHECK (true);
+
+GRANT ALL ON public.rate_limit_buckets TO service_role;
+
+-- Ancienne signature (un seul seau par appel)
+DROP FUNCTION IF EXISTS public.consume_rate_limit(TEXT, DOUBLE PRECISION, DOUBLE PRECISION, DOUBLE PRECISION);
+
+-- Prendre p_cost jetons dans chacun des seaux p_keys (p_capacities[i] jetons,
+-- rechargé en p_periods[i] secondes) ; retourne 0 si accepté, sinon le délai
+-- d'attente en secondes. Tout ou rien : un refus ne consomme aucun seau.
+-- Les lignes sont verrouillées dans l'ordre des clés entre la recharge et le
+-- retrait : appels simultanés sûrs, sans interblocage.
+CREATE OR REPLACE FUNCTION public.consume_rate_limit(
+    p_keys TEXT[],
+    p_capacities DOUBLE PRECISION[],
+    p_periods DOUBLE PRECISION[],
+    p_cost DOUBLE PRECISION DEFAULT 1
+)
+RETURNS DOUBLE PRECISION AS $$
+DECLARE
+    i INTEGER;
+    rate DOUBLE PRECISION;
+    available DOUBLE PRECISION;
+    wait DOUBLE PRECISION := 0;
+BEGIN
+    FOR i IN SELECT idx FROM generate_subscripts(p_keys, 1) AS idx ORDER BY p_keys[idx]
+    LOOP
+        rate := p_capacities[i] / p_periods[i];
+        INSERT INTO public.rate_limit_buckets AS b (key, tokens, updated_at)
+        VALUES (p_keys[i], p_capacities[i], clock_timestamp())
+        ON CONFLICT (key) DO UPDATE
+            SET tokens = LEAST(p_capacities[i], b.tokens + EXTRACT(EPOCH FROM clock_timestamp() - b.updated_at) * rate),
+                updated_at = clock_timestamp()
+        RETURNING tokens INTO available;
+
+        IF available < p_cost THEN
+            wait := GREATEST(wait, (p_cost - available) / rate);
+        END IF;
+    END LOOP;
+
+    IF wait > 0 THEN
+        RETURN wait;
+    END IF;
+
+    UPDATE public.rate_limit_buckets SET tokens = tokens - p_cost WHERE key = ANY (p_keys);
+    RETURN 0;
+END;
+$$ LANGUAGE plpgsql SECURITY INVOKER;
+
+REVOKE EXECUTE ON FUNCTION public.consume_rate_limit(TEXT[], DOUBLE PRECISION[], DOUBLE PRECISION[], DOUBLE PRECISION) FROM PUBLIC;
+GRANT EXECUTE ON FUNCTION public.consume_rate_limit(TEXT[], DOUBLE PRECISION[], DOUBLE PRECISION[], DOUBLE PRECISION) TO service_role;
+
+-- Vérification finale
+SELECT '✅ Table rate_limit_buckets créée avec succès!' as status;
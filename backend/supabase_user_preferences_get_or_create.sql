@@ -0,0 +1,73 @@
+-- =====================================================
+-- GET OR CREATE USER_PREFERENCES pour KetoSansStress
+-- Lecture des préférences avec création des valeurs par défaut
+-- en un seul aller-retour, sans conflit entre chargements simultanés
+-- =====================================================
+
+-- p_defaults : préférences par défaut calculées par l'API (selon la région)
+CREATE OR REPLACE FUNCTION public.get_or_create_user_preferences(p_user_id UUID, p_defaults JSONB)
+RETURNS public.user_preferences AS $$
+DECLARE
+    result public.user_preferences;
+BEGIN
+    INSERT INTO public.user_preferences (
+        user_id,
+        count_net_carbs,
+        region,
+        unit_system,
+        dark_mode,
+        theme_preference,
+        health_sync_enabled,
+        health_sync_permissions,
+        notifications_enabled,
+        auto_sync,
+        data_saver_mode,
+        biometric_lock,
+        language,
+        timezone,
+        date_format,
+        time_format,
+        weight_unit,
+        height_unit,
+        liquid_unit,
+        temperature_unit
+    )
+    SELECT
+        p_user_id,
+        COALESCE(d.count_net_carbs, true),
+        COALESCE(d.region, 'FR'),
+        COALESCE(d.unit_system, 'metric'),
+        COALESCE(d.dark_mode, false),
+        COALESCE(d.theme_preference, 'system'),
+        COALESCE(d.health_sync_enabled, false),
+        COALESCE(d.health_sync_permissions, '{}'::jsonb),
+        COALESCE(d.notifications_enabled, true),
+        COALESCE(d.auto_sync, true),
+        COALESCE(d.data_saver_mode, false),
+        COALESCE(d.biometric_lock, false),
+        COALESCE(d.language, 'fr'),
+        COALESCE(d.timezone, 'Europe/Paris'),
+        COALESCE(d.date_format, 'DD/MM/YYYY'),
+        COALESCE(d.time_format, '24h'),
+        COALESCE(d.weight_unit, 'kg'),
+        COALESCE(d.height_unit, 'cm'),
+        COALESCE(d.liquid_unit, 'ml'),
+        COALESCE(d.temperature_unit, 'celsius')
+    FROM jsonb_populate_record(NULL::public.user_preferences, p_defaults) AS d
+    ON CONFLICT (user_id) DO NOTHING
+    RETURNING * INTO result;
+
+    -- Préférences déjà existantes (ou créées par un appel concurrent)
+    IF result.id IS NULL THEN
+        SELECT * INTO result FROM public.user_preferences WHERE user_id = p_user_id;
+    END IF;
+
+    RETURN result;
+END;
+$$ LANGUAGE plpgsql SECURITY INVOKER;
+
+-- Exécutable par les utilisateurs connectés (les politiques RLS s'appliquent)
+GRANT EXECUTE ON FUNCTION public.get_or_create_user_preferences(UUID, JSONB) TO authenticated;
+
+-- Vérification finale
+SELECT '✅ Fonction get_or_create_user_preferences créée avec succès!' as status;
@@ -0,0 +1,10 @@
+"""
+Configuration des tests
+Settings est construit à l'import de app.config : des valeurs factices
+suffisent, aucun test n'appelle Supabase.
+"""
+
+import os
+
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_ANON_KEY", "test-anon-key")
@@ -0,0 +1,135 @@
+"""Tests de la suppression de compte (service et routes)"""
+
+import asyncio
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.v1 import auth
+from app.auth.dependencies import get_current_user
+from app.database.connection import get_supabase_client
+from app.services import account_deletion
+from app.services.preferences_cache import preferences_cache
+
+USER_ID = "5b7c1a9e-0000-4000-8000-000000000001"
+
+
+class FakeQuery:
+    def __init__(self, client, operation, **details):
+        self.client = client
+        self.operation = operation
+        self.details = details
+
+    def select(self, *args, **kwargs):
+        return FakeQuery(self.client, "select", **self.details)
+
+    def delete(self):
+        return FakeQuery(self.client, "delete", **self.details)
+
+    def eq(self, column, value):
+        return FakeQuery(self.client, self.operation, **{**self.details, column: value})
+
+    def execute(self):
+        self.client.executed.append((self.operation, self.details))
+        if self.operation == "rpc":
+            return SimpleNamespace(data=self.client.batches.pop(0))
+        if self.operation == "select":
+            return SimpleNamespace(data=self.client.rows)
+        return SimpleNamespace(data=[])
+
+
+class FakeSupabase:
+    """Client Supabase minimal : appels RPC et requêtes enregistrés"""
+
+    def __init__(self, batches=(), rows=()):
+        self.batches = list(batches)
+        self.rows = list(rows)
+        self.executed = []
+
+    def rpc(self, name, params):
+        return FakeQuery(self, "rpc", name=name, **params)
+
+    def table(self, name):
+        return FakeQuery(self, "table", table=name)
+
+
+@pytest.fixture
+def admin(monkeypatch):
+    def install(batches):
+        client = FakeSupabase(batches=batches)
+        monkeypatch.setattr(account_deletion, "_client", client)
+        return client
+    return install
+
+
+def test_batches_are_summed_until_done_and_caches_cleared(admin):
+    client = admin([
+        {"done": False, "deleted": {"meals": 5000}},
+        {"done": True, "deleted": {"meals": 12, "users": 1}},
+    ])
+    preferences_cache.put(USER_ID, {"units": "metric"})
+
+    totals = asyncio.run(account_deletion.delete_user_account(USER_ID, batch_size=5000))
+
+    assert totals == {"meals": 5012, "users": 1}
+    assert [details["p_user_id"] for _, details in client.executed] == [USER_ID, USER_ID]
+    assert preferences_cache.get(USER_ID) is None
+
+
+def test_unfinished_deletion_raises(admin, monkeypatch):
+    monkeypatch.setattr(account_deletion, "MAX_BATCHES", 2)
+    admin([{"done": False, "deleted": {"meals": 1}}] * 2)
+    with pytest.raises(RuntimeError):
+        asyncio.run(account_deletion.delete_user_account(USER_ID))
+
+
+@pytest.fixture
+def api(monkeypatch):
+    sent = []
+    monkeypatch.setattr(auth, "send_email", lambda to, subject, html: sent.append((to, subject)))
+    user_client = FakeSupabase()
+
+    app = FastAPI()
+    app.include_router(auth.router, prefix="/api")
+    app.dependency_overrides[get_current_user] = lambda: SimpleNamespace(
+        id=USER_ID, email="user@example.com", full_name="Test"
+    )
+    app.dependency_overrides[get_supabase_client] = lambda: user_client
+    return SimpleNamespace(client=TestClient(app), sent=sent, supabase=user_client)
+
+
+def test_direct_deletion_endpoint_deletes_and_sends_the_email(api, admin):
+    rpc = admin([{"done": True, "deleted": {"users": 1}}])
+
+    response = api.client.post("/api/auth/delete-account-direct", json={"email": "user@example.com"})
+
+    assert response.status_code == 200, response.text
+    assert rpc.executed[0][1]["name"] == "delete_user_account_batch"
+    assert rpc.executed[0][1]["p_user_id"] == USER_ID
+    assert api.sent == [("user@example.com", "KetoSansStress - Votre compte a été supprimé")]
+
+
+def test_confirmed_deletion_endpoint_deletes_the_account(api, admin):
+    rpc = admin([{"done": True, "deleted": {"users": 1, "account_deletion_requests": 1}}])
+    api.supabase.rows = [{
+        "user_id": USER_ID,
+        "email": "user@example.com",
+        "expires_at": (datetime.utcnow() + timedelta(hours=1)).isoformat(),
+    }]
+
+    response = api.client.post("/api/auth/confirm-account-deletion", json={"token": "abc"})
+
+    assert response.status_code == 200, response.text
+    assert rpc.executed[0][1]["p_user_id"] == USER_ID
+
+
+def test_failed_deletion_returns_500(api, admin):
+    admin([])  # aucun lot : l'appel RPC échoue
+
+    response = api.client.post("/api/auth/delete-account-direct", json={"email": "user@example.com"})
+
+    assert response.status_code == 500
+    assert api.sent == []
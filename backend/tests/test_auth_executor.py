@@ -0,0 +1,37 @@
+"""Tests des appels Supabase Auth exécutés hors de la boucle d'événements"""
+
+import asyncio
+import threading
+
+from app.database import executor
+from app.database.connection import create_auth_client
+
+
+def test_each_auth_client_has_its_own_session():
+    first, second = create_auth_client(), create_auth_client()
+
+    assert first is not second
+    assert first._http_client is second._http_client
+    assert first.get_session() is None
+    assert second.get_session() is None
+
+
+def test_concurrent_auth_calls_run_in_parallel_on_distinct_clients(monkeypatch):
+    monkeypatch.setattr(executor, "create_auth_client", lambda: object())
+    # Les deux appels doivent être en cours en même temps pour franchir la barrière
+    barrier = threading.Barrier(2, timeout=5)
+
+    def operation(auth):
+        barrier.wait()
+        return auth
+
+    async def scenario():
+        return await asyncio.gather(
+            executor.run_auth("auth.test", operation),
+            executor.run_auth("auth.test", operation),
+        )
+
+    first, second = asyncio.run(scenario())
+
+    assert first is not second
+    assert executor.query_timings.snapshot()["auth.test"]["errors"] == 0
@@ -0,0 +1,70 @@
+"""Tests de l'index de préfixes de l'autocomplétion"""
+
+from app.services.autocomplete import PrefixIndex, Suggestion
+
+
+def labels(suggestions):
+    return [suggestion.label for suggestion in suggestions]
+
+
+def build_index():
+    return PrefixIndex([
+        Suggestion("Saumon fumé", popularity=5, keto_score=9),
+        Suggestion("Saumon", popularity=20, keto_score=9),
+        Suggestion("Sauce tomate", popularity=1, keto_score=4),
+        Suggestion("Truite fumée", popularity=50, keto_score=9),
+        Suggestion("Œuf dur", popularity=0, keto_score=10),
+    ])
+
+
+def test_prefix_of_the_name_accents_and_case_ignored():
+    index = build_index()
+    assert labels(index.search("SAU")) == ["Saumon", "Saumon fumé", "Sauce tomate"]
+    assert labels(index.search("oeuf")) == ["Œuf dur"]
+
+
+def test_prefix_of_an_inner_word():
+    assert labels(build_index().search("fum")) == ["Truite fumée", "Saumon fumé"]
+
+
+def test_name_start_ranks_before_inner_word():
+    index = PrefixIndex([
+        Suggestion("Jambon cru", popularity=100),
+        Suggestion("Crevettes", popularity=1),
+    ])
+    assert labels(index.search("cr")) == ["Crevettes", "Jambon cru"]
+
+
+def test_limit_and_empty_prefix():
+    index = build_index()
+    assert labels(index.search("sau", limit=1)) == ["Saumon"]
+    assert index.search("") == []
+    assert index.search("xyz") == []
+
+
+def test_each_suggestion_once():
+    index = PrefixIndex([Suggestion("Fromage frais")])
+    assert labels(index.search("fr")) == ["Fromage frais"]
+
+
+def test_get_by_name():
+    index = build_index()
+    assert index.get("saumon fume").label == "Saumon fumé"
+    assert index.get("inconnu") is None
+    assert len(index) == 5
+
+
+def test_popular_entry_beyond_the_first_keys_is_ranked():
+    # 600 noms « sa… » classés avant « Saumon » par ordre alphabétique
+    suggestions = [Suggestion(f"Sab {number:03d}") for number in range(600)]
+    suggestions.append(Suggestion("Saumon", popularity=100))
+    index = PrefixIndex(suggestions)
+
+    assert labels(index.search("sa", limit=1)) == ["Saumon"]
+    assert labels(index.search("sau", limit=1)) == ["Saumon"]
+
+
+def test_short_prefix_ranking_respects_the_limit():
+    index = build_index()
+    assert labels(index.search("s", limit=2)) == ["Saumon", "Saumon fumé"]
+    assert labels(index.search("s", limit=3)) == ["Saumon", "Saumon fumé", "Sauce tomate"]
@@ -0,0 +1,153 @@
+"""Tests du disjoncteur et des requêtes doublées"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from integrations import circuit_breaker
+from integrations.circuit_breaker import CircuitBreaker, hedged_call
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(circuit_breaker.time, "monotonic", fake)
+    return fake
+
+
+def test_opens_when_the_failure_rate_is_reached(clock):
+    breaker = CircuitBreaker("test", failure_rate_threshold=0.5, window_size=4, min_calls=4, reset_timeout=30)
+    for success in (True, False, True):
+        breaker.record(0.1, success)
+    assert breaker.state == CircuitBreaker.CLOSED
+
+    breaker.record(0.1, False)
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+
+def test_slow_calls_count_as_failures(clock):
+    breaker = CircuitBreaker("test", slow_call_seconds=1.0, window_size=2, min_calls=2)
+    breaker.record(2.0, True)
+    breaker.record(2.0, True)
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_half_open_allows_a_single_probe(clock):
+    breaker = CircuitBreaker("test", window_size=1, min_calls=1, reset_timeout=30)
+    breaker.record(0.1, False)
+
+    clock.now += 29
+    assert not breaker.allow()
+
+    clock.now += 1
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow()
+    # Appel d'essai en cours : les autres sont refusés
+    assert not breaker.allow()
+
+    breaker.record(0.1, True)
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow()
+
+
+def test_failed_probe_reopens(clock):
+    breaker = CircuitBreaker("test", window_size=1, min_calls=1, reset_timeout=30)
+    breaker.record(0.1, False)
+    clock.now += 30
+    assert breaker.allow()
+
+    breaker.record(0.1, False)
+    assert breaker.state == CircuitBreaker.OPEN
+    clock.now += 10
+    assert not breaker.allow()
+
+
+def test_fast_primary_is_not_hedged():
+    calls = []
+
+    def func():
+        calls.append(1)
+        return "primary"
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        assert hedged_call(executor, func, delay=1.0) == "primary"
+    assert len(calls) == 1
+
+
+def test_hedge_wins_when_the_primary_is_slow():
+    release_primary = threading.Event()
+    calls = []
+    lock = threading.Lock()
+
+    def func():
+        with lock:
+            calls.append(1)
+            attempt = len(calls)
+        if attempt == 1:
+            # Premier appel bloqué : seul le doublon peut répondre
+            release_primary.wait(5)
+            return "primary"
+        return "hedge"
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        started = time.monotonic()
+        result = hedged_call(executor, func, delay=0.05)
+        elapsed = time.monotonic() - started
+        release_primary.set()
+
+    assert result == "hedge"
+    assert elapsed < 1.0
+    assert len(calls) == 2
+
+
+def test_hedge_result_is_used_when_the_primary_fails():
+    calls = []
+    lock = threading.Lock()
+
+    def func():
+        with lock:
+            calls.append(1)
+            attempt = len(calls)
+        if attempt == 1:
+            time.sleep(0.2)
+            raise TimeoutError("primary timed out")
+        time.sleep(0.5)
+        return "hedge"
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        assert hedged_call(executor, func, delay=0.05) == "hedge"
+    assert len(calls) == 2
+
+
+def test_error_is_raised_when_both_attempts_fail():
+    def func():
+        time.sleep(0.1)
+        raise TimeoutError("timed out")
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        with pytest.raises(TimeoutError):
+            hedged_call(executor, func, delay=0.01)
+
+
+def test_primary_error_is_raised_without_hedge():
+    calls = []
+
+    def func():
+        calls.append(1)
+        raise ValueError("boom")
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        with pytest.raises(ValueError):
+            hedged_call(executor, func, delay=1.0)
+    assert len(calls) == 1
@@ -0,0 +1,57 @@
+"""Tests de la confirmation d'email par lien"""
+
+from types import SimpleNamespace
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.v1 import auth
+from app.database import executor
+
+
+class FakeAuthClient:
+    """Client Supabase Auth : le token est recherché par Supabase, pas parmi les utilisateurs"""
+
+    def __init__(self, user=None, error=None):
+        self.user = user
+        self.error = error
+        self.verified = []
+
+    def verify_otp(self, params):
+        self.verified.append(params)
+        if self.error:
+            raise self.error
+        return SimpleNamespace(user=self.user)
+
+
+@pytest.fixture
+def api():
+    app = FastAPI()
+    app.include_router(auth.router, prefix="/api")
+    return TestClient(app)
+
+
+def use_auth_client(monkeypatch, client):
+    monkeypatch.setattr(executor, "create_auth_client", lambda: client)
+
+
+def test_valid_token_is_verified_by_key(api, monkeypatch):
+    user = SimpleNamespace(email="marie@example.com", user_metadata={"first_name": "Marie"})
+    client = FakeAuthClient(user=user)
+    use_auth_client(monkeypatch, client)
+
+    response = api.get("/api/auth/confirm-email", params={"token": "abc123"})
+
+    assert response.status_code == 200
+    assert "Marie" in response.text
+    assert client.verified == [{"token": "abc123", "type": "signup"}]
+
+
+def test_unknown_token_shows_the_error_page(api, monkeypatch):
+    use_auth_client(monkeypatch, FakeAuthClient(error=RuntimeError("Token has expired or is invalid")))
+
+    response = api.get("/api/auth/confirm-email", params={"token": "expired"})
+
+    assert response.status_code == 400
+    assert "expiré" in response.text
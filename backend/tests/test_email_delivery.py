@@ -0,0 +1,154 @@
+"""Tests de la file d'envoi des emails transactionnels"""
+
+import asyncio
+import smtplib
+
+from app.services.email_delivery import EmailDeliveryQueue, SMTPTransport, build_message
+
+
+def message(to="user@example.com"):
+    return build_message(to, "Bienvenue", "<p>Bonjour<br>Merci</p>", "noreply@ketosansstress.fr")
+
+
+class FakeTransport:
+    """Erreurs programmées par destinataire, dans l'ordre des tentatives"""
+
+    def __init__(self, failures=None):
+        self.failures = {to: list(errors) for to, errors in (failures or {}).items()}
+        self.batches = []
+        self.closed = False
+
+    def send_batch(self, messages):
+        self.batches.append([item["To"] for item in messages])
+        errors = {}
+        for index, item in enumerate(messages):
+            pending = self.failures.get(item["To"])
+            if pending:
+                errors[index] = pending.pop(0)
+        return errors
+
+    def close(self):
+        self.closed = True
+
+
+async def wait_for(condition, timeout=2.0):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not condition():
+        assert loop.time() < deadline, "condition not reached"
+        await asyncio.sleep(0.01)
+
+
+def test_message_has_text_and_html_parts():
+    email = message()
+    assert email.get_body(("plain",)).get_content().strip() == "Bonjour\nMerci"
+    assert "<p>Bonjour" in email.get_body(("html",)).get_content()
+
+
+def test_queued_emails_are_sent_in_batches():
+    transport = FakeTransport()
+    queue = EmailDeliveryQueue(transport, batch_size=10, workers=1)
+
+    async def scenario():
+        for index in range(3):
+            queue.enqueue(message(f"user{index}@example.com"))
+        await queue.start()
+        await wait_for(lambda: queue.stats()["sent"] == 3)
+        await queue.stop()
+
+    asyncio.run(scenario())
+    assert transport.batches == [["user0@example.com", "user1@example.com", "user2@example.com"]]
+    assert transport.closed
+
+
+def test_temporary_failure_is_retried_with_backoff():
+    transport = FakeTransport({"user@example.com": [smtplib.SMTPServerDisconnected("lost")]})
+    queue = EmailDeliveryQueue(transport, workers=1, retry_base_delay=0.01)
+
+    async def scenario():
+        await queue.start()
+        queue.enqueue(message())
+        await wait_for(lambda: queue.stats()["sent"] == 1)
+        await queue.stop()
+
+    asyncio.run(scenario())
+    assert queue.stats()["retried"] == 1
+    assert queue.stats()["failed"] == 0
+    assert len(transport.batches) == 2
+
+
+def test_permanent_failure_is_not_retried():
+    refused = smtplib.SMTPRecipientsRefused({"bad@example.com": (550, b"unknown user")})
+    transport = FakeTransport({"bad@example.com": [refused]})
+    queue = EmailDeliveryQueue(transport, workers=1, retry_base_delay=0.01)
+
+    async def scenario():
+        await queue.start()
+        queue.enqueue(message("bad@example.com"))
+        await wait_for(lambda: queue.stats()["failed"] == 1)
+        await queue.stop()
+
+    asyncio.run(scenario())
+    assert queue.stats()["retried"] == 0
+    assert len(transport.batches) == 1
+
+
+def test_stop_sends_pending_and_scheduled_retries():
+    transport = FakeTransport({"user@example.com": [smtplib.SMTPServerDisconnected("lost")]})
+    queue = EmailDeliveryQueue(transport, workers=1, retry_base_delay=60)
+
+    async def scenario():
+        await queue.start()
+        queue.enqueue(message())
+        await wait_for(lambda: queue.stats()["scheduled_retries"] == 1)
+        queue.enqueue(message("other@example.com"))
+        await queue.stop()
+
+    asyncio.run(scenario())
+    assert queue.stats()["sent"] == 2
+    assert queue.stats()["scheduled_retries"] == 0
+
+
+def test_full_queue_drops_the_email():
+    queue = EmailDeliveryQueue(FakeTransport(), max_pending=1)
+    assert queue.enqueue(message())
+    assert not queue.enqueue(message())
+    assert queue.stats()["dropped"] == 1
+
+
+class FakeConnection:
+    def __init__(self, drop_after=None):
+        self.sent = []
+        self.drop_after = drop_after
+
+    def send_message(self, email):
+        if self.drop_after is not None and len(self.sent) >= self.drop_after:
+            raise smtplib.SMTPServerDisconnected("connection closed")
+        self.sent.append(email["To"])
+
+    def noop(self):
+        return (250, b"OK")
+
+    def quit(self):
+        pass
+
+
+def test_smtp_connection_is_reused_and_reconnected_once():
+    transport = SMTPTransport("smtp.example.com")
+    connections = [FakeConnection(drop_after=1), FakeConnection()]
+    opened = []
+
+    def connect():
+        opened.append(connections.pop(0))
+        return opened[-1]
+
+    transport._connect = connect
+
+    errors = transport.send_batch([message("a@example.com"), message("b@example.com")])
+    assert errors == {}
+    assert [connection.sent for connection in opened] == [["a@example.com"], ["b@example.com"]]
+
+    # Connexion rendue au pool : le lot suivant ne se reconnecte pas
+    assert transport.send_batch([message("c@example.com")]) == {}
+    assert len(opened) == 2
+    assert opened[1].sent == ["b@example.com", "c@example.com"]
@@ -0,0 +1,38 @@
+"""Tests des templates d'email précompilés"""
+
+from app.services import email_service as email_module
+from app.services.email_service import email_service
+
+
+def test_templates_are_compiled_once_at_startup():
+    # Tous les templates sont déjà dans le cache de l'environnement
+    for name in ("account-deleted.html", "account-deletion-request.html", "error-page.html"):
+        assert email_service.env.get_template(name) is email_service.env.get_template(name)
+    assert email_service.env.cache is not None
+    assert len(email_service.env.cache) >= len(email_service.env.list_templates(extensions=["html"]))
+
+
+def test_static_fragments_are_rendered_once_and_shared():
+    header = email_service.env.globals["fragments"]["email_header"]
+    assert str(header).strip()
+
+    request = email_service.render_account_deletion_request_email(
+        "Marie Curie", "marie@example.com", "https://ketosansstress.app/confirm?token=abc", expires_in_hours=12
+    )
+    deleted = email_service.render_account_deleted_email("Marie Curie", "marie@example.com")
+
+    assert str(header) in request and str(header) in deleted
+    assert "https://ketosansstress.app/confirm?token=abc" in request
+    assert "expirera dans 12 heures" in request
+
+
+def test_variables_are_escaped():
+    html = email_module.render_error_page("<script>alert(1)</script>")
+    assert "<script>alert(1)</script>" not in html
+    assert "&lt;script&gt;" in html
+
+
+def test_confirmation_email_contains_the_link():
+    html = email_module.render_confirmation_email("Marie", "token-123")
+    assert email_service.get_confirmation_link("token-123") in html
+    assert "Marie" in html
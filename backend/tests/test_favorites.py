@@ -0,0 +1,78 @@
+"""Tests des aliments favoris (fréquence, récence et épinglage)"""
+
+import asyncio
+
+import pytest
+
+from app.services.favorites import FavoritesService, UserFavorites, food_from_meal
+
+
+def meal(name, consumed_at, quantity=200, unit="g", calories=400):
+    return {"food_name": name, "quantity": quantity, "unit": unit, "calories": calories, "consumed_at": consumed_at}
+
+
+def names(foods):
+    return [food["name"] for food in foods]
+
+
+def test_meal_values_are_brought_back_to_100_g():
+    food = food_from_meal(meal("Saumon", "2025-03-01T12:00:00", quantity=0.2, unit="kg", calories=400))
+    assert food["calories_per_100g"] == 200
+    assert food["source"] == "history"
+
+
+def test_portion_without_reference_food_is_not_a_favorite():
+    assert food_from_meal(meal("Plat maison", "2025-03-01T12:00:00", quantity=1, unit="portion")) is None
+
+
+def test_recent_meals_outweigh_older_repeated_ones():
+    favorites = UserFavorites()
+    for day in ("01", "02", "03"):
+        favorites.record(food_from_meal(meal("Pain", f"2025-01-{day}T12:00:00")), f"2025-01-{day}T12:00:00")
+    # Deux mois plus tard, un seul repas compte plus que trois anciens
+    favorites.record(food_from_meal(meal("Avocat", "2025-03-15T12:00:00")), "2025-03-15T12:00:00")
+
+    assert names(favorites.top(2)) == ["Avocat", "Pain"]
+
+
+def test_pins_come_first_and_tracked_foods_are_bounded():
+    favorites = UserFavorites(max_tracked=2)
+    for name, day in (("Pain", "01"), ("Oeuf", "02"), ("Avocat", "03")):
+        favorites.record(food_from_meal(meal(name, f"2025-01-{day}T12:00:00")), f"2025-01-{day}T12:00:00")
+    favorites.pin({"name": "Beurre"})
+
+    assert names(favorites.top(5)) == ["Beurre", "Avocat", "Oeuf"]
+
+    favorites.unpin("beurre")
+    assert names(favorites.top(5)) == ["Avocat", "Oeuf"]
+
+
+@pytest.fixture
+def service(monkeypatch):
+    service = FavoritesService()
+    loads = []
+
+    def load_meals(user_id):
+        loads.append(user_id)
+        return [meal("Saumon", "2025-03-01T12:00:00")]
+
+    monkeypatch.setattr(service, "_load_meals", load_meals)
+    monkeypatch.setattr(service, "_load_pins", lambda user_id: [])
+    service.loads = loads
+    return service
+
+
+def test_history_is_loaded_once_then_updated_in_memory(service):
+    assert names(asyncio.run(service.favorites("u1", 5))) == ["Saumon"]
+
+    service.record_meal("u1", meal("Avocat", "2025-03-20T12:00:00"))
+    assert names(asyncio.run(service.favorites("u1", 5))) == ["Avocat", "Saumon"]
+    assert service.loads == ["u1"]
+
+
+def test_forgotten_user_is_reloaded(service):
+    asyncio.run(service.favorites("u1", 5))
+    service.forget("u1")
+    asyncio.run(service.favorites("u1", 5))
+
+    assert service.loads == ["u1", "u1"]
@@ -0,0 +1,60 @@
+"""Tests de l'index des aliments de référence"""
+
+from app.services.food_matcher import FoodMatcher, fold_food_name, normalize_food_name
+
+
+def build_matcher():
+    matcher = FoodMatcher()
+    matcher.add("Saumon fumé", "saumon_fume")
+    matcher.add("Huile d'olive", "huile_olive", synonyms=["olive oil"])
+    matcher.add("Œufs", "oeuf", synonyms=["oeuf dur", "egg"])
+    matcher.add("Pâte de noix", "pate_noix")
+    return matcher
+
+
+def test_fold_and_normalize():
+    assert fold_food_name("Œufs brouillés") == "oeufs brouilles"
+    assert normalize_food_name("Œufs brouillés") == "oeuf brouille"
+    assert normalize_food_name("Choux") == "chou"
+
+
+def test_exact_name_and_longest_group_of_words():
+    matcher = build_matcher()
+    assert matcher.match("Saumon fumé") == "saumon_fume"
+    assert matcher.match("saumon fumé grillé") == "saumon_fume"
+    assert matcher.match("ŒUF") == "oeuf"
+
+
+def test_synonyms():
+    matcher = build_matcher()
+    assert matcher.match("Olive oil") == "huile_olive"
+    assert matcher.match("egg") == "oeuf"
+    assert matcher.match("oeufs durs") == "oeuf"
+
+
+def test_word_fallback_skips_stopwords_and_short_words():
+    matcher = build_matcher()
+    assert matcher.match("huile") == "huile_olive"
+    assert matcher.match("noix de cajou") == "pate_noix"
+    assert matcher.match("de") is None
+    assert matcher.match("d") is None
+
+
+def test_names_without_word_index():
+    matcher = build_matcher()
+    matcher.add("Yaourt au lait entier", "yaourt", index_words=False)
+    assert matcher.match("yaourt au lait entier nature") == "yaourt"
+    assert matcher.match("lait") is None
+
+
+def test_first_food_wins():
+    matcher = build_matcher()
+    matcher.add("Saumon fumé", "autre")
+    assert matcher.match("saumon fume") == "saumon_fume"
+
+
+def test_unknown_names():
+    matcher = build_matcher()
+    assert matcher.match("chocolat") is None
+    assert matcher.match("") is None
+    assert matcher.match("!!!") is None
@@ -0,0 +1,146 @@
+"""Tests de la recherche d'aliments multi-sources"""
+
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from app.services import food_search
+from app.services.food_search import FederatedFoodSearch, text_match_score
+
+
+class FakeFoodSearchService:
+    def __init__(self, results=(), delay=0.0, cached=None):
+        self.results = list(results)
+        self.delay = delay
+        self.cached = cached
+        self.openfoodfacts = SimpleNamespace(is_available=lambda: True)
+
+    def get_cached_search(self, query, limit=20, category=None):
+        return self.cached
+
+    def search_foods(self, query, limit=20, category=None):
+        time.sleep(self.delay)
+        return self.results
+
+
+def product(name, barcode=None, keto_score=5, brand=None):
+    return {"product_name": name, "barcode": barcode, "keto_score": keto_score, "brand": brand, "data_quality_score": 0.5}
+
+
+@pytest.fixture
+def search(monkeypatch):
+    search = FederatedFoodSearch(budget_seconds=0.5)
+    monkeypatch.setattr(search, "_search_food_database", lambda query, limit, category=None: [])
+    return search
+
+
+def use_off(monkeypatch, service):
+    monkeypatch.setattr(food_search, "food_search_service", service)
+
+
+def test_text_match_prefers_exact_then_prefix_then_word():
+    assert text_match_score("saumon", "Saumon") == 1.0
+    assert text_match_score("saumon", "Saumon fumé") == 0.8
+    assert text_match_score("fume", "Saumon fumé") == 0.6
+    assert text_match_score("umon", "Saumon") == 0.4
+
+
+def test_duplicates_keep_the_highest_priority_source(search, monkeypatch):
+    monkeypatch.setattr(search, "_search_food_database", lambda query, limit, category=None: [
+        product("Saumon fumé", barcode="123", keto_score=9),
+    ])
+    use_off(monkeypatch, FakeFoodSearchService([
+        product("Saumon fumé Label Rouge", barcode="123"),
+        product("Saumon fumé", barcode="456", keto_score=9),
+        product("Rillettes de saumon", barcode="789"),
+    ]))
+
+    results = asyncio.run(search.search("saumon fumé", limit=10))
+
+    sources = {result["barcode"]: result["data_source"] for result in results}
+    assert sources == {"123": "food_database", "789": "openfoodfacts"}
+    assert [result["product_name"] for result in results][0] == "Saumon fumé"
+    assert results == sorted(results, key=lambda result: result["relevance"], reverse=True)
+
+
+def test_slow_source_is_dropped_after_the_budget(search, monkeypatch):
+    use_off(monkeypatch, FakeFoodSearchService([product("Saumon sauvage", barcode="1")], delay=0.5))
+
+    async def timed_search():
+        started = time.monotonic()
+        results = await search.search("saumon", limit=10, budget_seconds=0.05)
+        return results, time.monotonic() - started
+
+    results, elapsed = asyncio.run(timed_search())
+
+    assert elapsed < 0.4
+    assert all(result["data_source"] != "openfoodfacts" for result in results)
+
+
+def test_cached_openfoodfacts_results_skip_the_network(search, monkeypatch):
+    service = FakeFoodSearchService(cached=[product("Saumon sauvage", barcode="1")], delay=5)
+    use_off(monkeypatch, service)
+
+    results = asyncio.run(search.search("saumon sauvage", limit=5))
+
+    assert results[0]["barcode"] == "1"
+    assert results[0]["data_source"] == "openfoodfacts"
+
+
+class FakeBarcodeService:
+    def __init__(self, cached, remote):
+        self.cached = cached
+        self.remote = remote
+        self.fetched = []
+
+    def get_cached_product(self, barcode):
+        return self.cached.get(barcode)
+
+    def get_food_by_barcode(self, barcode):
+        self.fetched.append(barcode)
+        return self.remote.get(barcode)
+
+
+def test_barcodes_resolved_from_cache_then_database_then_openfoodfacts(search, monkeypatch):
+    service = FakeBarcodeService(cached={"1": product("Beurre", barcode="1")}, remote={"3": product("Thon", barcode="3")})
+    use_off(monkeypatch, service)
+    loads = []
+
+    def load_barcodes(barcodes):
+        loads.append(barcodes)
+        return [product("Sardines", barcode="2")]
+
+    monkeypatch.setattr(search, "_load_barcodes", load_barcodes)
+
+    found = asyncio.run(search.lookup_barcodes(["1", "2", "3", "3", "4"]))
+
+    assert loads == [["2", "3", "4"]]
+    assert sorted(service.fetched) == ["3", "4"]
+    assert found["1"]["product_name"] == "Beurre"
+    assert found["2"]["data_source"] == "food_database"
+    assert found["3"]["product_name"] == "Thon"
+    assert found["4"] is None
+
+
+def test_openfoodfacts_lookups_are_bounded(search, monkeypatch):
+    search.barcode_concurrency = 2
+    in_flight = []
+    peak = []
+
+    class SlowService(FakeBarcodeService):
+        def get_food_by_barcode(self, barcode):
+            in_flight.append(barcode)
+            peak.append(len(in_flight))
+            time.sleep(0.02)
+            in_flight.remove(barcode)
+            return None
+
+    use_off(monkeypatch, SlowService(cached={}, remote={}))
+    monkeypatch.setattr(search, "_load_barcodes", lambda barcodes: [])
+
+    found = asyncio.run(search.lookup_barcodes([str(number) for number in range(8)]))
+
+    assert found == {str(number): None for number in range(8)}
+    assert max(peak) <= 2
@@ -0,0 +1,77 @@
+"""Tests des routes /api/foods"""
+
+import threading
+from types import SimpleNamespace
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.v1 import foods
+from app.auth.dependencies import get_current_user
+
+
+@pytest.fixture
+def loop_threads():
+    return []
+
+
+@pytest.fixture
+def api(loop_threads):
+    async def current_user():
+        # Dépendance async : exécutée sur le thread de la boucle d'événements
+        loop_threads.append(threading.current_thread())
+        return SimpleNamespace(id="user-1")
+
+    app = FastAPI()
+    app.include_router(foods.router, prefix="/api")
+    app.dependency_overrides[get_current_user] = current_user
+    return TestClient(app)
+
+
+def test_scan_barcode_runs_lookup_off_the_event_loop(api, loop_threads, monkeypatch):
+    lookup_threads = []
+
+    def get_food_by_barcode(barcode):
+        lookup_threads.append(threading.current_thread())
+        return {"product_name": "Beurre", "fat_per_100g": 82, "calories_per_100g": 740}
+
+    monkeypatch.setattr(foods.food_search_service, "get_food_by_barcode", get_food_by_barcode)
+
+    response = api.post("/api/foods/scan-barcode", json={"barcode": "3017620422003"})
+
+    assert response.status_code == 200
+    assert response.json()["found"] is True
+    assert response.json()["food_data"]["name"] == "Beurre"
+    assert lookup_threads and lookup_threads[0] is not loop_threads[0]
+
+
+def test_recent_searches_are_empty_when_history_is_unavailable(api, monkeypatch):
+    async def failing_recent(user_id, limit):
+        raise RuntimeError("database unavailable")
+
+    monkeypatch.setattr(foods.recent_search_cache, "recent", failing_recent)
+
+    response = api.get("/api/foods/recent-searches")
+
+    assert response.status_code == 200
+    assert response.json() == []
+
+
+def test_scan_barcodes_keeps_the_requested_order(api, monkeypatch):
+    async def lookup_barcodes(barcodes):
+        return {"2": {"product_name": "Thon", "barcode": "2", "data_source": "food_database"}, "1": None}
+
+    monkeypatch.setattr(foods.federated_food_search, "lookup_barcodes", lookup_barcodes)
+
+    response = api.post("/api/foods/scan-barcodes", json={"barcodes": ["1", " 2 "]})
+
+    assert response.status_code == 200
+    assert [(item["barcode"], item["found"]) for item in response.json()] == [("1", False), ("2", True)]
+    assert response.json()[1]["food_data"]["name"] == "Thon"
+
+
+def test_scan_barcodes_rejects_oversized_batches(api):
+    barcodes = [str(number) for number in range(foods.MAX_BATCH_BARCODES + 1)]
+    assert api.post("/api/foods/scan-barcodes", json={"barcodes": barcodes}).status_code == 400
+    assert api.post("/api/foods/scan-barcodes", json={"barcodes": []}).status_code == 400
@@ -0,0 +1,89 @@
+"""Tests du stockage dédupliqué des analyses d'images"""
+
+import base64
+import zlib
+
+from app.services.image_storage import load_image_bytes, persist_image_analysis, prepare_image_blob
+
+PNG_BYTES = b"\x89PNG\r\n\x1a\n" + b"\x00" * 200
+JPEG_BYTES = b"\xff\xd8\xff" + bytes(range(256))
+
+
+class FakeTable:
+    def __init__(self, client, name):
+        self.client = client
+        self.name = name
+
+    def upsert(self, row, **options):
+        self.client.calls.append((self.name, "upsert", row, options))
+        return self
+
+    def insert(self, row):
+        self.client.calls.append((self.name, "insert", row, {}))
+        return self
+
+    def execute(self):
+        if self.name in self.client.failing:
+            raise RuntimeError(f"{self.name} unavailable")
+        return type("Result", (), {"data": [{"id": "analysis-1"}] if self.name == "image_analysis" else []})()
+
+
+class FakeSupabase:
+    def __init__(self, failing=()):
+        self.calls = []
+        self.failing = set(failing)
+
+    def table(self, name):
+        return FakeTable(self, name)
+
+
+def test_compressible_image_is_stored_with_zlib():
+    blob = prepare_image_blob("data:image/png;base64," + base64.b64encode(PNG_BYTES).decode())
+
+    assert blob["encoding"] == "zlib"
+    assert blob["image_format"] == "png"
+    assert blob["byte_size"] == len(PNG_BYTES)
+    assert blob["stored_size"] < blob["byte_size"]
+    assert load_image_bytes(blob) == PNG_BYTES
+
+
+def test_incompressible_image_is_stored_as_is():
+    jpeg = JPEG_BYTES + zlib.compress(bytes(range(256)) * 4)
+    blob = prepare_image_blob(base64.b64encode(jpeg).decode())
+
+    assert blob["encoding"] == "identity"
+    assert blob["image_format"] == "jpeg"
+    # Format hexadécimal renvoyé par PostgREST pour un bytea
+    assert load_image_bytes({**blob, "data": "\\x" + blob["data"].hex()}) == jpeg
+
+
+def test_same_image_has_the_same_hash():
+    image = base64.b64encode(PNG_BYTES).decode()
+    assert prepare_image_blob(image)["content_hash"] == prepare_image_blob("data:image/png;base64," + image)["content_hash"]
+
+
+def test_analysis_references_the_deduplicated_blob():
+    supabase = FakeSupabase()
+    analysis = {
+        "analysis_confidence": 0.9,
+        "foods_detected": [{"name": "Saumon", "portion_estimate": "150g"}],
+        "total_nutrition": {"calories": 300, "protein": 30, "keto_score": 9},
+    }
+
+    analysis_id = persist_image_analysis(supabase, "user-1", base64.b64encode(PNG_BYTES).decode(), analysis)
+
+    assert analysis_id == "analysis-1"
+    (blob_table, _, blob_row, options), (analysis_table, _, analysis_row, _) = supabase.calls
+    assert blob_table == "image_blobs"
+    assert options["ignore_duplicates"] is True
+    assert analysis_table == "image_analysis"
+    assert analysis_row["image_hash"] == blob_row["content_hash"]
+    assert analysis_row["portions_detected"] == ["150g"]
+    assert "image_base64" not in analysis_row
+
+
+def test_blob_failure_skips_the_analysis_row():
+    supabase = FakeSupabase(failing={"image_blobs"})
+
+    assert persist_image_analysis(supabase, "user-1", base64.b64encode(PNG_BYTES).decode(), {}) is None
+    assert [call[0] for call in supabase.calls] == ["image_blobs"]
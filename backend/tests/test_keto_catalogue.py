@@ -0,0 +1,47 @@
+"""Tests du catalogue keto-friendly précalculé"""
+
+import asyncio
+
+from app.services.keto_catalogue import KetoCatalogue
+
+
+def food(name, keto_score, category, quality=50):
+    return {"product_name": name, "keto_score": keto_score, "categories": [category], "data_quality_score": quality}
+
+
+def names(page):
+    return [item["product_name"] for item in page["items"]]
+
+
+def test_seed_keeps_only_keto_friendly_foods():
+    catalogue = KetoCatalogue()
+    catalogue.seed([food("Avocat", 9, "fruits"), food("Pain", 2, "céréales")])
+
+    assert names(catalogue.page()) == ["Avocat"]
+
+
+def test_pages_facets_and_category_filter():
+    catalogue = KetoCatalogue()
+    catalogue._load = lambda: [
+        food("Saumon", 9, "Poissons", quality=80),
+        food("Thon", 9, "Poissons", quality=90),
+        food("Avocat", 8, "Fruits"),
+    ]
+    asyncio.run(catalogue.refresh())
+
+    page = catalogue.page(limit=2)
+    assert names(page) == ["Thon", "Saumon"]
+    assert page["total"] == 3
+    assert page["categories"] == [{"category": "poissons", "count": 2}, {"category": "fruits", "count": 1}]
+    assert names(catalogue.page(limit=2, offset=2)) == ["Avocat"]
+    assert names(catalogue.page(category="FRUITS")) == ["Avocat"]
+    assert catalogue.page(category="inconnue")["total"] == 0
+
+
+def test_failed_refresh_keeps_the_current_catalogue():
+    catalogue = KetoCatalogue()
+    catalogue.seed([food("Avocat", 9, "fruits")])
+    catalogue._load = lambda: []
+    asyncio.run(catalogue.refresh())
+
+    assert names(catalogue.page()) == ["Avocat"]
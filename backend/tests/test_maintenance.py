@@ -0,0 +1,88 @@
+"""Tests des purges planifiées"""
+
+import asyncio
+from datetime import datetime
+from types import SimpleNamespace
+
+from app.services.maintenance import MaintenanceService
+
+
+class FakeRpc:
+    def __init__(self, client, params):
+        self.client = client
+        self.params = params
+
+    def execute(self):
+        table = self.params["p_table"]
+        self.client.calls.append(self.params)
+        if table in self.client.failing:
+            raise RuntimeError(f"purge of {table} failed")
+        batches = self.client.batches.get(table, [])
+        return SimpleNamespace(data=batches.pop(0) if batches else 0)
+
+
+class FakeAdminClient:
+    """purge_rows_batch : nombres de lignes supprimées par lot, par table"""
+
+    def __init__(self, batches, failing=()):
+        self.batches = {table: list(counts) for table, counts in batches.items()}
+        self.failing = set(failing)
+        self.calls = []
+
+    def rpc(self, name, params):
+        assert name == "purge_rows_batch"
+        return FakeRpc(self, params)
+
+
+def service_with(client, **options):
+    service = MaintenanceService(batch_size=10, **options)
+    service._client = client
+    return service
+
+
+def test_batches_are_repeated_until_a_partial_batch():
+    client = FakeAdminClient({"account_deletion_requests": [10, 10, 3], "search_history": [4]})
+    service = service_with(client)
+
+    deleted = asyncio.run(service.run())
+
+    assert deleted == {"account_deletion_requests": 23, "search_history": 4}
+    assert [call["p_table"] for call in client.calls].count("account_deletion_requests") == 3
+    assert all(call["p_batch_size"] == 10 for call in client.calls)
+
+
+def test_a_run_is_bounded_by_max_batches():
+    client = FakeAdminClient({"account_deletion_requests": [10] * 5})
+    service = service_with(client, max_batches=2)
+
+    assert asyncio.run(service.run())["account_deletion_requests"] == 20
+
+
+def test_search_history_cutoff_follows_the_retention():
+    client = FakeAdminClient({})
+    service = service_with(client, search_history_retention_days=30)
+
+    asyncio.run(service.run())
+
+    cutoffs = {call["p_table"]: datetime.fromisoformat(call["p_before"]) for call in client.calls}
+    age = cutoffs["account_deletion_requests"] - cutoffs["search_history"]
+    assert round(age.total_seconds() / 86400) == 30
+
+
+def test_failed_table_does_not_stop_the_others_and_is_counted():
+    client = FakeAdminClient({"search_history": [2]}, failing={"account_deletion_requests"})
+    service = service_with(client)
+
+    assert asyncio.run(service.run()) == {"search_history": 2}
+    asyncio.run(service.run())
+
+    metrics = service.metrics()
+    assert metrics["runs"] == 2
+    assert metrics["errors"] == 2
+    assert metrics["total_deleted"] == {"search_history": 2}
+    assert metrics["last_deleted"] == {"search_history": 0}
+
+
+def test_rate_limit_buckets_are_purged_only_when_shared():
+    assert "rate_limit_buckets" not in [table for table, _ in MaintenanceService().jobs]
+    assert "rate_limit_buckets" in [table for table, _ in MaintenanceService(purge_rate_limit_buckets=True).jobs]
@@ -0,0 +1,66 @@
+"""Tests du parseur JSON incrémental de l'analyse de repas en flux"""
+
+from app.services.meal_stream import IncrementalMealParser, format_sse
+
+RESPONSE = (
+    'Voici l\'analyse : {"foods_detected": ["Saumon grillé", "Épinards \\"frais\\""], '
+    '"portions": ["150g", "100g"], "total_calories": 350, "total_carbs": 4.5, '
+    '"keto_score": 9, "confidence": 0.85}'
+)
+
+
+def feed_all(parser, chunks):
+    events = []
+    for chunk in chunks:
+        events.extend(parser.feed(chunk))
+    return events
+
+
+def test_chunks_split_mid_token_give_the_same_result():
+    whole = IncrementalMealParser()
+    whole_events = whole.feed(RESPONSE)
+
+    # Un caractère à la fois : coupures au milieu des chaînes, nombres et échappements
+    split = IncrementalMealParser()
+    split_events = feed_all(split, RESPONSE)
+
+    assert split.complete and whole.complete
+    assert split.result() == whole.result()
+    assert split_events == whole_events
+    assert split.result()["foods_detected"] == ["Saumon grillé", 'Épinards "frais"']
+    assert split.result()["total_calories"] == 350
+
+
+def test_list_items_and_totals_are_emitted_as_they_arrive():
+    parser = IncrementalMealParser()
+    events = parser.feed('{"foods_detected": ["Avocat", ')
+    assert events == [("food", {"index": 0, "name": "Avocat"})]
+
+    # Le nombre n'est émis qu'une fois terminé
+    assert parser.feed('"Oeuf"], "total_calories": 3') == [("food", {"index": 1, "name": "Oeuf"})]
+    assert parser.feed("20, ") == [("totals", {"total_calories": 320})]
+    assert parser.result() is None
+
+
+def test_preamble_and_nested_objects_are_ignored():
+    parser = IncrementalMealParser()
+    parser.feed('Réponse {"details": {"total_calories": 999}, "total_calories": 100}')
+    assert parser.result() == {"total_calories": 100}
+
+
+def test_missing_lists_keep_the_caller_defaults():
+    parser = IncrementalMealParser()
+    parser.feed('{"total_calories": 120, "keto_score": 7}')
+    result = parser.result()
+    assert "foods_detected" not in result
+    assert "portions" not in result
+
+
+def test_empty_list_in_the_response_is_returned():
+    parser = IncrementalMealParser()
+    parser.feed('{"foods_detected": [], "total_calories": 0}')
+    assert parser.result()["foods_detected"] == []
+
+
+def test_format_sse():
+    assert format_sse("food", {"name": "Œuf"}) == 'event: food\ndata: {"name": "Œuf"}\n\n'
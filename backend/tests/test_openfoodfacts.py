@@ -0,0 +1,105 @@
+"""Tests du client OpenFoodFacts et de son cache de recherches"""
+
+import pytest
+
+from integrations.openfoodfacts import FoodSearchService, OpenFoodFactsAPI
+
+
+class FakeOpenFoodFacts:
+    def __init__(self, products):
+        self.products = products
+        self.searches = []
+
+    def search_products(self, query, limit=20, category=None):
+        self.searches.append((query, limit, category))
+        return self.products[:limit]
+
+
+def product(name, keto_score):
+    return {"product_name": name, "keto_score": keto_score, "data_quality_score": 50}
+
+
+@pytest.fixture
+def service():
+    service = FoodSearchService()
+    service.openfoodfacts = FakeOpenFoodFacts([
+        product("Pain de mie", 2),
+        product("Avocat", 9),
+        product("Amandes", 8),
+    ])
+    return service
+
+
+def test_repeated_search_is_served_from_the_cache(service):
+    first = service.search_foods("Avocat", limit=3)
+    again = service.search_foods("  avocat ", limit=2)
+
+    assert [food["product_name"] for food in first] == ["Avocat", "Amandes", "Pain de mie"]
+    assert again == first[:2]
+    assert len(service.openfoodfacts.searches) == 1
+
+
+def test_larger_limit_than_cached_goes_to_the_network(service):
+    service.search_foods("avocat", limit=1)
+    assert service.get_cached_search("avocat", limit=3) is None
+
+    service.search_foods("avocat", limit=3)
+    assert len(service.openfoodfacts.searches) == 2
+
+
+def test_category_is_part_of_the_cache_key(service):
+    service.search_foods("avocat", limit=3)
+    assert service.get_cached_search("avocat", limit=3, category="fruits") is None
+
+
+def test_empty_results_are_not_cached(service):
+    service.openfoodfacts.products = []
+    assert service.search_foods("introuvable") == []
+    assert service.get_cached_search("introuvable") is None
+
+
+OFF_PRODUCT = {
+    "code": "3017620422003",
+    "product_name": "Beurre doux",
+    "brands": "Président",
+    "labels": "Bio",
+    "ingredients_text": "Crème pasteurisée",
+    "nutriments": {"energy-kcal_100g": 740, "fat_100g": 82, "carbohydrates_100g": 0.7, "proteins_100g": 0.7},
+}
+
+
+@pytest.fixture
+def off_api(monkeypatch):
+    api = OpenFoodFactsAPI(hedge_requests=False)
+    api.requests = []
+
+    def fetch_json(url, params):
+        api.requests.append((url, params))
+        if url == api.SEARCH_URL:
+            return {"products": [OFF_PRODUCT]}
+        return {"status": 1, "product": OFF_PRODUCT}
+
+    monkeypatch.setattr(api, "_fetch_json", fetch_json)
+    return api
+
+
+def test_search_requests_only_the_summary_fields(off_api):
+    results = off_api.search_products("beurre", limit=5)
+
+    _, params = off_api.requests[0]
+    assert params["fields"] == OpenFoodFactsAPI.SEARCH_FIELDS
+    assert params["page_size"] == 5
+    assert "ingredients_text" not in params["fields"]
+    assert results[0]["details_loaded"] is False
+    assert "ingredients_text" not in results[0]
+
+
+def test_product_page_loads_the_full_details(off_api):
+    product = off_api.get_product_by_barcode("3017620422003")
+
+    url, params = off_api.requests[0]
+    assert url.endswith("/3017620422003.json")
+    assert params == {"fields": OpenFoodFactsAPI.DETAIL_FIELDS}
+    assert product["details_loaded"] is True
+    assert product["ingredients_text"] == "Crème pasteurisée"
+    assert product["labels"] == ["Bio"]
@@ -0,0 +1,179 @@
+"""Tests des routes de préférences : client utilisateur, cache et ETag"""
+
+from types import SimpleNamespace
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.v1 import preferences
+from app.auth.dependencies import get_authenticated_supabase_client, get_current_user
+from app.services.preferences_cache import compute_etag, etag_matches, preferences_cache
+
+USER_ID = "user-1"
+
+
+class FakeQuery:
+    def __init__(self, client, operation, payload=None):
+        self.client = client
+        self.operation = operation
+        self.payload = payload
+
+    def eq(self, column, value):
+        return self
+
+    def execute(self):
+        self.client.calls.append(self.operation)
+        if self.operation in self.client.failing:
+            raise RuntimeError(f"{self.operation} failed")
+        if self.operation == "update":
+            return SimpleNamespace(data=[{**self.client.row, **self.payload}])
+        if self.operation == "upsert":
+            self.client.row = self.payload
+            return SimpleNamespace(data=[self.payload])
+        return SimpleNamespace(data=[self.client.row] if self.client.row else [])
+
+
+class FakeTable:
+    def __init__(self, client):
+        self.client = client
+
+    def select(self, columns):
+        return FakeQuery(self.client, "select")
+
+    def update(self, payload):
+        return FakeQuery(self.client, "update", payload)
+
+    def upsert(self, payload, **options):
+        return FakeQuery(self.client, "upsert", payload)
+
+
+class FakeUserClient:
+    """Client au nom de l'utilisateur (UserScopedClient) attendu par les routes"""
+
+    def __init__(self, row):
+        self.row = row
+        self.calls = []
+        self.failing = set()
+
+    def rpc(self, name, params):
+        return FakeQuery(self, "rpc")
+
+    def table(self, name):
+        return FakeTable(self)
+
+
+@pytest.fixture
+def api():
+    preferences_cache.invalidate(USER_ID)
+    row = {**preferences.get_default_preferences_by_region("FR"), "user_id": USER_ID}
+    user_client = FakeUserClient(row)
+
+    app = FastAPI()
+    app.include_router(preferences.router, prefix="/api")
+    app.dependency_overrides[get_current_user] = lambda: SimpleNamespace(id=USER_ID)
+    app.dependency_overrides[get_authenticated_supabase_client] = lambda: user_client
+    yield SimpleNamespace(client=TestClient(app), supabase=user_client)
+    preferences_cache.invalidate(USER_ID)
+
+
+def test_preferences_are_read_with_the_user_client(api):
+    response = api.client.get(f"/api/user-preferences/{USER_ID}")
+
+    assert response.status_code == 200, response.text
+    assert api.supabase.calls == ["rpc"]
+    assert response.json()["user_id"] == USER_ID
+
+
+def test_update_goes_through_the_user_client(api):
+    response = api.client.patch(f"/api/user-preferences/{USER_ID}", json={"count_net_carbs": False})
+
+    assert response.status_code == 200, response.text
+    assert api.supabase.calls == ["update"]
+    assert response.json()["count_net_carbs"] is False
+
+
+def test_second_read_is_served_from_the_cache_and_revalidated(api):
+    first = api.client.get(f"/api/user-preferences/{USER_ID}")
+    etag = first.headers["ETag"]
+    assert first.headers["Cache-Control"] == "private, no-cache"
+
+    again = api.client.get(f"/api/user-preferences/{USER_ID}")
+    revalidated = api.client.get(f"/api/user-preferences/{USER_ID}", headers={"If-None-Match": f'W/{etag}, "other"'})
+
+    assert again.json() == first.json()
+    assert revalidated.status_code == 304
+    assert revalidated.content == b""
+    assert revalidated.headers["ETag"] == etag
+    assert api.supabase.calls == ["rpc"]
+
+
+def test_update_is_written_through_and_changes_the_etag(api):
+    etag = api.client.get(f"/api/user-preferences/{USER_ID}").headers["ETag"]
+
+    updated = api.client.patch(f"/api/user-preferences/{USER_ID}", json={"dark_mode": True})
+    after = api.client.get(f"/api/user-preferences/{USER_ID}", headers={"If-None-Match": etag})
+
+    assert updated.headers["ETag"] != etag
+    assert after.status_code == 200
+    assert after.json()["dark_mode"] is True
+    assert after.headers["ETag"] == updated.headers["ETag"]
+    assert api.supabase.calls == ["rpc", "update"]
+
+
+def test_etag_ignores_key_order():
+    assert compute_etag({"a": 1, "b": 2}) == compute_etag({"b": 2, "a": 1})
+    assert etag_matches("*", compute_etag({}))
+    assert not etag_matches(None, compute_etag({}))
+
+
+def test_missing_preferences_are_created_in_one_round_trip(api):
+    api.supabase.row = None
+
+    def get_or_create():
+        # La fonction SQL renvoie une ligne unique (pas une liste)
+        api.supabase.calls.append("rpc")
+        return SimpleNamespace(data={**preferences.get_default_preferences_by_region("FR"), "user_id": USER_ID})
+
+    api.supabase.rpc = lambda name, params: SimpleNamespace(execute=get_or_create)
+
+    response = api.client.get(f"/api/user-preferences/{USER_ID}")
+
+    assert response.status_code == 200
+    assert response.json()["region"] == "FR"
+    assert api.supabase.calls == ["rpc"]
+
+
+def test_failed_rpc_falls_back_to_select_then_upsert(api):
+    api.supabase.row = None
+    api.supabase.failing.add("rpc")
+
+    response = api.client.get(f"/api/user-preferences/{USER_ID}")
+
+    assert response.status_code == 200
+    assert response.json()["user_id"] == USER_ID
+    assert api.supabase.calls == ["rpc", "select", "upsert"]
+
+
+def test_region_defaults_are_precomputed_and_copied():
+    canada = preferences.get_default_preferences_by_region("CA")
+    canada["health_sync_permissions"]["steps"] = True
+    canada["language"] = "en"
+
+    assert preferences.REGION_DEFAULTS["CA"]["weight_unit"] == "lb"
+    assert preferences.REGION_DEFAULTS["CA"]["health_sync_permissions"] == {}
+    assert preferences.get_default_preferences_by_region("CA")["language"] == "fr"
+    with pytest.raises(TypeError):
+        preferences.REGION_DEFAULTS["FR"]["region"] = "BE"
+
+
+def test_static_references_are_cacheable(api):
+    response = api.client.get("/api/preferences/regions")
+    revalidated = api.client.get("/api/preferences/units", headers={"If-None-Match": preferences.UNITS_ETAG})
+
+    assert response.status_code == 200
+    assert response.json()["regions"][0]["code"] == "FR"
+    assert response.headers["ETag"] == preferences.REGIONS_ETAG
+    assert "max-age=86400" in response.headers["Cache-Control"]
+    assert revalidated.status_code == 304
+    assert revalidated.content == b""
@@ -0,0 +1,104 @@
+"""Tests de la limitation de débit des routes d'authentification"""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app.services import rate_limit
+from app.services.rate_limit import Limit, RateLimiter, TokenBucketLimiter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(rate_limit.time, "monotonic", fake)
+    return fake
+
+
+def fake_request(host, forwarded_for=None):
+    headers = {"x-forwarded-for": forwarded_for} if forwarded_for else {}
+    return SimpleNamespace(client=SimpleNamespace(host=host), headers=headers)
+
+
+def test_bucket_allows_a_burst_then_refills(clock):
+    limiter = TokenBucketLimiter()
+    limit = Limit(capacity=3, period=60)
+    assert [limiter.consume("k", limit) for _ in range(3)] == [0, 0, 0]
+    # Un jeton toutes les 20 s
+    assert limiter.consume("k", limit) == pytest.approx(20)
+
+    clock.now += 20
+    assert limiter.consume("k", limit) == 0
+    assert limiter.consume("k", limit) == pytest.approx(20)
+
+
+def test_refill_is_capped_at_capacity(clock):
+    limiter = TokenBucketLimiter()
+    limit = Limit(capacity=2, period=10)
+    limiter.consume("k", limit)
+    clock.now += 3600
+    assert [limiter.consume("k", limit) for _ in range(3)][2] > 0
+
+
+def test_lru_bound_forgets_the_least_recently_used_key(clock):
+    limiter = TokenBucketLimiter(max_keys=2)
+    limit = Limit(capacity=1, period=60)
+    limiter.consume("a", limit)
+    limiter.consume("b", limit)
+    limiter.consume("a", limit)  # refusé, mais "a" redevient la plus récente
+    limiter.consume("c", limit)
+
+    assert list(limiter._buckets) == ["a", "c"]
+    # "b" oublié : seau plein à nouveau
+    assert limiter.consume("b", limit) == 0
+
+
+def test_consume_all_is_all_or_nothing(clock):
+    limiter = TokenBucketLimiter()
+    loose, strict = Limit(capacity=10, period=60), Limit(capacity=1, period=60)
+    assert limiter.consume_all([("ip", loose), ("email", strict)]) == 0
+    assert limiter.consume_all([("ip", loose), ("email", strict)]) > 0
+    # Le refus du seau email n'a pas consommé le seau IP
+    assert limiter._buckets["ip"][0] == pytest.approx(9)
+
+
+def test_check_rejects_on_the_email_bucket_without_spending_the_ip_bucket(clock):
+    limiter = RateLimiter(TokenBucketLimiter())
+    policy = rate_limit.RATE_LIMITS["login"]
+
+    async def attempts():
+        return [await limiter.check("login", "1.2.3.4", "User@Example.com ") for _ in range(int(policy.email.capacity) + 1)]
+
+    results = asyncio.run(attempts())
+    assert results[:-1] == [0] * int(policy.email.capacity)
+    assert results[-1] > 0
+    assert limiter.stats() == {"login": 1}
+
+    ip_tokens = limiter.local._buckets["login:ip:1.2.3.4"][0]
+    assert ip_tokens == pytest.approx(policy.ip.capacity - policy.email.capacity)
+    # Autre adresse email depuis la même IP : acceptée
+    assert asyncio.run(limiter.check("login", "1.2.3.4", "other@example.com")) == 0
+
+
+def test_client_ip_without_trusted_proxies_uses_the_peer():
+    limiter = RateLimiter(TokenBucketLimiter())
+    assert limiter.client_ip(fake_request("203.0.113.7", "1.1.1.1")) == "203.0.113.7"
+
+
+def test_client_ip_takes_the_right_most_untrusted_hop():
+    limiter = RateLimiter(TokenBucketLimiter(), trusted_proxies=["10.0.0.0/8"])
+    # L'entrée la plus à gauche est fournie par le client : ignorée
+    request = fake_request("10.0.0.2", "6.6.6.6, 203.0.113.7, 10.0.0.1")
+    assert limiter.client_ip(request) == "203.0.113.7"
+    # Pair hors des proxies de confiance : l'en-tête n'est pas lu
+    assert limiter.client_ip(fake_request("198.51.100.1", "6.6.6.6")) == "198.51.100.1"
+    assert limiter.client_ip(fake_request("10.0.0.2")) == "10.0.0.2"
@@ -0,0 +1,43 @@
+"""Tests de la base d'aliments de référence partagée"""
+
+from app.services.reference_foods import ReferenceFood, ReferenceFoodStore, reference_foods
+
+
+def build_store():
+    return ReferenceFoodStore([
+        ReferenceFood("salmon", "Saumon fumé", "poisson", 208, 25, 0, 12, 0, keto_score=10, synonyms=("salmon",)),
+        ReferenceFood("sardine", "Sardines", "poisson", 208, 25, 0, 11, 0, keto_score=9),
+        ReferenceFood("eggs", "Œufs", "protéines", 155, 13, 1, 11, 0, keto_score=10, synonyms=("omelette",)),
+    ])
+
+
+def ids(foods):
+    return [food.id for food in foods]
+
+
+def test_lookups_by_id_name_synonym_and_category():
+    store = build_store()
+    assert store.get("eggs").name == "Œufs"
+    assert store.by_name("OEUFS").id == "eggs"
+    assert store.by_name("omelette").id == "eggs"
+    assert ids(store.by_category("Poisson")) == ["salmon", "sardine"]
+    assert store.categories == ("poisson", "protéines")
+
+
+def test_search_by_word_prefix_without_duplicates():
+    store = build_store()
+    assert ids(store.search("sa")) == ["salmon", "sardine"]
+    assert ids(store.search("fume")) == ["salmon"]
+    assert ids(store.search("sa", limit=1)) == ["salmon"]
+    assert ids(store.search("oe", category="poisson")) == []
+    assert store.search("") == []
+
+
+def test_match_in_free_text():
+    assert build_store().match("saumon fumé grillé").id == "salmon"
+
+
+def test_shared_store_feeds_every_format():
+    avocado = reference_foods.get("avocado")
+    assert avocado.to_search_result()["name"] == "Avocat"
+    assert reference_foods.by_name("guacamole") is avocado
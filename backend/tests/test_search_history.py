@@ -0,0 +1,102 @@
+"""Tests des recherches récentes et de l'écriture différée de l'historique"""
+
+import asyncio
+
+from app.services import search_history
+from app.services.search_history import RecentSearchCache
+
+
+def queries(entries):
+    return [entry["query"] for entry in entries]
+
+
+def test_push_deduplicates_and_moves_to_front():
+    cache = RecentSearchCache(per_user=3)
+    for query in ("avocat", "saumon", "  AVOCAT "):
+        cache.push("u1", query)
+    assert queries(cache._entries("u1")) == ["AVOCAT", "saumon"]
+
+
+def test_per_user_buffer_keeps_the_most_recent():
+    cache = RecentSearchCache(per_user=2)
+    for query in ("a1", "a2", "a3"):
+        cache.push("u1", query)
+    assert queries(cache._entries("u1")) == ["a3", "a2"]
+
+
+def test_least_recently_used_user_is_evicted():
+    cache = RecentSearchCache(max_users=2)
+    cache.push("u1", "avocat")
+    cache.push("u2", "saumon")
+    cache.push("u1", "oeuf")
+    cache.push("u3", "bacon")
+    assert list(cache._users) == ["u1", "u3"]
+
+
+def test_hydration_merges_buffer_and_database_by_date():
+    cache = RecentSearchCache(per_user=3)
+    cache.push("u1", "avocat", searched_at="2025-03-01T12:00:00")
+    cache._load = lambda user_id: [
+        {"query": "Saumon", "searched_at": "2025-03-02T08:00:00+00:00"},
+        {"query": "avocat", "searched_at": "2025-02-01T08:00:00+00:00"},
+        {"query": "oeuf", "searched_at": "2025-01-15T08:00:00Z"},
+        {"query": "bacon", "searched_at": "2025-01-01T08:00:00+00:00"},
+    ]
+
+    recent = asyncio.run(cache.recent("u1", 10))
+    assert queries(recent) == ["Saumon", "avocat", "oeuf"]
+    # La version la plus récente d'une recherche est gardée
+    assert recent[1]["searched_at"] == "2025-03-01T12:00:00"
+
+
+def test_database_is_read_once_per_user_by_default():
+    cache = RecentSearchCache()
+    loads = []
+    cache._load = lambda user_id: loads.append(user_id) or []
+
+    for _ in range(3):
+        asyncio.run(cache.recent("u1", 5))
+    assert loads == ["u1"]
+
+
+def test_evicted_user_is_hydrated_again():
+    cache = RecentSearchCache(max_users=1)
+    loads = []
+    cache._load = lambda user_id: loads.append(user_id) or []
+
+    asyncio.run(cache.recent("u1", 5))
+    asyncio.run(cache.recent("u2", 5))
+    asyncio.run(cache.recent("u1", 5))
+    assert loads == ["u1", "u2", "u1"]
+
+
+def test_opt_in_refresh_reads_the_database_again(monkeypatch):
+    cache = RecentSearchCache(refresh_seconds=60)
+    loads = []
+    cache._load = lambda user_id: loads.append(user_id) or []
+    now = [1000.0]
+    monkeypatch.setattr(search_history.time, "monotonic", lambda: now[0])
+
+    asyncio.run(cache.recent("u1", 5))
+    now[0] += 59
+    asyncio.run(cache.recent("u1", 5))
+    assert loads == ["u1"]
+
+    now[0] += 1
+    asyncio.run(cache.recent("u1", 5))
+    assert loads == ["u1", "u1"]
+
+
+def test_failed_load_serves_the_buffer_and_is_retried():
+    cache = RecentSearchCache()
+    cache.push("u1", "avocat")
+
+    def failing_load(user_id):
+        raise RuntimeError("database unavailable")
+
+    cache._load = failing_load
+    assert queries(asyncio.run(cache.recent("u1", 5))) == ["avocat"]
+    assert "u1" not in cache._hydrated
+
+    cache._load = lambda user_id: [{"query": "saumon", "searched_at": "2000-01-01T00:00:00+00:00"}]
+    assert queries(asyncio.run(cache.recent("u1", 5))) == ["avocat", "saumon"]
@@ -0,0 +1,31 @@
+"""Tests de l'écriture différée de l'historique de recherche"""
+
+import asyncio
+
+from app.services.search_history import SearchHistoryWriter
+
+
+def test_writer_keeps_rows_until_written_and_drains_on_stop():
+    writer = SearchHistoryWriter(batch_size=2, flush_interval=60)
+    written = []
+    failures = [RuntimeError("database unavailable")]
+
+    def insert(rows):
+        if failures:
+            raise failures.pop()
+        written.extend(rows)
+
+    writer._insert = insert
+
+    async def scenario():
+        await writer.start()
+        for query in ("avocat", "saumon", "Avocat", "oeuf"):
+            writer.record("u1", query)
+        # Premier lot en échec : ses lignes restent dans le tampon
+        assert await writer.flush() == 1
+        assert sorted(row["query"] for row in writer._pending.values()) == ["Avocat", "saumon"]
+        await writer.stop()
+
+    asyncio.run(scenario())
+    assert sorted(row["query"] for row in written) == ["Avocat", "oeuf", "saumon"]
+    assert writer._pending == {}
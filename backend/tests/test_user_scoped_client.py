@@ -0,0 +1,55 @@
+"""Tests de l'accès PostgREST au nom d'un utilisateur"""
+
+from app.database.connection import UserScopedClient
+
+
+class FakeBuilder:
+    def __init__(self, session):
+        self.session = session
+        self.headers = {"Authorization": "Bearer anon-key"}
+        self.filters = []
+
+    def select(self, columns):
+        self.filters.append(("select", columns))
+        return self
+
+    def eq(self, column, value):
+        self.filters.append((column, value))
+        return self
+
+    def execute(self):
+        return {"authorization": self.headers["Authorization"], "session": dict(self.session), "filters": self.filters}
+
+
+class FakeClient:
+    """Client partagé : sa session ne doit jamais être modifiée"""
+
+    def __init__(self):
+        self.session = {"Authorization": "Bearer anon-key"}
+
+    def table(self, name):
+        return FakeBuilder(self.session)
+
+    def rpc(self, name, params):
+        return FakeBuilder(self.session)
+
+
+def test_each_query_carries_its_own_user_token():
+    shared = FakeClient()
+    alice = UserScopedClient(shared, "alice-jwt")
+    bob = UserScopedClient(shared, "bob-jwt")
+
+    # Requêtes construites en parallèle, exécutées dans l'ordre inverse
+    alice_query = alice.table("user_preferences").select("*").eq("user_id", "alice")
+    bob_query = bob.table("user_preferences").select("*").eq("user_id", "bob")
+
+    assert bob_query.execute()["authorization"] == "Bearer bob-jwt"
+    result = alice_query.execute()
+    assert result["authorization"] == "Bearer alice-jwt"
+    assert result["filters"] == [("select", "*"), ("user_id", "alice")]
+    assert shared.session == {"Authorization": "Bearer anon-key"}
+
+
+def test_rpc_is_scoped_too():
+    client = UserScopedClient(FakeClient(), "jwt")
+    assert client.rpc("get_or_create_user_preferences", {}).execute()["authorization"] == "Bearer jwt"
@@ -0,0 +1,27 @@
+"""Tests de la fusion des détections d'aliments sur plusieurs photos"""
+
+from app.api.v1.vision import FoodDetection, merge_food_detections
+
+
+def detection(name, confidence):
+    return FoodDetection(name=name, confidence=confidence, portion_estimate="100g")
+
+
+def test_same_food_keeps_the_most_confident_detection():
+    merged = merge_food_detections([
+        detection("Saumon grillé", 0.7),
+        detection("Épinards", 0.8),
+        detection("saumon grille", 0.9),
+    ])
+    assert [(food.name, food.confidence) for food in merged] == [("saumon grille", 0.9), ("Épinards", 0.8)]
+
+
+def test_plural_and_accents_are_the_same_food():
+    merged = merge_food_detections([detection("Œufs", 0.6), detection("oeuf", 0.5)])
+    assert [(food.name, food.confidence) for food in merged] == [("Œufs", 0.6)]
+
+
+def test_distinct_foods_keep_their_order():
+    names = ["Avocat", "Bacon", "Fromage"]
+    assert [food.name for food in merge_food_detections([detection(name, 0.5) for name in names])] == names
+    assert merge_food_detections([]) == []